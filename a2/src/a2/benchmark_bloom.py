@@ -0,0 +1,195 @@
+import argparse
+import logging
+import time
+
+import mmh3
+from nltk import ngrams
+
+from .bloomfilter1 import BloomFilter, CountingBloomFilter
+from .bloomfilter3 import StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter, BlockedBloomFilter
+from .cuckoofilter import CuckooFilter
+from .bloomfilter3_cli import calculate_bloom_filter_size
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def insert_per_seed(bloom_filter: BloomFilter, items) -> None:
+    """
+    Previous BloomFilter.insert path: k seeded 32-bit murmur3 hashes per item, one bit at a time.
+    """
+    for item in items:
+        for i in range(bloom_filter.k):
+            bloom_filter.bit_array[mmh3.hash(item, i) % bloom_filter.m] = 1
+
+
+def query_per_seed(bloom_filter: BloomFilter, items) -> int:
+    """
+    Previous BloomFilter.query path, counting the items possibly in the filter.
+    """
+    return sum(all(bloom_filter.bit_array[mmh3.hash(item, i) % bloom_filter.m] for i in range(bloom_filter.k))
+               for item in items)
+
+
+def insert_txt_per_seed(bloom_filter: BloomFilter, documents) -> None:
+    """
+    Previous BloomFilter.insert_txt path: every word 4-gram joined into a string and inserted per seed.
+    """
+    for doc_item in documents:
+        insert_per_seed(bloom_filter, [' '.join(piece) for piece in ngrams(doc_item.lower().split(), 4)])
+
+
+def query_txt_per_seed(bloom_filter: BloomFilter, documents) -> int:
+    """
+    Previous BloomFilter.query_txt path, stopping at the first absent 4-gram of a document.
+    """
+    return sum(all(all(bloom_filter.bit_array[mmh3.hash(' '.join(piece), i) % bloom_filter.m] for i in range(bloom_filter.k))
+                   for piece in ngrams(doc_item.lower().split(), 4))
+               for doc_item in documents)
+
+
+def time_path(name: str, path, num_items: int) -> float:
+    """
+    Runs one path and logs its throughput.
+    :return: Throughput in items per second.
+    """
+    start = time.perf_counter()
+    path()
+    rate = num_items / (time.perf_counter() - start)
+    logging.info(f"{name:40s}: {rate:12,.0f} items/s")
+    return rate
+
+
+def run_benchmark(num_items: int, false_positive_rate: float = 0.01):
+    """
+    Times the per-item and batched insert and query paths of every Bloom filter, and the document
+    paths of BloomFilter, whose shingles are hashed by shingling.word_shingle_hashes_many.
+    :param num_items: Number of items inserted, then queried (half of the queries are absent);
+                      also the approximate number of shingles of the documents.
+    :param false_positive_rate: Target false positive rate used to size the filters.
+    :return: Dictionary mapping each path to its throughput in items per second.
+    """
+    items = [f"shingle {i} of the benchmark collection" for i in range(num_items)]
+    queries = items[::2] + [f"absent {i}" for i in range(num_items // 2)]
+    results = {}
+
+    bf = BloomFilter(num_items, false_positive_rate)
+    results['bloomfilter1 insert (per seed)'] = time_path('bloomfilter1 insert (per seed)',
+                                                          lambda: insert_per_seed(bf, items), num_items)
+    results['bloomfilter1 query (per seed)'] = time_path('bloomfilter1 query (per seed)',
+                                                         lambda: query_per_seed(bf, queries), len(queries))
+    bf = BloomFilter(num_items, false_positive_rate)
+    results['bloomfilter1 insert'] = time_path('bloomfilter1 insert',
+                                               lambda: [bf.insert(item) for item in items], num_items)
+    results['bloomfilter1 query'] = time_path('bloomfilter1 query',
+                                              lambda: [bf.query(item) for item in queries], len(queries))
+    bf = BloomFilter(num_items, false_positive_rate)
+    results['bloomfilter1 insert_many'] = time_path('bloomfilter1 insert_many',
+                                                    lambda: bf.insert_many(items), num_items)
+    results['bloomfilter1 query_many'] = time_path('bloomfilter1 query_many',
+                                                   lambda: bf.query_many(queries), len(queries))
+
+    # Documents of 200 words, 197 shingles each; the query documents are the inserted ones, so every shingle is looked up
+    words = [f"word{i}" for i in range(50000)]
+    documents = [' '.join(words[(d * 7919 + i * 104729) % len(words)] for i in range(200)) for d in range(max(1, num_items // 197))]
+    num_shingles = 197 * len(documents)
+    bf = BloomFilter(num_shingles, false_positive_rate)
+    results['bloomfilter1 insert_txt (per seed)'] = time_path('bloomfilter1 insert_txt (per seed)',
+                                                              lambda: insert_txt_per_seed(bf, documents), num_shingles)
+    results['bloomfilter1 query_txt (per seed)'] = time_path('bloomfilter1 query_txt (per seed)',
+                                                             lambda: query_txt_per_seed(bf, documents), num_shingles)
+    bf = BloomFilter(num_shingles, false_positive_rate)
+    results['bloomfilter1 insert_txt_many'] = time_path('bloomfilter1 insert_txt_many',
+                                                        lambda: bf.insert_txt_many(documents), num_shingles)
+    results['bloomfilter1 query_txt_many'] = time_path('bloomfilter1 query_txt_many',
+                                                       lambda: bf.query_txt_many(documents), num_shingles)
+
+    m, k = calculate_bloom_filter_size(num_items, false_positive_rate)
+    filters = {
+        'standard': lambda: StandardBloomFilter(m, k),
+        'chunked': lambda: ChunkedBloomFilter(m, k, 5),
+        'kirsch-mitzenmacher': lambda: ImprovedBloomFilter(m, k, method='kirsch-mitzenmacher'),
+    }
+    for name, make_filter in filters.items():
+        single, batched = make_filter(), make_filter()
+        for label, path, count in [
+            (f"{name} add", lambda: [single.add(item) for item in items], num_items),
+            (f"{name} check", lambda: [single.check(item) for item in queries], len(queries)),
+            (f"{name} add_many", lambda: batched.add_many(items), num_items),
+            (f"{name} check_many", lambda: batched.check_many(queries), len(queries)),
+        ]:
+            results[label] = time_path(label, path, count)
+    return results
+
+
+def filter_bits(bloom_filter) -> int:
+    """
+    Bits of the array(s) a filter keeps its items in.
+    """
+    if isinstance(bloom_filter, CuckooFilter):
+        return bloom_filter.table.nbytes * 8
+    if isinstance(bloom_filter, CountingBloomFilter):
+        return 4 * bloom_filter.m
+    if isinstance(bloom_filter, BloomFilter):
+        return bloom_filter.m
+    return bloom_filter.size
+
+
+def run_space_benchmark(num_items: int, false_positive_rates=(0.05, 0.001, 0.00001)):
+    """
+    Compares bits per item, measured false positive rate and batched throughput of the filters
+    that hold num_items items at each target false positive rate. A cuckoo filter packs fingerprints
+    just wide enough for the target, so its rate stays somewhat below it; a BloomFilter sized for the
+    cuckoo filter's false positive bound is added for the comparison at equal rates.
+    :param num_items: Number of items inserted, and of absent items queried.
+    :param false_positive_rates: Target false positive rates used to size the filters.
+    :return: Dictionary mapping (filter name, rate) to a tuple of (bits per item, false positive rate, inserts/s, queries/s).
+    """
+    items = [f"shingle {i} of the benchmark collection" for i in range(num_items)]
+    absent = [f"absent {i}" for i in range(num_items)]
+    results = {}
+
+    def measure_space(name, rate, bloom_filter, insert, query):
+        start = time.perf_counter()
+        insert(items)
+        inserts = num_items / (time.perf_counter() - start)
+        start = time.perf_counter()
+        positives = int(query(absent).sum())
+        queries = num_items / (time.perf_counter() - start)
+        results[name, rate] = (filter_bits(bloom_filter) / num_items, positives / num_items, inserts, queries)
+        logging.info(f"f = {rate:<7} {name:28s}: {results[name, rate][0]:6.2f} bits/item, false positive rate {results[name, rate][1]:.6f}, "
+                     f"{inserts:12,.0f} inserts/s, {queries:12,.0f} queries/s")
+        return bloom_filter
+
+    for rate in false_positive_rates:
+        m, k = calculate_bloom_filter_size(num_items, rate)
+        for name, bloom_filter in [('bloomfilter1', BloomFilter(num_items, rate)),
+                                   ('counting', CountingBloomFilter(num_items, rate))]:
+            measure_space(name, rate, bloom_filter, bloom_filter.insert_many, bloom_filter.query_many)
+        for name, bloom_filter in [('kirsch-mitzenmacher', ImprovedBloomFilter(m, k, method='kirsch-mitzenmacher')),
+                                   ('blocked', BlockedBloomFilter(m, k))]:
+            measure_space(name, rate, bloom_filter, bloom_filter.add_many, bloom_filter.check_many)
+        cuckoo = CuckooFilter(num_items, rate)
+        measure_space('cuckoo', rate, cuckoo, cuckoo.insert_many, cuckoo.query_many)
+        bound = cuckoo.false_positive_bound()
+        matched = BloomFilter(num_items, bound)
+        measure_space(f'bloomfilter1 at f = {bound:.2g}', rate, matched, matched.insert_many, matched.query_many)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of per-item versus batched Bloom filter inserts and queries")
+    parser.add_argument('--num-items', type=int, default=1000000, help="Number of items inserted and queried")
+    parser.add_argument('--f', type=float, default=0.01, help="False positive rate used to size the filters")
+    parser.add_argument('--space', action='store_true', help="Compare bits per item and throughput of the Bloom and cuckoo filters at f = 0.05, 0.001 and 0.00001 instead")
+    args = parser.parse_args()
+    if args.space:
+        run_space_benchmark(args.num_items)
+    else:
+        run_benchmark(args.num_items, args.f)
+
+
+if __name__ == "__main__":
+    main()
+
+# python -m src.a2.benchmark_bloom --num-items 1000000
+# python -m src.a2.benchmark_bloom --num-items 1000000 --space
@@ -0,0 +1,97 @@
+import argparse
+import logging
+import random
+import time
+
+from .dedup import clean_and_normalize, iter_tsv_no_headers
+from .lsh_index import LSHIndex
+from .signatures import compute_signatures
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def make_queries(documents, num_queries: int, edit_rate: float, seed: int = 0):
+    """
+    Builds near-duplicate queries by replacing a fraction of the words of randomly chosen documents.
+    :param documents: List of dictionaries with 'id' and normalized 'text'.
+    :param num_queries: Number of queries.
+    :param edit_rate: Fraction of words replaced in each query.
+    :param seed: Seed of the random generator.
+    :return: List of (source row, query text).
+    """
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(range(len(documents)), min(num_queries, len(documents))):
+        words = documents[row]['text'].split()
+        for position in rng.sample(range(len(words)), int(len(words) * edit_rate)):
+            words[position] = f"edit{rng.randrange(1 << 30)}"
+        queries.append((row, " ".join(words)))
+    return queries
+
+
+def index_bytes(index: LSHIndex) -> int:
+    """
+    :return: Size of the band tables (bucket keys and rows) of an index in bytes.
+    """
+    return index.bucket_keys.nbytes + index.bucket_rows.nbytes
+
+
+def run_benchmark(file_path: str, num_bands: int, rows_per_band: int, probe_budgets, num_queries: int,
+                  edit_rate: float):
+    """
+    Compares the recall and band-table memory of plain banding, a table with twice the bands,
+    and multi-probe queries on the smaller table.
+    :param file_path: Input TSV file without headers.
+    :param num_bands: Number of bands of the smaller table.
+    :param rows_per_band: Rows per band.
+    :param probe_budgets: Multi-probe budgets to evaluate on the smaller table.
+    :param num_queries: Number of near-duplicate queries.
+    :param edit_rate: Fraction of words replaced in each query.
+    :return: List of result dictionaries, one per configuration.
+    """
+    documents = [{'id': doc['id'], 'text': clean_and_normalize(doc['text'])} for doc in iter_tsv_no_headers(file_path)]
+    num_hashes = 2 * num_bands * rows_per_band
+    signatures = compute_signatures([doc['text'] for doc in documents], 'word_shingle', num_hashes, engine='numpy')
+    queries = make_queries(documents, num_queries, edit_rate)
+
+    configurations = [(num_bands, 0), (2 * num_bands, 0)] + [(num_bands, probes) for probes in probe_budgets]
+    results = []
+    for bands, probes in configurations:
+        index = LSHIndex.from_documents(documents, num_hashes, bands, rows_per_band, signatures=signatures)
+        start = time.perf_counter()
+        found = candidates = 0
+        for row, text in queries:
+            if probes:
+                signature, runner_up = index.sign_with_runner_up(text)
+            else:
+                signature, runner_up = index.sign(text), None
+            rows = index.candidates(signature, runner_up, probes)
+            found += int(row in set(rows.tolist()))
+            candidates += rows.size
+        elapsed = time.perf_counter() - start
+        results.append({'bands': bands, 'probes': probes, 'recall': found / len(queries),
+                        'candidates': candidates / len(queries), 'table_bytes': index_bytes(index),
+                        'ms_per_query': 1000 * elapsed / len(queries)})
+        logging.info(f"bands={bands:3d} probes={probes:3d} recall={results[-1]['recall']:.3f} "
+                     f"candidates/query={results[-1]['candidates']:.1f} table={results[-1]['table_bytes'] / 1024:.0f} KiB "
+                     f"{results[-1]['ms_per_query']:.2f} ms/query")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall versus band-table memory of plain banding and multi-probe LSH")
+    parser.add_argument('input_file', help="Path to the input TSV file")
+    parser.add_argument('--num-bands', type=int, default=10, help="Bands of the smaller table; the baseline doubles it")
+    parser.add_argument('--rows-per-band', type=int, default=4, help="Rows per band")
+    parser.add_argument('--probes', type=int, nargs='+', default=[5, 10, 20, 40], help="Probe budgets to evaluate")
+    parser.add_argument('--num-queries', type=int, default=200, help="Number of near-duplicate queries")
+    parser.add_argument('--edit-rate', type=float, default=0.15, help="Fraction of words replaced in each query")
+    args = parser.parse_args()
+    run_benchmark(args.input_file, args.num_bands, args.rows_per_band, args.probes, args.num_queries, args.edit_rate)
+
+
+if __name__ == "__main__":
+    main()
+
+# python -m src.a2.benchmark_lsh data/onek.tsv
+# python -m src.a2.benchmark_lsh data/onek.tsv --num-bands 10 --rows-per-band 4 --probes 10 20 40 --edit-rate 0.2
@@ -0,0 +1,133 @@
+import os
+import json
+import mmap as _mmap
+import logging
+
+import numpy as np
+from bitarray import bitarray
+
+# On-disk layout of a saved Bloom filter:
+#   MAGIC (8 bytes) | format version (uint32) | header length (uint32) | JSON header | bit arrays
+# The header records the filter class, its parameters, the hash method and the number of
+# inserted items; every bit array starts on a 64-byte boundary so it can be mapped in place.
+MAGIC = b'A2BLOOM\x00'
+FORMAT_VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE_SIZE = len(MAGIC) + 8
+# Lines read and hashed per batch when a file of items is inserted, queried or removed
+LINE_CHUNK_SIZE = 100000
+
+
+def iter_line_chunks(path: str, chunk_size: int = LINE_CHUNK_SIZE):
+    """
+    Reads a file of one item per line in lists of at most chunk_size stripped lines.
+    Gives the lines of file.read().strip().splitlines(): blank lines before the first and
+    after the last item are skipped, blank lines in between are kept as ''.
+    :param path: Path of the file.
+    :param chunk_size: Maximum number of lines per list.
+    :return: Generator of lists of stripped lines.
+    """
+    chunk, blanks, started = [], 0, False
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                blanks += started
+                continue
+            started = True
+            for item in [''] * blanks + [line]:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            blanks = 0
+    if chunk:
+        yield chunk
+
+
+def write_filter(path: str, header: dict, bit_arrays) -> None:
+    """
+    Writes the bit arrays of a Bloom filter and its header to one file.
+    :param path: Destination path.
+    :param header: JSON-serializable description: 'filter', 'params', 'hash' and 'num_items'.
+    :param bit_arrays: List of big-endian bitarrays (one per chunk for chunked filters).
+    """
+    layout, offset = [], 0
+    for bits in bit_arrays:
+        layout.append({'offset': offset, 'nbytes': len(bits.tobytes()), 'bits': len(bits)})
+        offset += -(-layout[-1]['nbytes'] // _ALIGNMENT) * _ALIGNMENT
+    header = dict(header, format_version=FORMAT_VERSION, arrays=layout)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(_PREAMBLE_SIZE + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+
+    # Written beside the target and renamed over it, so a filter mapped from the old file
+    # (e.g. loaded, updated and saved back to the same path) keeps reading intact pages
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(np.array([FORMAT_VERSION, len(header_bytes)], dtype='<u4').tobytes())
+        file.write(header_bytes)
+        for spec, bits in zip(layout, bit_arrays):
+            file.seek(data_start + spec['offset'])
+            file.write(bits.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(temporary_path, path)
+    logging.info(f"Saved {header['filter']} with {header['num_items']} items to {path}.")
+
+
+def read_header(path: str):
+    """
+    Reads and validates the header of a saved Bloom filter.
+    :param path: Path to the filter file.
+    :return: Tuple of the header dictionary and the file offset where the bit arrays start.
+    """
+    with open(path, 'rb') as file:
+        preamble = file.read(_PREAMBLE_SIZE)
+        if len(preamble) < _PREAMBLE_SIZE or preamble[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a Bloom filter file.")
+        version, header_length = np.frombuffer(preamble[len(MAGIC):], dtype='<u4')
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has Bloom filter format version {version}; "
+                             f"this version reads format {FORMAT_VERSION}. Rebuild the filter.")
+        header = json.loads(file.read(int(header_length)).decode('utf-8'))
+    data_start = -(-(_PREAMBLE_SIZE + int(header_length)) // _ALIGNMENT) * _ALIGNMENT
+    return header, data_start
+
+
+def read_filter(path: str, expected_filter: str, mmap: bool = True):
+    """
+    Opens a saved Bloom filter, mapping its bits copy-on-write by default: pages are only read
+    when a query touches them, and later inserts change the process's copy, never the file.
+    :param path: Path to the filter file.
+    :param expected_filter: Class name the file must have been saved from.
+    :param mmap: Map the bits instead of reading them into memory.
+    :return: Tuple of the header dictionary and the list of bitarrays.
+    """
+    header, data_start = read_header(path)
+    if header['filter'] != expected_filter:
+        raise ValueError(f"{path} holds a {header['filter']}, not a {expected_filter}.")
+    bit_arrays = []
+    with open(path, 'rb') as file:
+        if mmap:
+            buffer = memoryview(_mmap.mmap(file.fileno(), 0, access=_mmap.ACCESS_COPY))
+        for spec in header['arrays']:
+            start = data_start + spec['offset']
+            if mmap:
+                # A mapped bitarray cannot be resized, so it keeps the padding bits of its last byte
+                bit_arrays.append(bitarray(buffer=buffer[start:start + spec['nbytes']], endian='big'))
+            else:
+                file.seek(start)
+                bits = bitarray(endian='big')
+                bits.frombytes(file.read(spec['nbytes']))
+                del bits[spec['bits']:]
+                bit_arrays.append(bits)
+    return header, bit_arrays
+
+
+def check_hash(path: str, header: dict, expected_hash: str) -> None:
+    """
+    Raises ValueError if a saved filter was built with a hash method other than the one the loading code computes.
+    """
+    if header['hash'] != expected_hash:
+        raise ValueError(f"{path} was built with hash method {header['hash']}; "
+                         f"{header['filter']} now uses {expected_hash}. Rebuild the filter.")
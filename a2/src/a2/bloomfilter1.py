@@ -1,14 +1,99 @@
+import sys
 import math 
+import logging
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ProcessPoolExecutor
 import mmh3
+import numpy as np
 import pandas as pd
 from bitarray import bitarray
-import nltk
-from nltk import ngrams
+from .shingling import word_shingle_hashes, word_shingle_hashes_many
+from .bloom_io import write_filter, read_filter, check_hash, iter_line_chunks
+
+# Hash method recorded in saved filters: k positions from one 128-bit murmur3 hash by double hashing
+HASH_METHOD = 'murmur3_x64_128-double'
+_MASK_64 = (1 << 64) - 1
+_LOW_32 = np.uint64(0xFFFFFFFF)
+_SHIFT_32 = np.uint64(32)
+_BIT_MASKS = np.array([0x80 >> i for i in range(8)], dtype=np.uint8)
+# Largest value of a 4-bit counter; a counter that reaches it stays there
+MAX_COUNT = 15
+# A shared-memory filter starts with n, f, m, k and the item count; its bits follow on the next cache line
+_SHARED_HEADER = np.dtype([('n', '<i8'), ('f', '<f8'), ('m', '<u8'), ('k', '<u8'), ('num_items', '<i8')])
+_SHARED_BITS_OFFSET = 64
+
+class _ShingledText:
+    """Document methods shared by the filters below: a document is shingled into word 4-grams,
+    hashed to 64-bit integers and stored through the filter's insert_hashes/query_hashes.
+
+    Documents and single items are separate namespaces: insert/query hash the item string itself,
+    insert_txt/query_txt hash its lowercased word 4-grams, so an item inserted with one pair is
+    not found by the other.
+    """
+    def insert_txt(self, doc_item) -> None:
+        """Insert text into Bloom Filter. The document is shingled into word 4-grams, hashed
+        to a numpy array in one pass and inserted as a batch; query it back with query_txt,
+        not query, which hashes the whole string as one item.
+
+        Args:
+            doc_item (Object): document
+        """
+        self.insert_hashes(word_shingle_hashes(doc_item.lower(), 4))
+
+    def query_txt(self, doc_item) -> bool:
+        """Check if a query is possibly in the Bloom filter by breaking it into n-grams and querying each n-gram.
+
+        Args:
+            query_text (str): The text to query.
+
+        Returns:
+            bool: True if all n-grams of the query are possibly in the filter, False if any n-gram is definitely not in the filter.
+        """
+        # If any n-gram is not found, return False
+        return bool(self.query_hashes(word_shingle_hashes(doc_item.lower(), 4)).all())
+
+    def _txt_hashes(self, documents):
+        """Shingle a batch of documents into one hash array, with the offsets of every document's shingles
+
+        Args:
+            documents (Iterable): documents
+
+        Returns:
+            tuple: uint64 shingle hashes of all documents, and len(documents) + 1 offsets
+        """
+        return word_shingle_hashes_many([doc_item.lower() for doc_item in documents], 4)
+
+    def insert_txt_many(self, documents) -> None:
+        """Insert a batch of documents; the same as insert_txt on each, with one bulk bit update
+
+        Args:
+            documents (Iterable): documents
+        """
+        self.insert_hashes(self._txt_hashes(documents)[0])
+
+    def query_txt_many(self, documents):
+        """Check a batch of documents; the same as query_txt on each, with one bulk bit lookup
+
+        Args:
+            documents (Iterable): documents
+
+        Returns:
+            np.ndarray: boolean array, True where all n-grams of the document are possibly in the filter
+        """
+        hashes, offsets = self._txt_hashes(documents)
+        misses = np.zeros(hashes.size + 1, dtype=np.int64)
+        misses[1:] = np.cumsum(~self.query_hashes(hashes))
+        return misses[offsets[1:]] == misses[offsets[:-1]]
+
 
 # Construction of Bloom Filter using Bitarray 
-class BloomFilter:
+class BloomFilter(_ShingledText):
     """Implementation of Bloom filter use ppython wrapper for murmurhas, mmh3
     """
+    # What one position of the array holds; filters only combine with filters of the same storage
+    _storage = 'bits'
+
     def __init__(self,n, f, m = 0, k = 0) -> None:
         """Initialize a Bloom Filter with given n and false posive rate.
             a bit array [0, m-1] with all slots initially set to 0
@@ -24,8 +109,9 @@ class BloomFilter:
         self.f = f
         self.m = m if m !=0 else self.calculateM()
         self.k = k if k != 0 else self.calculateK()
+        self.num_items = 0 # number of items inserted so far
 
-        self.bit_array = bitarray(self.m)
+        self.bit_array = bitarray(self.m, endian='big')
         self.bit_array.setall(0) # set all slots to 0 initially
         self.printParameters()
 
@@ -58,9 +144,12 @@ class BloomFilter:
         Args:
             item (Object): a given item to be hashed and added to Bloom Filter
         """
+        # The k indices follow from one 128-bit hash, g_i = h1 + i * h2 mod 2^64 mod m, as in insert_many
+        h1, h2 = mmh3.hash64(item, signed=False)
+        m, bit_array = self.m, self.bit_array
         for i in range(self.k):
-            index = mmh3.hash(item, i) % self.m
-            self.bit_array[index] = 1
+            bit_array[((h1 + i * h2) & _MASK_64) % m] = 1
+        self.num_items += 1
 
     def query(self, item) -> bool:
         """To see whether some element is in the Bloom Filter, we use this query function to look it up. We use k hashes of x and see if the corresponding bits are turned on.
@@ -72,40 +161,805 @@ class BloomFilter:
         Returns:
             Boolean: Boolean value of whether the item is in Bloom Filter
         """
+        h1, h2 = mmh3.hash64(item, signed=False)
+        m, bit_array = self.m, self.bit_array
         for i in range(self.k):
-            index = mmh3.hash(item, i) % self.m
-            if self.bit_array[index] == 0:
+            if bit_array[((h1 + i * h2) & _MASK_64) % m] == 0:
                 return False
             
         return True
-    
-    def insert_txt(self, doc_item) -> None:
-        """Insert text into Bloom Filter
+
+    def _double_hash(self, h1, h2):
+        """Derive k bit positions per hash pair with double hashing, g_i(x) = h1(x) + i * h2(x) mod 2^64 mod m
+
+        Args:
+            h1 (np.ndarray): uint64 first hashes
+            h2 (np.ndarray): uint64 second hashes
+
+        Returns:
+            np.ndarray: (len(h1), k) array of bit positions
+        """
+        steps = np.arange(self.k, dtype=np.uint64).reshape(1, -1)
+        return (h1.reshape(-1, 1) + steps * h2.reshape(-1, 1)) % np.uint64(self.m)
+
+    def _hash_indices(self, hashes):
+        """Derive the k bit positions of every 64-bit shingle hash with double hashing,
+        where h1 and h2 are the two 32-bit halves of the hash.
+
+        Args:
+            hashes (np.ndarray): uint64 shingle hashes
+
+        Returns:
+            np.ndarray: (len(hashes), k) array of bit positions
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        return self._double_hash(hashes & _LOW_32, hashes >> _SHIFT_32)
+
+    def _items_indices(self, items):
+        """Derive the k bit positions of every item from one 128-bit murmur3 hash per item,
+        whose two 64-bit halves are h1 and h2 of the double hashing.
+
+        Args:
+            items (Iterable): str or bytes items
+
+        Returns:
+            np.ndarray: (len(items), k) array of bit positions
+        """
+        digests = b"".join([mmh3.hash_bytes(item) for item in items])
+        halves = np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+        return self._double_hash(halves[:, 0], halves[:, 1])
+
+    def _set_bits(self, indices) -> None:
+        indices = indices.ravel()
+        bits = np.frombuffer(self.bit_array, dtype=np.uint8)
+        np.bitwise_or.at(bits, indices >> np.uint64(3), _BIT_MASKS[indices & np.uint64(7)])
+
+    def _test_bits(self, indices):
+        bits = np.frombuffer(self.bit_array, dtype=np.uint8)
+        found = (bits[indices >> np.uint64(3)] & _BIT_MASKS[indices & np.uint64(7)]) != 0
+        return found.all(axis=1)
+
+    def insert_many(self, items) -> None:
+        """Insert a batch of items, setting all their bits at once. Sets the same bits as insert.
+
+        Args:
+            items (Iterable): str or bytes items
+        """
+        indices = self._items_indices(items)
+        self._set_bits(indices)
+        self.num_items += len(indices)
+
+    def query_many(self, items):
+        """Look up a batch of items
+
+        Args:
+            items (Iterable): str or bytes items
+
+        Returns:
+            np.ndarray: boolean array, True where the item is possibly in the Bloom Filter
+        """
+        return self._test_bits(self._items_indices(items))
+
+    def insert_hashes(self, hashes) -> None:
+        """Insert a batch of 64-bit shingle hashes, setting all their bits at once
+
+        Args:
+            hashes (np.ndarray): uint64 shingle hashes, e.g. from shingling.word_shingle_hashes
+        """
+        indices = self._hash_indices(hashes)
+        self._set_bits(indices)
+        self.num_items += len(indices)
+
+    def query_hashes(self, hashes):
+        """Look up a batch of 64-bit shingle hashes
+
+        Args:
+            hashes (np.ndarray): uint64 shingle hashes
+
+        Returns:
+            np.ndarray: boolean array, True where the hash is possibly in the Bloom Filter
+        """
+        return self._test_bits(self._hash_indices(hashes))
+
+    def save(self, path) -> None:
+        """Save the filter to one file: a header with n, f, m, k, the hash method and the item count, then the bits
+
+        Args:
+            path (str): destination path
+        """
+        header = {'filter': type(self).__name__, 'params': {'n': self.n, 'f': self.f, 'm': self.m, 'k': self.k},
+                  'hash': HASH_METHOD, 'num_items': self.num_items}
+        write_filter(path, header, [self.bit_array])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a filter written by save. With mmap the bits are mapped copy-on-write instead of read,
+        so startup does not depend on the filter size; inserts after loading never change the file.
+
+        Args:
+            path (str): path of the saved filter
+            mmap (bool): map the bits instead of reading them into memory
+
+        Returns:
+            BloomFilter: the loaded filter
+        """
+        header, (bit_array,) = read_filter(path, cls.__name__, mmap)
+        check_hash(path, header, HASH_METHOD)
+        return cls._from_bits(header['params'], header['num_items'], bit_array)
+
+    @classmethod
+    def _from_bits(cls, params, num_items, bit_array):
+        """Rebuild a filter around an existing bit array without allocating a new one
+
+        Args:
+            params (dict): n, f, m and k
+            num_items (int): number of items inserted
+            bit_array (bitarray): the filter's bits
+
+        Returns:
+            BloomFilter: the filter
+        """
+        bloom_filter = cls.__new__(cls)
+        bloom_filter.n, bloom_filter.f = params['n'], params['f']
+        bloom_filter.m, bloom_filter.k = params['m'], params['k']
+        bloom_filter.num_items = num_items
+        bloom_filter.bit_array = bit_array
+        return bloom_filter
+
+    def _params(self) -> dict:
+        return {'n': self.n, 'f': self.f, 'm': self.m, 'k': self.k}
+
+    def _check_compatible(self, other) -> None:
+        """Raise ValueError unless other hashes items the same way into the same layout: a BloomFilter
+        (every one uses HASH_METHOD) of the same storage with the same m and k, e.g. a plain and a shared filter
+
+        Args:
+            other (BloomFilter): filter to combine with
+        """
+        if not isinstance(other, BloomFilter) or other._storage != self._storage:
+            raise ValueError(f"Cannot combine a {type(self).__name__} with a {type(other).__name__}: "
+                             f"their arrays hold different things or are hashed differently.")
+        if (other.m, other.k) != (self.m, self.k):
+            raise ValueError(f"Cannot combine a filter with m = {self.m}, k = {self.k} and one with "
+                             f"m = {other.m}, k = {other.k}; build both with the same m and k (or n and f).")
+
+    def _combined(self, other, union):
+        """OR (union) or AND (intersection) of the two bit arrays; mapped arrays keep padding bits, so both are cut to m"""
+        if union:
+            return self.bit_array[:self.m] | other.bit_array[:other.m]
+        return self.bit_array[:self.m] & other.bit_array[:other.m]
+
+    def _count_set(self) -> int:
+        return self.bit_array[:self.m].count()
+
+    def union(self, other):
+        """Merge two filters with the same parameters, e.g. built on different shards of the input.
+        The result answers like one filter that every item of both was inserted into.
+
+        Args:
+            other (BloomFilter): filter with the same storage, m and k, see _check_compatible
+
+        Returns:
+            BloomFilter: new filter; its num_items is the sum of both, exact for disjoint shards
+        """
+        self._check_compatible(other)
+        return type(self)._from_bits(self._params(), self.num_items + other.num_items, self._combined(other, True))
+
+    def intersection(self, other):
+        """Intersect two filters with the same parameters. An item of both sets is always found in the result;
+        the result has more false positives than a filter built from the overlap alone.
+
+        Args:
+            other (BloomFilter): filter with the same storage, m and k, see _check_compatible
+
+        Returns:
+            BloomFilter: new filter; its num_items estimates the size of the overlap, see estimate_num_items
+        """
+        self._check_compatible(other)
+        overlap = self.estimate_num_items() + other.estimate_num_items() - self.union(other).estimate_num_items()
+        return type(self)._from_bits(self._params(), max(0, round(overlap)), self._combined(other, False))
+
+    def estimate_num_items(self) -> float:
+        """Estimate the number of distinct items inserted from the share of set bits,
+        n* = -m / k * ln(1 - X / m) (Swamidass and Baldi)
+
+        Returns:
+            float: estimated number of distinct items, inf if every bit is set
+        """
+        set_bits = self._count_set()
+        if set_bits >= self.m:
+            return math.inf
+        return -self.m / self.k * math.log(1 - set_bits / self.m)
+
+
+class ScalableBloomFilter(_ShingledText):
+    """Bloom filter that grows with its input (Almeida et al., "Scalable Bloom Filters").
+
+    It is a chain of BloomFilters. Once the newest one holds its capacity, a new one is added
+    with growth times the capacity and tightening times the false positive rate. The sub-filter
+    rates f * (1 - tightening) * tightening^i sum to at most f, so the overall false positive
+    rate stays below f however many items are inserted. Items are inserted into the newest
+    sub-filter and found in any of them.
+    """
+    def __init__(self, n, f, growth = 2, tightening = 0.9) -> None:
+        """Initialize the chain with one sub-filter of capacity n
+
+        Args:
+            n (int): capacity of the first sub-filter
+            f (numeric): bound on the overall false positive rate
+            growth (numeric): capacity ratio between consecutive sub-filters, at least 1
+            tightening (numeric): false positive rate ratio between consecutive sub-filters, in (0, 1)
+        """
+        if not 0 < f < 1:
+            raise ValueError(f"False positive rate must be in (0, 1), got {f}.")
+        if growth < 1 or not 0 < tightening < 1:
+            raise ValueError("growth must be at least 1 and tightening in (0, 1).")
+        self.n = n
+        self.f = f
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+        self._add_filter()
+
+    def _add_filter(self) -> BloomFilter:
+        """Append a sub-filter with the next capacity and false positive rate
+
+        Returns:
+            BloomFilter: the new sub-filter
+        """
+        i = len(self.filters)
+        capacity = math.ceil(self.n * self.growth ** i)
+        error = self.f * (1 - self.tightening) * self.tightening ** i
+        self.filters.append(BloomFilter(capacity, error))
+        return self.filters[-1]
+
+    def _remaining(self) -> int:
+        """Number of items the newest sub-filter still takes, adding a sub-filter when it is full
+
+        Returns:
+            int: remaining capacity of the newest sub-filter
+        """
+        newest = self.filters[-1]
+        if newest.num_items >= newest.n:
+            newest = self._add_filter()
+        return newest.n - newest.num_items
+
+    @property
+    def num_items(self) -> int:
+        """Number of items inserted into all sub-filters"""
+        return sum(bloom_filter.num_items for bloom_filter in self.filters)
+
+    @property
+    def m(self) -> int:
+        """Total number of bits of all sub-filters"""
+        return sum(bloom_filter.m for bloom_filter in self.filters)
+
+    def false_positive_bound(self) -> float:
+        """Upper bound on the false positive rate of the chain as it is, 1 - prod(1 - f_i)
+
+        Returns:
+            float: false positive rate bound, at most f
+        """
+        return 1 - math.prod(1 - bloom_filter.f for bloom_filter in self.filters)
+
+    def insert(self, item) -> None:
+        """Insert an item into the newest sub-filter, growing the chain when it is full
+
+        Args:
+            item (Object): a given item to be hashed and added to Bloom Filter
+        """
+        self._remaining()
+        self.filters[-1].insert(item)
+
+    def query(self, item) -> bool:
+        """Look up an item in every sub-filter
+
+        Args:
+            item (Object): given item to look up
+
+        Returns:
+            Boolean: Boolean value of whether the item is in one of the sub-filters
+        """
+        return any(bloom_filter.query(item) for bloom_filter in self.filters)
+
+    def _insert_batch(self, batch, insert) -> None:
+        """Split a batch over the sub-filters by their remaining capacity
+
+        Args:
+            batch (Sequence): items or hashes
+            insert (Callable): insert_many or insert_hashes of BloomFilter
+        """
+        start = 0
+        while start < len(batch):
+            end = start + self._remaining()
+            insert(self.filters[-1], batch[start:end])
+            start = end
+
+    def insert_many(self, items) -> None:
+        """Insert a batch of items, filling and adding sub-filters as needed
+
+        Args:
+            items (Iterable): str or bytes items
+        """
+        self._insert_batch(list(items), BloomFilter.insert_many)
+
+    def query_many(self, items):
+        """Look up a batch of items in every sub-filter
+
+        Args:
+            items (Iterable): str or bytes items
+
+        Returns:
+            np.ndarray: boolean array, True where the item is possibly in the filter
+        """
+        items = list(items)
+        found = np.zeros(len(items), dtype=bool)
+        for bloom_filter in self.filters:
+            found |= bloom_filter.query_many(items)
+        return found
+
+    def insert_hashes(self, hashes) -> None:
+        """Insert a batch of 64-bit shingle hashes, filling and adding sub-filters as needed
+
+        Args:
+            hashes (np.ndarray): uint64 shingle hashes, e.g. from shingling.word_shingle_hashes
+        """
+        self._insert_batch(np.asarray(hashes, dtype=np.uint64), BloomFilter.insert_hashes)
+
+    def query_hashes(self, hashes):
+        """Look up a batch of 64-bit shingle hashes in every sub-filter
+
+        Args:
+            hashes (np.ndarray): uint64 shingle hashes
+
+        Returns:
+            np.ndarray: boolean array, True where the hash is possibly in the filter
+        """
+        found = np.zeros(len(hashes), dtype=bool)
+        for bloom_filter in self.filters:
+            found |= bloom_filter.query_hashes(hashes)
+        return found
+
+    def save(self, path) -> None:
+        """Save the chain to one file: a header with the chain and sub-filter parameters, then the bits of every sub-filter
+
+        Args:
+            path (str): destination path
+        """
+        header = {'filter': type(self).__name__, 'hash': HASH_METHOD, 'num_items': self.num_items,
+                  'params': {'n': self.n, 'f': self.f, 'growth': self.growth, 'tightening': self.tightening},
+                  'filters': [{'n': bloom_filter.n, 'f': bloom_filter.f, 'm': bloom_filter.m, 'k': bloom_filter.k,
+                               'num_items': bloom_filter.num_items} for bloom_filter in self.filters]}
+        write_filter(path, header, [bloom_filter.bit_array for bloom_filter in self.filters])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a chain written by save; see BloomFilter.load
+
+        Args:
+            path (str): path of the saved filter
+            mmap (bool): map the bits instead of reading them into memory
+
+        Returns:
+            ScalableBloomFilter: the loaded filter, ready to keep growing
+        """
+        header, bit_arrays = read_filter(path, cls.__name__, mmap)
+        check_hash(path, header, HASH_METHOD)
+        scalable = cls.__new__(cls)
+        scalable.n, scalable.f = header['params']['n'], header['params']['f']
+        scalable.growth, scalable.tightening = header['params']['growth'], header['params']['tightening']
+        scalable.filters = [BloomFilter._from_bits(params, params['num_items'], bit_array)
+                            for params, bit_array in zip(header['filters'], bit_arrays)]
+        return scalable
+
+
+class CountingBloomFilter(BloomFilter):
+    """Bloom filter with 4-bit counters instead of bits, so items can be removed again.
+
+    Two counters are packed per byte of a NumPy array, counter j in the low (even j) or high
+    (odd j) nibble of byte j // 2. Inserting increments the k counters of an item, removing
+    decrements them and a query tests that all are non-zero. The positions are the same as
+    BloomFilter's. A counter that reaches MAX_COUNT saturates: it is never incremented past it
+    nor decremented again, so an overflow can cost false positives but never false negatives.
+    """
+    _storage = 'counters'
+
+    def __init__(self, n, f, m = 0, k = 0) -> None:
+        """Initialize a Counting Bloom Filter with given n and false positive rate; m counters take m / 2 bytes
+
+        Args:
+            n (int): number of elements, dataset size
+            f (numeric): false positive rate
+            m (int): number of counters
+            k (int): number of hash functions
+        """
+        self.n = n
+        self.f = f
+        self.m = m if m !=0 else self.calculateM()
+        self.k = k if k != 0 else self.calculateK()
+        self.num_items = 0 # number of items inserted and not removed
+        self.counters = np.zeros((self.m + 1) // 2, dtype=np.uint8)
+        self.printParameters()
+
+    def counts(self, indices):
+        """Read counters
+
+        Args:
+            indices (np.ndarray): uint64 counter positions
+
+        Returns:
+            np.ndarray: uint8 counter values of the same shape
+        """
+        indices = np.asarray(indices, dtype=np.uint64)
+        return (self.counters[indices >> np.uint64(1)] >> ((indices & np.uint64(1)) << np.uint64(2)).astype(np.uint8)) & np.uint8(0xF)
+
+    def _update_counters(self, indices, step) -> None:
+        """Add step to the counters at indices (repeated positions add repeatedly), clamped to [0, MAX_COUNT];
+        saturated counters keep MAX_COUNT
+
+        Args:
+            indices (np.ndarray): uint64 counter positions
+            step (int): +1 to increment, -1 to decrement
+        """
+        positions, repeats = np.unique(np.asarray(indices, dtype=np.uint64).ravel(), return_counts=True)
+        current = self.counts(positions).astype(np.int64)
+        updated = np.clip(current + step * repeats, 0, MAX_COUNT)
+        updated[current == MAX_COUNT] = MAX_COUNT
+        # Even and odd counters share bytes, so each nibble half is written in its own pass
+        for nibble in (0, 1):
+            selected = (positions & np.uint64(1)) == np.uint64(nibble)
+            byte = positions[selected] >> np.uint64(1)
+            shift = 4 * nibble
+            kept = self.counters[byte] & np.uint8(0xF0 >> shift)
+            self.counters[byte] = kept | (updated[selected].astype(np.uint8) << np.uint8(shift))
+
+    def _set_bits(self, indices) -> None:
+        self._update_counters(indices, 1)
+
+    def _test_bits(self, indices):
+        return (self.counts(indices) > 0).all(axis=1)
+
+    def insert(self, item) -> None:
+        """Insert an item, incrementing its k counters
+
+        Args:
+            item (Object): a given item to be hashed and added to Bloom Filter
+        """
+        self.insert_many([item])
+
+    def query(self, item) -> bool:
+        """Look up an item
+
+        Args:
+            item (Object): given item to look up
+
+        Returns:
+            Boolean: Boolean value of whether the item is in Bloom Filter
+        """
+        return bool(self.query_many([item])[0])
+
+    def _remove_indices(self, indices):
+        """Decrement the counters of the rows of indices whose counters are all non-zero
+
+        Args:
+            indices (np.ndarray): (num_items, k) counter positions
+
+        Returns:
+            np.ndarray: boolean array, True where the item was possibly present and was removed
+        """
+        present = self._test_bits(indices)
+        self._update_counters(indices[present], -1)
+        self.num_items -= int(present.sum())
+        return present
+
+    def remove(self, item) -> bool:
+        """Remove an item inserted before. Items that are definitely absent are left alone, so removing
+        something never inserted cannot decrement the counters of other items.
+
+        Args:
+            item (Object): item to remove
+
+        Returns:
+            bool: True if the item was possibly present and was removed
+        """
+        return bool(self.remove_many([item])[0])
+
+    def remove_many(self, items):
+        """Remove a batch of items; see remove
+
+        Args:
+            items (Iterable): str or bytes items
+
+        Returns:
+            np.ndarray: boolean array, True where the item was removed
+        """
+        return self._remove_indices(self._items_indices(items))
+
+    def remove_hashes(self, hashes):
+        """Remove a batch of 64-bit shingle hashes; see remove
+
+        Args:
+            hashes (np.ndarray): uint64 shingle hashes
+
+        Returns:
+            np.ndarray: boolean array, True where the hash was removed
+        """
+        return self._remove_indices(self._hash_indices(hashes))
+
+    def remove_txt(self, doc_item) -> bool:
+        """Remove a document inserted with insert_txt. Its shingles are only removed if all of them
+        are possibly present, since a partial removal would take shingles away from other documents.
 
         Args:
             doc_item (Object): document
+
+        Returns:
+            bool: True if the document was possibly present and was removed
         """
-        tokens = doc_item.lower().split()
-        n_grams = ngrams(tokens, 4)
-        for piece in n_grams:
-            shingle = ' '.join(piece)
-            self.insert(shingle)
+        return bool(self.remove_txt_many([doc_item])[0])
 
-    def query_txt(self, doc_item) -> bool:
-        """Check if a query is possibly in the Bloom filter by breaking it into n-grams and querying each n-gram.
+    def remove_txt_many(self, documents):
+        """Remove a batch of documents; see remove_txt
 
         Args:
-            query_text (str): The text to query.
+            documents (Iterable): documents
 
         Returns:
-            bool: True if all n-grams of the query are possibly in the filter, False if any n-gram is definitely not in the filter.
+            np.ndarray: boolean array, True where the document was removed
         """
-        tokens = doc_item.lower().split()  # Tokenize and convert to lowercase
+        documents = list(documents)
+        present = self.query_txt_many(documents)
+        hashes, _ = self._txt_hashes([doc_item for doc_item, found in zip(documents, present) if found])
+        self._remove_indices(self._hash_indices(hashes))
+        return present
 
-        n_grams = ngrams(tokens, 4)
-        for piece in n_grams:
-            search_shingle = ' '.join(piece)
-            if not self.query(search_shingle):
-                return False  # If any n-gram is not found, return False
-    
-        return True
\ No newline at end of file
+    def save(self, path) -> None:
+        """Save the filter: a header with n, f, m, k, the hash method and the item count, then the packed counters
+
+        Args:
+            path (str): destination path
+        """
+        counters = bitarray(endian='big')
+        counters.frombytes(self.counters.tobytes())
+        header = {'filter': type(self).__name__, 'params': {'n': self.n, 'f': self.f, 'm': self.m, 'k': self.k},
+                  'hash': HASH_METHOD, 'num_items': self.num_items}
+        write_filter(path, header, [counters])
+
+    @classmethod
+    def _from_bits(cls, params, num_items, bit_array):
+        counting = cls.__new__(cls)
+        counting.n, counting.f = params['n'], params['f']
+        counting.m, counting.k = params['m'], params['k']
+        counting.num_items = num_items
+        # A view of the loaded (or copy-on-write mapped) bytes, not a copy
+        counting.counters = np.frombuffer(bit_array, dtype=np.uint8)[:(counting.m + 1) // 2]
+        return counting
+
+    def _combined(self, other, union):
+        """Counter-wise sum clamped to MAX_COUNT (union) or minimum (intersection), one nibble half at a time"""
+        combined = np.zeros_like(self.counters)
+        for shift in (np.uint8(0), np.uint8(4)):
+            mine = (self.counters >> shift) & np.uint8(0xF)
+            theirs = (other.counters >> shift) & np.uint8(0xF)
+            nibbles = np.minimum(mine + theirs, MAX_COUNT) if union else np.minimum(mine, theirs)
+            combined |= nibbles.astype(np.uint8) << shift
+        return combined
+
+    def _count_set(self) -> int:
+        return int(np.count_nonzero(self.counters & np.uint8(0xF)) + np.count_nonzero(self.counters >> np.uint8(4)))
+
+
+# Guards resource_tracker.register while a reader opens a segment, see _attach_segment
+_tracker_lock = threading.Lock()
+# Segments still exported by a view when their filter was collected; they stay mapped until exit
+_pinned_segments = []
+
+
+def _attach_segment(name):
+    """Open an existing shared memory segment without taking ownership of it. Before Python 3.13 every
+    SharedMemory registers its segment with the process's resource tracker, which unlinks it when the
+    tracker exits, and unregistering it again afterwards would also drop the owner's registration in a
+    tracker shared with the owner. A reader therefore opens the segment without registering it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _tracker_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedBloomFilter(BloomFilter):
+    """Bloom filter whose bits live in a named multiprocessing.shared_memory segment.
+
+    The filter that creates the segment is its owner and single writer. Any process on the machine, e.g.
+    every worker of a pool, attaches to the same bits by name with attach and queries them in place: nothing
+    is copied, and inserts of the writer are visible to the readers at once. Pickling the filter sends only
+    its name, so it can be passed to pool workers directly. Readers are read-only and never free the segment;
+    inserting through them raises ValueError, and only the owner unlinks it.
+    """
+    def __init__(self, n, f, m = 0, k = 0, name = None) -> None:
+        """Create the shared segment of a new, empty filter
+
+        Args:
+            n (int): number of elements, dataset size
+            f (numeric): false positive rate
+            m (int): number of bits in the Bloom Filter defining its size/space, size of filter
+            k (int): number of hash functions
+            name (str): name of the segment; a unique one is chosen by default
+        """
+        self.n = n
+        self.f = f
+        self.m = m if m !=0 else self.calculateM()
+        self.k = k if k != 0 else self.calculateK()
+        with _tracker_lock:
+            segment = shared_memory.SharedMemory(name=name, create=True, size=_SHARED_BITS_OFFSET + (self.m + 7) // 8)
+        np.ndarray(1, dtype=_SHARED_HEADER, buffer=segment.buf)[0] = (self.n, self.f, self.m, self.k, 0)
+        self._map(segment, owner=True)
+        self.bit_array.setall(0)
+        self.printParameters()
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the filter a writer created, for read-only queries
+
+        Args:
+            name (str): name of the segment, see SharedBloomFilter.name
+
+        Returns:
+            SharedBloomFilter: reader sharing the writer's bits
+        """
+        bloom_filter = cls.__new__(cls)
+        bloom_filter._map(_attach_segment(name), owner=False)
+        header = bloom_filter._header[0]
+        bloom_filter.n, bloom_filter.f = int(header['n']), float(header['f'])
+        bloom_filter.m, bloom_filter.k = int(header['m']), int(header['k'])
+        return bloom_filter
+
+    @classmethod
+    def from_filter(cls, bloom_filter, name = None):
+        """Copy a filter, e.g. one loaded with BloomFilter.load, into a new shared segment
+
+        Args:
+            bloom_filter (BloomFilter): filter to copy
+            name (str): name of the segment; a unique one is chosen by default
+
+        Returns:
+            SharedBloomFilter: writer holding the same bits and item count
+        """
+        shared = cls(bloom_filter.n, bloom_filter.f, bloom_filter.m, bloom_filter.k, name)
+        np.frombuffer(shared.bit_array, dtype=np.uint8)[:] = np.frombuffer(bloom_filter.bit_array, dtype=np.uint8)[:len(shared.bit_array) // 8]
+        shared.num_items = bloom_filter.num_items
+        return shared
+
+    def _map(self, segment, owner) -> None:
+        # The views must be dropped again before the segment is closed, see close
+        self.segment = segment
+        self.owner = owner
+        self._header = np.ndarray(1, dtype=_SHARED_HEADER, buffer=segment.buf)
+        self._bits_view = segment.buf[_SHARED_BITS_OFFSET:_SHARED_BITS_OFFSET + (int(self._header[0]['m']) + 7) // 8]
+        if not owner:
+            self._bits_view = self._bits_view.toreadonly()
+        # Like a memory-mapped bitarray, it keeps the padding bits of its last byte
+        self.bit_array = bitarray(buffer=self._bits_view, endian='big')
+
+    @property
+    def name(self) -> str:
+        return self.segment.name
+
+    @property
+    def num_items(self) -> int:
+        return int(self._header[0]['num_items'])
+
+    @num_items.setter
+    def num_items(self, value) -> None:
+        self._header['num_items'] = value
+
+    def __reduce__(self):
+        return (SharedBloomFilter.attach, (self.name,))
+
+    def _set_bits(self, indices) -> None:
+        if not self.owner:
+            raise ValueError(f"Shared Bloom filter {self.name} is attached read-only; insert through the process that created it.")
+        super()._set_bits(indices)
+
+    def insert(self, item) -> None:
+        if not self.owner:
+            raise ValueError(f"Shared Bloom filter {self.name} is attached read-only; insert through the process that created it.")
+        super().insert(item)
+
+    @classmethod
+    def _from_bits(cls, params, num_items, bit_array):
+        # Filters derived from a shared one (union, intersection) are ordinary in-process filters
+        return BloomFilter._from_bits(params, num_items, bit_array)
+
+    def save(self, path) -> None:
+        """Save the bits as a BloomFilter file; load it with BloomFilter.load and share it again with from_filter
+
+        Args:
+            path (str): destination path
+        """
+        self._from_bits(self._params(), self.num_items, self.bit_array[:self.m]).save(path)
+
+    def close(self) -> None:
+        """Detach from the segment. The segment itself stays until its owner calls unlink.
+        Raises BufferError while another view of the bits, e.g. a reference to bit_array, is alive."""
+        if not hasattr(self, 'bit_array'):
+            return
+        del self.bit_array, self._header
+        self._bits_view.release()
+        self.segment.close()
+
+    def unlink(self) -> None:
+        """Detach and free the segment; called once by the owner when no reader needs it any more"""
+        if not self.owner:
+            raise ValueError(f"Shared Bloom filter {self.name} is attached; only the process that created it frees it.")
+        self.close()
+        self.segment.unlink()
+
+    def __del__(self) -> None:
+        # The views are released before SharedMemory's own finalizer closes the segment under them
+        try:
+            self.close()
+        except BufferError:
+            # A view outlives the filter; closing the segment under it would fail in its finalizer
+            _pinned_segments.append(self.segment)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
+
+
+def _build_shard(task):
+    """Build one shard in a worker process: an empty filter with the given parameters and the documents of one file
+
+    Args:
+        task (tuple): filter class, parameters (n, f, m, k) and path of the shard file
+
+    Returns:
+        BloomFilter: the shard's filter
+    """
+    filter_class, params, path = task
+    bloom_filter = filter_class(params['n'], params['f'], params['m'], params['k'])
+    for documents in iter_line_chunks(path):
+        bloom_filter.insert_txt_many(documents)
+    return bloom_filter
+
+
+def build_sharded(bloom_filter, paths, workers = 1):
+    """Insert the documents of several files, one shard per file. With more than one worker every shard
+    is built into its own filter with the parameters of bloom_filter on a worker process, and the shards
+    are merged into bloom_filter with union.
+
+    Args:
+        bloom_filter (BloomFilter): filter to insert into; a ScalableBloomFilter only with one worker
+        paths (list): paths of the shard files, one document per line
+        workers (int): number of worker processes; 1 inserts every file in the current process
+
+    Returns:
+        BloomFilter: filter holding the documents of every file (a new, in-process one when the shards were merged)
+    """
+    workers = max(1, int(workers or 1))
+    if workers == 1 or len(paths) < 2:
+        for path in paths:
+            for documents in iter_line_chunks(path):
+                bloom_filter.insert_txt_many(documents)
+        return bloom_filter
+    if not isinstance(bloom_filter, BloomFilter):
+        raise ValueError(f"A {type(bloom_filter).__name__} cannot be merged from shards; use one worker.")
+    # Shards of a shared filter are ordinary filters: a segment created in a worker would outlive the worker
+    shard_class = BloomFilter if isinstance(bloom_filter, SharedBloomFilter) else type(bloom_filter)
+    tasks = [(shard_class, bloom_filter._params(), path) for path in paths]
+    logging.info(f"Building {len(tasks)} Bloom filter shards on {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard in executor.map(_build_shard, tasks):
+            bloom_filter = bloom_filter.union(shard)
+    return bloom_filter
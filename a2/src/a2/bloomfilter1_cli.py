@@ -1,6 +1,8 @@
 # bloomfilter1_cli.py
 
-from .bloomfilter1 import BloomFilter
+from .bloomfilter1 import BloomFilter, ScalableBloomFilter, CountingBloomFilter, build_sharded
+from .cuckoofilter import CuckooFilter
+from .bloom_io import read_header, iter_line_chunks
 import argparse
 import sys
 import logging
@@ -10,15 +12,23 @@ logging.basicConfig(level=logging.INFO)
 def main():
     if len(sys.argv) < 4:
         logging.error("""Usage: 
-                      python -m bloomfilter1_cli.py --init --n <number_of_elements> --f <falsepositive_rate> --insert-file <insert_file_path> --query-file <query_file_path> 
+                      python -m bloomfilter1_cli.py --init --n <number_of_elements> --f <falsepositive_rate> --insert-file <insert_file_path> [<insert_file_path> ...] [--workers <n>] --query-file <query_file_path> [--save <filter_path>]
+                      python -m bloomfilter1_cli.py --load <filter_path> --query-file <query_file_path>
                       """)
         sys.exit(1)
     parser = argparse.ArgumentParser(description="Bloom Filter CLI")
     parser.add_argument("--init", action="store_true", help="Initialize the Bloom Filter")
     parser.add_argument("--n", type=int, help="Number of elements (required for init)")
     parser.add_argument("--f", type=float, help="False positive rate (required for init)")
-    parser.add_argument("--insert-file", type=str, help="Path to the file to be inserted")
+    parser.add_argument("--insert-file", type=str, nargs='+', help="Path(s) to the file(s) to be inserted, one shard per file")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes building the shards of --insert-file in parallel")
     parser.add_argument("--query-file", type=str, help="Path to the file to query")
+    parser.add_argument("--scalable", action="store_true", help="Grow past --n: chain sub-filters while keeping the false positive rate below --f")
+    parser.add_argument("--counting", action="store_true", help="Use 4-bit counters so documents can be removed with --remove-file")
+    parser.add_argument("--cuckoo", action="store_true", help="Use a cuckoo filter: fingerprints in buckets, fewer bits per item than a Bloom filter below f = 0.1%%, and removal with --remove-file")
+    parser.add_argument("--remove-file", type=str, help="Path to a file of documents to remove (counting and cuckoo filters only); a cuckoo filter holds a set, so it also drops the shingles they share with documents it keeps")
+    parser.add_argument("--save", type=str, help="Save the filter to this path after inserting")
+    parser.add_argument("--load", type=str, help="Load a filter saved with --save instead of initializing one")
 
     args = parser.parse_args()
 
@@ -29,39 +39,88 @@ def main():
         if args.n is None or args.f is None:
             logging.error("Error: Please provide both --n and --f for initialization.")
             return
-        bloom_filter = BloomFilter(args.n, args.f)
-        logging.info(f"Bloom filter initialized with parameters: n = {bloom_filter.n}, f = {bloom_filter.f}, m = {bloom_filter.m}, k = {bloom_filter.k}")
+        if args.scalable + args.counting + args.cuckoo > 1:
+            logging.error("Error: --scalable, --counting and --cuckoo cannot be combined.")
+            return
+        if args.cuckoo:
+            bloom_filter = CuckooFilter(args.n, args.f)
+            logging.info(f"Cuckoo filter initialized with parameters: n = {bloom_filter.n}, f = {bloom_filter.f}, buckets = {bloom_filter.num_buckets}, bucket size = {bloom_filter.bucket_size}, fingerprint bits = {bloom_filter.fingerprint_bits}")
+        elif args.counting:
+            bloom_filter = CountingBloomFilter(args.n, args.f)
+            logging.info(f"Counting Bloom filter initialized with parameters: n = {bloom_filter.n}, f = {bloom_filter.f}, m = {bloom_filter.m}, k = {bloom_filter.k}")
+        elif args.scalable:
+            bloom_filter = ScalableBloomFilter(args.n, args.f)
+            logging.info(f"Scalable Bloom filter initialized with parameters: initial n = {bloom_filter.n}, f = {bloom_filter.f}")
+        else:
+            bloom_filter = BloomFilter(args.n, args.f)
+            logging.info(f"Bloom filter initialized with parameters: n = {bloom_filter.n}, f = {bloom_filter.f}, m = {bloom_filter.m}, k = {bloom_filter.k}")
+
+    # Load a saved Bloom Filter; its bits are memory-mapped, so startup does not depend on its size
+    elif args.load:
+        try:
+            header, _ = read_header(args.load)
+            filter_class = {cls.__name__: cls for cls in (ScalableBloomFilter, CountingBloomFilter, CuckooFilter)}.get(header['filter'], BloomFilter)
+            bloom_filter = filter_class.load(args.load)
+        except (FileNotFoundError, ValueError) as e:
+            logging.error(f"Error: Could not load the Bloom filter: {e}")
+            return
+        if isinstance(bloom_filter, CuckooFilter):
+            logging.info(f"Cuckoo filter loaded from {args.load}: {bloom_filter.report()}")
+        elif isinstance(bloom_filter, ScalableBloomFilter):
+            logging.info(f"Scalable Bloom filter loaded from {args.load} with parameters: initial n = {bloom_filter.n}, f = {bloom_filter.f}, sub-filters = {len(bloom_filter.filters)}, items = {bloom_filter.num_items}")
+        else:
+            logging.info(f"Bloom filter loaded from {args.load} with parameters: n = {bloom_filter.n}, f = {bloom_filter.f}, m = {bloom_filter.m}, k = {bloom_filter.k}, items = {bloom_filter.num_items}")
 
     # Check if the Bloom Filter has been initialized before proceeding
     if bloom_filter is None:
-        logging.error("Error: Bloom Filter not initialized. Run with --init first.")
+        logging.error("Error: Bloom Filter not initialized. Run with --init or --load first.")
         return
 
-    # Insert Items from the specified file
+    # Insert Items from the specified files; with --workers each file is built into its own shard and merged
     if args.insert_file:
+        if args.workers > 1 and isinstance(bloom_filter, (ScalableBloomFilter, CuckooFilter)):
+            logging.error("Error: scalable Bloom filters and cuckoo filters cannot be built from shards; use --workers 1.")
+            return
         try:
-            with open(args.insert_file, 'r') as f:
-                content = f.read().strip().splitlines()
-                for line in content:
-                    document = line.strip()
-                    bloom_filter.insert_txt(document)  # Add document to Bloom filter
-            logging.info(f"Inserted items from file: {args.insert_file}")
-        except FileNotFoundError:
-            logging.error(f"Error: The file {args.insert_file} does not exist.")
+            bloom_filter = build_sharded(bloom_filter, args.insert_file, args.workers)
+            logging.info(f"Inserted items from file(s): {', '.join(args.insert_file)}")
+            if isinstance(bloom_filter, ScalableBloomFilter):
+                logging.info(f"Scalable Bloom filter holds {bloom_filter.num_items} items in {len(bloom_filter.filters)} sub-filters; false positive rate bound = {bloom_filter.false_positive_bound():.4g}")
+            elif isinstance(bloom_filter, CuckooFilter):
+                logging.info(bloom_filter.report())
+        except FileNotFoundError as e:
+            logging.error(f"Error: The file {e.filename} does not exist.")
             return
-    else:
+        except ValueError as e:
+            logging.error(f"Error: {e} Initialize it with a larger --n.")
+            return
+    elif not args.load:
         logging.error("Please provide a valid path to the file for insertion using --insert-file")
 
+    # Remove expired documents, e.g. the oldest day of a sliding dedup window
+    if args.remove_file:
+        if not isinstance(bloom_filter, (CountingBloomFilter, CuckooFilter)):
+            logging.error("Error: --remove-file needs a counting Bloom filter (--counting) or a cuckoo filter (--cuckoo).")
+            return
+        try:
+            removed = total = 0
+            for documents in iter_line_chunks(args.remove_file):
+                removed += int(bloom_filter.remove_txt_many(documents).sum())
+                total += len(documents)
+            logging.info(f"Removed {removed} of {total} documents in {args.remove_file} from the filter.")
+        except FileNotFoundError:
+            logging.error(f"Error: The file {args.remove_file} does not exist.")
+            return
+
+    if args.save:
+        bloom_filter.save(args.save)
+
     # Query Items from the specified file
     if args.query_file:
         try:
             result = 0
-            with open(args.query_file, 'r') as f:
-                content = f.read().strip().splitlines()
-                for line in content:
-                    document = line.strip()
-                    if bloom_filter.query_txt(document):
-                        result += 1
+            for documents in iter_line_chunks(args.query_file):
+                result += int(bloom_filter.query_txt_many(documents).sum())
             if result > 0: 
                 logging.info(f"There are {result} items in {args.query_file} possibly in the filter.")
             else: 
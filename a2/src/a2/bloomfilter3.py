@@ -1,9 +1,242 @@
 # 3.1 - textbook
 
+import math
 import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from bitarray import bitarray
+from .bloom_io import write_filter, read_header, read_filter, check_hash, iter_line_chunks
 
-class StandardBloomFilter:
+_BIT_MASKS = np.array([0x80 >> i for i in range(8)], dtype=np.uint8)
+# Largest filter size whose 256-bit digest reduction fits uint64 arithmetic
+_MAX_VECTOR_SIZE = 1 << 32
+
+
+def _sha256_indices(items, seed, size):
+    """
+    Computes the index int(sha256(str(item) + str(seed))) % size of every item, as the filters' _hash does.
+    Only the digests are computed per item; the 256-bit remainders are reduced in bulk, 64 bits at a time.
+
+    Parameters:
+        items (list): The items to hash.
+        seed (int): The seed used to provide a unique hash function.
+        size (int): The modulus, i.e. the size of the bit array or chunk.
+
+    Returns:
+        np.ndarray: uint64 array with one index per item.
+    """
+    digests = [hashlib.sha256((str(item) + str(seed)).encode()).digest() for item in items]
+    if size > _MAX_VECTOR_SIZE:
+        return np.array([int.from_bytes(digest, 'big') % size for digest in digests], dtype=np.uint64)
+    limbs = np.frombuffer(b"".join(digests), dtype='>u8').reshape(-1, 4).astype(np.uint64)
+    modulus = np.uint64(size)
+    radix = np.uint64((1 << 64) % size)
+    remainder = np.zeros(len(digests), dtype=np.uint64)
+    for column in range(4):
+        remainder = (remainder * radix + limbs[:, column] % modulus) % modulus
+    return remainder
+
+
+def _set_bits(bits, indices):
+    """
+    Sets the bits at all indices of a big-endian bitarray at once.
+    """
+    indices = np.asarray(indices, dtype=np.uint64).ravel()
+    buffer = np.frombuffer(bits, dtype=np.uint8)
+    np.bitwise_or.at(buffer, indices >> np.uint64(3), _BIT_MASKS[indices & np.uint64(7)])
+
+
+def _test_bits(bits, indices):
+    """
+    Tests the bits at all indices of a big-endian bitarray at once.
+
+    Returns:
+        np.ndarray: Boolean array of the shape of indices, True where the bit is set.
+    """
+    indices = np.asarray(indices, dtype=np.uint64)
+    buffer = np.frombuffer(bits, dtype=np.uint8)
+    return (buffer[indices >> np.uint64(3)] & _BIT_MASKS[indices & np.uint64(7)]) != 0
+
+
+class _FilterFile:
+    """
+    Adds save/load to the filters below. The file header records the class, its constructor parameters,
+    the hash method and the number of added items (see bloom_io).
+    """
+
+    def _params(self):
+        return {'size': self.size, 'num_hashes': self.num_hashes}
+
+    def _hash_method(self):
+        return 'sha256'
+
+    def save(self, path):
+        """
+        Saves the Bloom Filter to one file.
+        
+        Parameters:
+            path (str): Destination path.
+        """
+        header = {'filter': type(self).__name__, 'params': self._params(), 'hash': self._hash_method(),
+                  'num_items': self.num_items}
+        write_filter(path, header, self.bits if isinstance(self.bits, list) else [self.bits])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Opens a Bloom Filter written by save. With mmap the bits are mapped copy-on-write instead of read,
+        so startup does not depend on the filter size; items added after loading never change the file.
+        
+        Parameters:
+            path (str): Path of the saved filter.
+            mmap (bool, optional): Map the bits instead of reading them into memory. Defaults to True.
+        
+        Returns:
+            The loaded Bloom Filter.
+        """
+        header, bit_arrays = read_filter(path, cls.__name__, mmap)
+        bloom_filter = cls._from_bit_arrays(header['params'], bit_arrays, header['num_items'])
+        check_hash(path, header, bloom_filter._hash_method())
+        return bloom_filter
+
+    @classmethod
+    def _from_bit_arrays(cls, params, bit_arrays, num_items):
+        bloom_filter = cls(**params, bits=bit_arrays if cls is ChunkedBloomFilter else bit_arrays[0])
+        bloom_filter.num_items = num_items
+        return bloom_filter
+
+    def _bit_arrays(self):
+        """
+        Returns the bit arrays cut to their logical length; mapped arrays keep the padding bits of their last byte.
+        """
+        if isinstance(self.bits, list):
+            return [bits[:self.chunk_size] for bits in self.bits]
+        return [self.bits[:self.size]]
+
+    def _check_compatible(self, other):
+        """
+        Raises ValueError unless other is a filter of the same class with the same parameters and hash method,
+        i.e. one that sets the same bits for the same items.
+        """
+        if (type(other) is not type(self) or other._params() != self._params()
+                or other._hash_method() != self._hash_method()):
+            raise ValueError(f"Cannot combine a {type(self).__name__} with {self._params()} ({self._hash_method()}) and a "
+                             f"{type(other).__name__} with {other._params()} ({other._hash_method()}).")
+
+    def union(self, other):
+        """
+        Merges two filters with the same parameters, e.g. built on different shards of the input, with a bitwise OR.
+        The result answers like one filter that every item of both was added to.
+        
+        Parameters:
+            other: A filter of the same class with the same parameters and hash method.
+        
+        Returns:
+            A new Bloom Filter; its num_items is the sum of both, exact for disjoint shards.
+        """
+        self._check_compatible(other)
+        bit_arrays = [mine | theirs for mine, theirs in zip(self._bit_arrays(), other._bit_arrays())]
+        return type(self)._from_bit_arrays(self._params(), bit_arrays, self.num_items + other.num_items)
+
+    def intersection(self, other):
+        """
+        Intersects two filters with the same parameters with a bitwise AND. An item added to both is always found
+        in the result, which has more false positives than a filter built from the overlap alone.
+        
+        Parameters:
+            other: A filter of the same class with the same parameters and hash method.
+        
+        Returns:
+            A new Bloom Filter; its num_items estimates the size of the overlap (see estimate_num_items).
+        """
+        self._check_compatible(other)
+        overlap = self.estimate_num_items() + other.estimate_num_items() - self.union(other).estimate_num_items()
+        bit_arrays = [mine & theirs for mine, theirs in zip(self._bit_arrays(), other._bit_arrays())]
+        return type(self)._from_bit_arrays(self._params(), bit_arrays, max(0, round(overlap)))
+
+    def estimate_num_items(self):
+        """
+        Estimates the number of distinct items added from the share of set bits, -m / k * ln(1 - X / m).
+        
+        Returns:
+            float: The estimated number of distinct items, inf if every bit is set.
+        """
+        bit_arrays = self._bit_arrays()
+        size = sum(len(bits) for bits in bit_arrays)
+        set_bits = sum(bits.count() for bits in bit_arrays)
+        if set_bits >= size:
+            return math.inf
+        return -size / self.num_hashes * math.log(1 - set_bits / size)
+
+
+def _build_shard(task):
+    """
+    Builds one shard in a worker process: an empty filter with the given parameters and the lines of one file.
+    
+    Parameters:
+        task (tuple): The filter class, its constructor parameters and the path of the shard file.
+    
+    Returns:
+        tuple: The shard's bit arrays and number of items; the filter itself may hold unpicklable hash functions.
+    """
+    filter_class, params, path = task
+    bloom_filter = filter_class(**params)
+    for lines in iter_line_chunks(path):
+        bloom_filter.add_many(lines)
+    return bloom_filter._bit_arrays(), bloom_filter.num_items
+
+
+def build_sharded(bloom_filter, paths, workers=1):
+    """
+    Adds the lines of several files, one shard per file. With more than one worker every shard is built into
+    its own filter with the parameters of bloom_filter on a worker process, and the shards are merged with union.
+    
+    Parameters:
+        bloom_filter: The filter to add to.
+        paths (list): Paths of the shard files, one item per line.
+        workers (int, optional): Number of worker processes; 1 adds every file in the current process. Defaults to 1.
+    
+    Returns:
+        The filter holding the lines of every file (a new one when the shards were merged).
+    """
+    workers = max(1, int(workers or 1))
+    if workers == 1 or len(paths) < 2:
+        for path in paths:
+            for lines in iter_line_chunks(path):
+                bloom_filter.add_many(lines)
+        return bloom_filter
+    if not isinstance(bloom_filter, _FilterFile):
+        raise ValueError(f"A {type(bloom_filter).__name__} cannot be merged from shards; use one worker.")
+    tasks = [(type(bloom_filter), bloom_filter._params(), path) for path in paths]
+    logging.info(f"Building {len(tasks)} Bloom filter shards on {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for bit_arrays, num_items in executor.map(_build_shard, tasks):
+            shard = type(bloom_filter)._from_bit_arrays(bloom_filter._params(), bit_arrays, num_items)
+            bloom_filter = bloom_filter.union(shard)
+    return bloom_filter
+
+
+def load_filter(path, mmap=True):
+    """
+    Opens a filter saved by any of the classes below, whichever class it was saved from.
+    
+    Parameters:
+        path (str): Path of the saved filter.
+        mmap (bool, optional): Map the bits instead of reading them into memory. Defaults to True.
+    
+    Returns:
+        The loaded Bloom Filter.
+    """
+    header, _ = read_header(path)
+    classes = {cls.__name__: cls for cls in (StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter,
+                                                  BlockedBloomFilter)}
+    if header['filter'] not in classes:
+        raise ValueError(f"{path} holds a {header['filter']}, which is not a bloomfilter3 filter.")
+    return classes[header['filter']].load(path, mmap)
+
+
+class StandardBloomFilter(_FilterFile):
     """
     A standard Bloom Filter implementation that provides methods to add items and check if an item exists in the set.
     
@@ -11,20 +244,25 @@ class StandardBloomFilter:
         size (int): The total number of bits in the bit array.
         num_hashes (int): The number of hash functions to use.
         bits (bitarray): A bit array to store the elements.
+        num_items (int): The number of items added.
     """
     
-    def __init__(self, size, num_hashes):
+    def __init__(self, size, num_hashes, bits=None):
         """
         Initializes the Bloom Filter with a specific size and number of hash functions.
         
         Parameters:
             size (int): The size of the bit array.
             num_hashes (int): The number of hash functions to use.
+            bits (bitarray, optional): An existing bit array, e.g. a loaded one. Defaults to an empty array.
         """
         self.size = size
         self.num_hashes = num_hashes
-        self.bits = bitarray(size)
-        self.bits.setall(0)
+        self.num_items = 0
+        if bits is None:
+            bits = bitarray(size)
+            bits.setall(0)
+        self.bits = bits
 
     def _hash(self, item, seed):
         """
@@ -50,6 +288,7 @@ class StandardBloomFilter:
         for i in range(self.num_hashes):
             index = self._hash(item, i)
             self.bits[index] = True
+        self.num_items += 1
 
     def check(self, item):
         """
@@ -67,7 +306,42 @@ class StandardBloomFilter:
                 return False
         return True
 
-class ChunkedBloomFilter:
+    def _indices(self, items):
+        """
+        Computes the indices add and check use for every item of a batch.
+        
+        Parameters:
+            items (list): The items to hash.
+        
+        Returns:
+            np.ndarray: (len(items), num_hashes) array of bit indices.
+        """
+        return np.stack([_sha256_indices(items, i, self.size) for i in range(self.num_hashes)], axis=1)
+
+    def add_many(self, items):
+        """
+        Adds a batch of items to the Bloom Filter, setting all their bits at once. Sets the same bits as add.
+        
+        Parameters:
+            items (Iterable): The items to be added to the Bloom Filter.
+        """
+        indices = self._indices(list(items))
+        _set_bits(self.bits, indices)
+        self.num_items += len(indices)
+
+    def check_many(self, items):
+        """
+        Checks a batch of items at once.
+        
+        Parameters:
+            items (Iterable): The items to check in the Bloom Filter.
+        
+        Returns:
+            np.ndarray: Boolean array, False where the item is definitely not in the filter, True where it might be.
+        """
+        return _test_bits(self.bits, self._indices(list(items))).all(axis=1)
+
+class ChunkedBloomFilter(_FilterFile):
     """
     A chunked Bloom Filter implementation that divides the bit array into chunks. This structure can be useful for reducing memory footprint or improving cache efficiency.
     
@@ -77,9 +351,10 @@ class ChunkedBloomFilter:
         num_chunks (int): The number of chunks the Bloom Filter is divided into.
         chunk_size (int): The size of each chunk in bits.
         bits (list[bitarray]): A list of bit arrays representing each chunk.
+        num_items (int): The number of items added.
     """
     
-    def __init__(self, size, num_hashes, num_chunks):
+    def __init__(self, size, num_hashes, num_chunks, bits=None):
         """
         Initializes the Chunked Bloom Filter with specific total size, number of hash functions, and number of chunks.
         
@@ -87,14 +362,18 @@ class ChunkedBloomFilter:
             size (int): The total size of the bit array.
             num_hashes (int): The number of hash functions to use.
             num_chunks (int): The number of chunks.
+            bits (list[bitarray], optional): Existing chunk bit arrays, e.g. loaded ones. Defaults to empty arrays.
         """
         self.size = size
         self.num_hashes = num_hashes
         self.num_chunks = num_chunks
         self.chunk_size = size // num_chunks
-        self.bits = [bitarray(self.chunk_size) for _ in range(num_chunks)]
-        for b in self.bits:
-            b.setall(0)
+        self.num_items = 0
+        if bits is None:
+            bits = [bitarray(self.chunk_size) for _ in range(num_chunks)]
+            for b in bits:
+                b.setall(0)
+        self.bits = bits
 
     def _hash(self, item, seed):
         """
@@ -110,6 +389,9 @@ class ChunkedBloomFilter:
         hash_result = hashlib.sha256((str(item) + str(seed)).encode()).hexdigest()
         return int(hash_result, 16) % self.chunk_size
 
+    def _params(self):
+        return {'size': self.size, 'num_hashes': self.num_hashes, 'num_chunks': self.num_chunks}
+
     def add(self, item):
         """
         Adds an item to the Bloom Filter. Each hash function corresponds to a different chunk.
@@ -121,6 +403,7 @@ class ChunkedBloomFilter:
             chunk_index = i % self.num_chunks
             index = self._hash(item, i)
             self.bits[chunk_index][index] = True
+        self.num_items += 1
 
     def check(self, item):
         """
@@ -139,10 +422,50 @@ class ChunkedBloomFilter:
                 return False
         return True
 
+    def _indices(self, items):
+        """
+        Computes the in-chunk indices add and check use for every item of a batch; hash i addresses chunk i % num_chunks.
+        
+        Parameters:
+            items (list): The items to hash.
+        
+        Returns:
+            np.ndarray: (len(items), num_hashes) array of bit indices within their chunks.
+        """
+        return np.stack([_sha256_indices(items, i, self.chunk_size) for i in range(self.num_hashes)], axis=1)
+
+    def add_many(self, items):
+        """
+        Adds a batch of items to the Bloom Filter, setting all their bits at once. Sets the same bits as add.
+        
+        Parameters:
+            items (Iterable): The items to be added to the Bloom Filter.
+        """
+        indices = self._indices(list(items))
+        for chunk_index in range(min(self.num_chunks, self.num_hashes)):
+            _set_bits(self.bits[chunk_index], indices[:, chunk_index::self.num_chunks])
+        self.num_items += len(indices)
+
+    def check_many(self, items):
+        """
+        Checks a batch of items at once.
+        
+        Parameters:
+            items (Iterable): The items to check in the Bloom Filter.
+        
+        Returns:
+            np.ndarray: Boolean array, False where the item is definitely not in the filter, True where it might be.
+        """
+        indices = self._indices(list(items))
+        found = np.ones(len(indices), dtype=bool)
+        for chunk_index in range(min(self.num_chunks, self.num_hashes)):
+            found &= _test_bits(self.bits[chunk_index], indices[:, chunk_index::self.num_chunks]).all(axis=1)
+        return found
+
 
 # 3.2 - according to a2.pdf
 
-class ImprovedBloomFilter:
+class ImprovedBloomFilter(_FilterFile):
     """
     An improved Bloom Filter implementation that supports multiple hashing methods including standard and Kirsch-Mitzenmacher double hashing.
 
@@ -151,9 +474,10 @@ class ImprovedBloomFilter:
         num_hashes (int): The number of hash functions to use.
         bits (bitarray): A bit array to store the elements.
         method (str): The method of hashing used in the Bloom Filter ('standard' or 'kirsch-mitzenmacher').
+        num_items (int): The number of items added.
     """
     
-    def __init__(self, size, num_hashes, method='standard'):
+    def __init__(self, size, num_hashes, method='standard', bits=None):
         """
         Initializes the Bloom Filter with a specific size, number of hash functions, and a hashing method.
         
@@ -161,11 +485,15 @@ class ImprovedBloomFilter:
             size (int): The size of the bit array.
             num_hashes (int): The number of hash functions to use.
             method (str, optional): The hashing method to use ('standard' or 'kirsch-mitzenmacher'). Defaults to 'standard'.
+            bits (bitarray, optional): An existing bit array, e.g. a loaded one. Defaults to an empty array.
         """
         self.size = size
         self.num_hashes = num_hashes
-        self.bits = bitarray(size)
-        self.bits.setall(0)
+        self.num_items = 0
+        if bits is None:
+            bits = bitarray(size)
+            bits.setall(0)
+        self.bits = bits
         self.method = method
         if method == 'kirsch-mitzenmacher':
             self.hash1 = self._generate_hash_function()
@@ -197,6 +525,7 @@ class ImprovedBloomFilter:
             for i in range(self.num_hashes):
                 index = (index1 + i * index2) % self.size
                 self.bits[index] = True
+        self.num_items += 1
 
     def _hash(self, item, seed):
         """
@@ -230,4 +559,180 @@ class ImprovedBloomFilter:
                 index = (index1 + i * index2) % self.size
             if not self.bits[index]:
                 return False
-        return True
\ No newline at end of file
+        return True
+
+    def _indices(self, items):
+        """
+        Computes the indices add and check use for every item of a batch. With Kirsch-Mitzenmacher hashing
+        only two digests are computed per item, and the num_hashes indices follow from them in bulk.
+        
+        Parameters:
+            items (list): The items to hash.
+        
+        Returns:
+            np.ndarray: (len(items), num_hashes) array of bit indices.
+        """
+        if self.method == 'kirsch-mitzenmacher':
+            index1 = _sha256_indices(items, 0, self.size).reshape(-1, 1)
+            index2 = _sha256_indices(items, 1, self.size).reshape(-1, 1)
+            steps = np.arange(self.num_hashes, dtype=np.uint64).reshape(1, -1)
+            return (index1 + steps * index2) % np.uint64(self.size)
+        return np.stack([_sha256_indices(items, i, self.size) for i in range(self.num_hashes)], axis=1)
+
+    def add_many(self, items):
+        """
+        Adds a batch of items to the Bloom Filter, setting all their bits at once. Sets the same bits as add.
+        
+        Parameters:
+            items (Iterable): The items to be added to the Bloom Filter.
+        """
+        indices = self._indices(list(items))
+        _set_bits(self.bits, indices)
+        self.num_items += len(indices)
+
+    def check_many(self, items):
+        """
+        Checks a batch of items at once.
+        
+        Parameters:
+            items (Iterable): The items to check in the Bloom Filter.
+        
+        Returns:
+            np.ndarray: Boolean array, False where the item is definitely not in the filter, True where it might be.
+        """
+        return _test_bits(self.bits, self._indices(list(items))).all(axis=1)
+
+    def _params(self):
+        return {'size': self.size, 'num_hashes': self.num_hashes, 'method': self.method}
+
+    def _hash_method(self):
+        return 'sha256' if self.method == 'standard' else 'sha256-' + self.method
+
+
+# 3.3 - cache-line blocked
+
+BLOCK_BITS = 512
+
+
+class BlockedBloomFilter(_FilterFile):
+    """
+    A blocked Bloom Filter: every item is mapped to one 512-bit block (one 64-byte cache line) and all
+    of its bits are set inside that block, so add and check touch one cache line instead of num_hashes
+    lines scattered over the whole array. The price is a somewhat higher false positive rate than a
+    standard filter of the same size, because items crowd unevenly into blocks.
+
+    Hashing uses one SHA-256 digest per item: its first 64 bits pick the block, and the next two
+    64-bit words drive double hashing of the offsets within the block. The step is odd, so the
+    num_hashes offsets are distinct for up to 512 hashes.
+
+    Attributes:
+        size (int): The total number of bits in the bit array, a multiple of 512.
+        num_hashes (int): The number of bits set per item.
+        num_blocks (int): The number of 512-bit blocks.
+        bits (bitarray): A bit array to store the elements.
+        num_items (int): The number of items added.
+    """
+
+    def __init__(self, size, num_hashes, bits=None):
+        """
+        Initializes the Blocked Bloom Filter with a specific size and number of hash functions.
+
+        Parameters:
+            size (int): The size of the bit array, rounded up to whole 512-bit blocks.
+            num_hashes (int): The number of bits set per item, at most 512.
+            bits (bitarray, optional): An existing bit array, e.g. a loaded one. Defaults to an empty array.
+        """
+        if not 0 < num_hashes <= BLOCK_BITS:
+            raise ValueError(f"num_hashes must be between 1 and {BLOCK_BITS}.")
+        self.num_blocks = max(1, -(-size // BLOCK_BITS))
+        self.size = self.num_blocks * BLOCK_BITS
+        self.num_hashes = num_hashes
+        self.num_items = 0
+        if bits is None:
+            bits = bitarray(self.size)
+            bits.setall(0)
+        self.bits = bits
+
+    def _hash_method(self):
+        return 'sha256-blocked512'
+
+    def _positions(self, item):
+        """
+        Computes the bit indices of one item.
+
+        Parameters:
+            item: The item to hash.
+
+        Returns:
+            list[int]: num_hashes bit indices, all inside the item's block.
+        """
+        digest = hashlib.sha256(str(item).encode()).digest()
+        start = int.from_bytes(digest[:8], 'big') % self.num_blocks * BLOCK_BITS
+        offset = int.from_bytes(digest[8:16], 'big')
+        step = int.from_bytes(digest[16:24], 'big') | 1
+        return [start + (offset + i * step) % BLOCK_BITS for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """
+        Adds an item to the Bloom Filter.
+
+        Parameters:
+            item: The item to be added to the Bloom Filter.
+        """
+        for index in self._positions(item):
+            self.bits[index] = True
+        self.num_items += 1
+
+    def check(self, item):
+        """
+        Checks whether an item might be in the Bloom Filter.
+
+        Parameters:
+            item: The item to check in the Bloom Filter.
+
+        Returns:
+            bool: False if the item is definitely not in the filter, True if it might be.
+        """
+        return all(self.bits[index] for index in self._positions(item))
+
+    def _indices(self, items):
+        """
+        Computes the indices add and check use for every item of a batch, from one digest per item.
+
+        Parameters:
+            items (list): The items to hash.
+
+        Returns:
+            np.ndarray: (len(items), num_hashes) array of bit indices; each row lies inside one block.
+        """
+        digests = b"".join(hashlib.sha256(str(item).encode()).digest() for item in items)
+        limbs = np.frombuffer(digests, dtype='>u8').reshape(-1, 4).astype(np.uint64)
+        block_bits = np.uint64(BLOCK_BITS)
+        starts = (limbs[:, 0] % np.uint64(self.num_blocks) * block_bits).reshape(-1, 1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64).reshape(1, -1)
+        # uint64 arithmetic wraps modulo 2**64, which 512 divides, so the offsets match _positions
+        offsets = (limbs[:, 1:2] + steps * (limbs[:, 2:3] | np.uint64(1))) % block_bits
+        return starts + offsets
+
+    def add_many(self, items):
+        """
+        Adds a batch of items to the Bloom Filter, setting all their bits at once. Sets the same bits as add.
+
+        Parameters:
+            items (Iterable): The items to be added to the Bloom Filter.
+        """
+        indices = self._indices(list(items))
+        _set_bits(self.bits, indices)
+        self.num_items += len(indices)
+
+    def check_many(self, items):
+        """
+        Checks a batch of items at once.
+
+        Parameters:
+            items (Iterable): The items to check in the Bloom Filter.
+
+        Returns:
+            np.ndarray: Boolean array, False where the item is definitely not in the filter, True where it might be.
+        """
+        return _test_bits(self.bits, self._indices(list(items))).all(axis=1)
@@ -1,6 +1,8 @@
 # bloomfilter3_cli.py
 
-from .bloomfilter3 import StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter
+from .bloomfilter3 import StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter, BlockedBloomFilter, load_filter, build_sharded
+from .cuckoofilter import CuckooFilter
+from .bloom_io import iter_line_chunks, read_header
 import logging
 import sys
 import argparse
@@ -19,34 +21,43 @@ def calculate_bloom_filter_size(n, f):
     k = math.ceil((m / n) * math.log(2))
     return max(1, m), max(1, k)
 
-def main():
-    parser = argparse.ArgumentParser(description="Bloom Filter CLI")
-    parser.add_argument("--init", action="store_true", help="Initialize the Bloom Filter")
-    parser.add_argument("--type", type=str, choices=['standard', 'chunked', 'improved'], default='standard', help="Type of Bloom Filter to initialize")
-    parser.add_argument("--n", type=int, help="Number of elements (required for init)")
-    parser.add_argument("--f", type=float, help="False positive rate (required for init)")
-    parser.add_argument("--chunks", type=int, help="Number of chunks (required for chunked Bloom Filter)")
-    parser.add_argument("--method", type=str, choices=['standard', 'kirsch-mitzenmacher'], default='standard', help="Hashing method to use for improved Bloom Filter")
-    parser.add_argument("--insert-file", type=str, help="Path to the file to be inserted")
-    parser.add_argument("--query-file", type=str, help="Path to the file to query")
+def load_any_filter(path):
+    """
+    Opens a filter saved by any bloomfilter3 class or by CuckooFilter, which bloomfilter3 does not know about.
 
-    args = parser.parse_args()
+    Parameters:
+        path (str): Path of the saved filter.
 
-    if not args.init:
-        logging.error("Initialization flag (--init) must be set to initialize Bloom Filter.")
-        return
+    Returns:
+        The loaded filter, its bits memory-mapped.
+    """
+    header, _ = read_header(path)
+    if header['filter'] == CuckooFilter.__name__:
+        return CuckooFilter.load(path)
+    return load_filter(path)
 
+def initialize_filter(args):
+    """
+    Creates the empty Bloom Filter described by the --type, --n, --f, --chunks and --method arguments.
+    Returns None after logging an error when a required argument is missing.
+    """
     if args.type == 'improved' and (args.n is None or args.f is None):
         logging.error("Please provide --n and --f for initialization of improved Bloom Filter.")
-        return
+        return None
 
     if args.type == 'chunked' and (args.n is None or args.f is None or args.chunks is None):
         logging.error("Please provide --n, --f, and --chunks for initialization of chunked Bloom Filter.")
-        return
+        return None
 
     if args.n is None or args.f is None:
         logging.error("Please provide --n and --f for initialization.")
-        return
+        return None
+
+    if args.type == 'cuckoo':
+        # Sized from n and f directly: f sets the fingerprint width, n the number of buckets
+        bloom_filter = CuckooFilter(args.n, args.f)
+        logging.info(f"Cuckoo filter initialized with buckets = {bloom_filter.num_buckets}, bucket size = {bloom_filter.bucket_size}, fingerprint bits = {bloom_filter.fingerprint_bits}")
+        return bloom_filter
 
     m, k = calculate_bloom_filter_size(args.n, args.f)
     if args.type == 'standard':
@@ -55,32 +66,70 @@ def main():
         bloom_filter = ChunkedBloomFilter(m, k, args.chunks)
     elif args.type == 'improved':
         bloom_filter = ImprovedBloomFilter(m, k, args.method)
+    elif args.type == 'blocked':
+        bloom_filter = BlockedBloomFilter(m, k)
     
-    logging.info(f"{args.type.capitalize()} bloom filter initialized with size = {m}, number of hash functions = {k}, additional parameters = {args.chunks if args.type == 'chunked' else args.method if args.type == 'improved' else 'None'}")
+    logging.info(f"{args.type.capitalize()} bloom filter initialized with size = {bloom_filter.size}, number of hash functions = {k}, additional parameters = {args.chunks if args.type == 'chunked' else args.method if args.type == 'improved' else 'None'}")
+    return bloom_filter
 
-    # Insert Items from the specified file
+def main():
+    parser = argparse.ArgumentParser(description="Bloom Filter CLI")
+    parser.add_argument("--init", action="store_true", help="Initialize the Bloom Filter")
+    parser.add_argument("--type", type=str, choices=['standard', 'chunked', 'improved', 'blocked', 'cuckoo'], default='standard', help="Type of Bloom Filter to initialize")
+    parser.add_argument("--n", type=int, help="Number of elements (required for init)")
+    parser.add_argument("--f", type=float, help="False positive rate (required for init)")
+    parser.add_argument("--chunks", type=int, help="Number of chunks (required for chunked Bloom Filter)")
+    parser.add_argument("--method", type=str, choices=['standard', 'kirsch-mitzenmacher'], default='standard', help="Hashing method to use for improved Bloom Filter")
+    parser.add_argument("--insert-file", type=str, nargs='+', help="Path(s) to the file(s) to be inserted, one shard per file")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes building the shards of --insert-file in parallel")
+    parser.add_argument("--query-file", type=str, help="Path to the file to query")
+    parser.add_argument("--save", type=str, help="Save the filter to this path after inserting")
+    parser.add_argument("--load", type=str, help="Load a filter saved with --save instead of initializing one")
+
+    args = parser.parse_args()
+
+    if args.load:
+        # Any filter type can be loaded; the saved header records it. Its bits are memory-mapped.
+        try:
+            bloom_filter = load_any_filter(args.load)
+        except (FileNotFoundError, ValueError) as e:
+            logging.error(f"Could not load the Bloom filter: {e}")
+            return
+        if isinstance(bloom_filter, CuckooFilter):
+            logging.info(f"CuckooFilter loaded from {args.load}: {bloom_filter.report()}")
+        else:
+            logging.info(f"{type(bloom_filter).__name__} loaded from {args.load} with size = {bloom_filter.size}, number of hash functions = {bloom_filter.num_hashes}, items = {bloom_filter.num_items}")
+    elif not args.init:
+        logging.error("Initialization flag (--init) must be set to initialize Bloom Filter, or --load to load a saved one.")
+        return
+    else:
+        bloom_filter = initialize_filter(args)
+        if bloom_filter is None:
+            return
+
+    # Insert Items from the specified files; with --workers each file is built into its own shard and merged
     if args.insert_file:
         try:
-            with open(args.insert_file, 'r') as f:
-                content = f.read().strip().splitlines()
-                for line in content:
-                    document = line.strip()
-                    bloom_filter.add(document)  # Add document to Bloom filter
-            logging.info(f"Inserted items from file: {args.insert_file}")
-        except FileNotFoundError:
-            logging.error(f"Error: The file {args.insert_file} does not exist.")
+            bloom_filter = build_sharded(bloom_filter, args.insert_file, args.workers)
+            logging.info(f"Inserted items from file(s): {', '.join(args.insert_file)}")
+            if isinstance(bloom_filter, CuckooFilter):
+                logging.info(bloom_filter.report())
+        except FileNotFoundError as e:
+            logging.error(f"Error: The file {e.filename} does not exist.")
             return
+        except ValueError as e:
+            logging.error(f"Error: {e}")
+            return
+
+    if args.save:
+        bloom_filter.save(args.save)
 
     # Query Items from the specified file
     if args.query_file:
         try:
             result = 0
-            with open(args.query_file, 'r') as f:
-                content = f.read().strip().splitlines()
-                for line in content:
-                    document = line.strip()
-                    if bloom_filter.check(document):
-                        result += 1
+            for lines in iter_line_chunks(args.query_file):
+                result += int(bloom_filter.check_many(lines).sum())
             logging.info(f"There are {result} items in {args.query_file} possibly in the filter.")
         except FileNotFoundError:
             logging.error(f"Error: The file {args.query_file} does not exist.")
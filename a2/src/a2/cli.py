@@ -12,37 +12,103 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from .lsh_case1 import deduplicate_collection as case1
 from .lsh_case1_imp import deduplicate_collection as case1_imp
 from .lsh_case2 import nearest_neighbor_search as case2
+from .lsh_case2 import build_index, query_index
+from .minhash import ENGINES
+from .signature_cache import SignatureCache, DEFAULT_CACHE_SIZE_MB
 
 logging.basicConfig(level=logging.INFO)
 
 def main():
     if len(sys.argv) < 4:
-        logging.error("Usage: python cli.py <case1|case1_imp|case2> <input_file> <output_file>")
+        logging.error("Usage: python cli.py <case1|case1_imp|case2|build-index|query> <input_file> <output_file>")
         sys.exit(1)
     parser = argparse.ArgumentParser(description="LSH CLI for Case 1 and Case 2")
-    parser.add_argument('case', choices=['case1', 'case1_imp', 'case2'], help="Specify which case to run (case1 or case2)")
-    parser.add_argument('input_file', help="Path to the input file")
-    parser.add_argument('output_file', help="Path to the output file")
-    parser.add_argument('--query', help="Query text for case2 (only needed for case2)", default=None)
+    parser.add_argument('case', choices=['case1', 'case1_imp', 'case2', 'build-index', 'query'], help="Specify which case to run (case1, case2, or build-index/query for a persistent case2 index)")
+    parser.add_argument('input_file', help="Path to the input file (the index file for query)")
+    parser.add_argument('output_file', help="Path to the output file (the index file for build-index)")
+    parser.add_argument('--query', help="Query text for case2 and query", default=None)
+    parser.add_argument('--cache-dir', default=None, help="Directory of the on-disk signature cache reused across runs (numpy engine)")
+    parser.add_argument('--cache-size-mb', type=float, default=DEFAULT_CACHE_SIZE_MB, help="Size cap of the signature cache; least recently used entries are evicted beyond it")
+    parser.add_argument('--state-dir', default=None, help="Directory where case1/case1_imp persist signatures, buckets and Union-Find state")
+    parser.add_argument('--append', action='store_true', help="Add the input documents to the state in --state-dir and write only the changed clusters (case1, case1_imp)")
+    parser.add_argument('--threshold', type=float, default=None, help="Drop candidate links whose estimated Jaccard similarity is below this value before clustering (case1, case1_imp)")
+    parser.add_argument('--report', default=None, help="Write the members and pairwise similarities of every multi-document cluster to this .jsonl file (case1, case1_imp)")
+    parser.add_argument('--exact-similarity', action='store_true', help="Add exact Jaccard similarities to the --report file")
+    parser.add_argument('--dedup-bloom', action='store_true', help="Check a Bloom filter before the set of seen texts when removing exact duplicates (not with --state-dir)")
+    parser.add_argument('--emit-pairs', default=None, help="Also write every LSH candidate pair to this TSV file for evaluation (case1, case1_imp)")
+    parser.add_argument('--num-hashes', type=int, default=300, help="Number of Minhash permutations stored in the index (build-index)")
+    parser.add_argument('--num-bands', type=int, default=50, help="Number of LSH bands stored in the index (build-index)")
+    parser.add_argument('--rows-per-band', type=int, default=2, help="Rows per LSH band (build-index)")
+    parser.add_argument('--doc-id', default=None, help="Find the neighbours of this document instead of a query text (case2, query)")
+    parser.add_argument('--top-k', type=int, default=10, help="Maximum number of ranked neighbours reported (case2, query)")
+    parser.add_argument('--min-similarity', type=float, default=0.0, help="Smallest estimated Jaccard similarity reported (case2, query)")
+    parser.add_argument('--probes', type=int, default=0, help="Multi-probe budget: extra perturbed LSH buckets looked up per query (query)")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes used to compute Minhash signatures")
+    parser.add_argument('--engine', choices=ENGINES, default='md5', help="Minhash engine: 'md5' (reference) or 'numpy' (vectorized universal hashing)")
 
     args = parser.parse_args()
+    if args.append and not args.state_dir:
+        logging.error("--append requires --state-dir")
+        sys.exit(1)
+    if args.dedup_bloom and args.state_dir:
+        logging.error("--dedup-bloom cannot be combined with --state-dir, which looks exact duplicates up in its own store")
+        sys.exit(1)
+    cache = SignatureCache(args.cache_dir, args.cache_size_mb) if args.cache_dir else None
 
     if args.case == 'case1':
         logging.info("Running LSH Case 1 Deduplication...")
-        case1(args.input_file, args.output_file)
+        try:
+            case1(args.input_file, args.output_file, engine=args.engine, workers=args.workers, cache=cache,
+                  state_dir=args.state_dir, append=args.append, emit_pairs=args.emit_pairs,
+                  threshold=args.threshold, report=args.report, exact_similarity=args.exact_similarity,
+                  dedup_bloom=args.dedup_bloom)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
     elif args.case == 'case1_imp':
         logging.info("Running LSH Case 1 (improved) Collection Deduplication...")
-        case1_imp(args.input_file, args.output_file)
+        try:
+            case1_imp(args.input_file, args.output_file, engine=args.engine, workers=args.workers, cache=cache,
+                      state_dir=args.state_dir, append=args.append, emit_pairs=args.emit_pairs,
+                      threshold=args.threshold, report=args.report, exact_similarity=args.exact_similarity,
+                      dedup_bloom=args.dedup_bloom)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
     elif args.case == 'case2':
-        if args.query is None:
-            logging.error("Query is required for case2")
+        if (args.query is None) == (args.doc_id is None):
+            logging.error("Either --query or --doc-id is required for case2")
             sys.exit(1)
         logging.info("Running LSH Case 2 Approximate Nearest Neighbor Search...")
-        case2(args.input_file, args.output_file, args.query)
+        try:
+            case2(args.input_file, args.output_file, args.query, engine=args.engine, workers=args.workers, cache=cache,
+                  k=args.top_k, min_similarity=args.min_similarity, doc_id=args.doc_id, dedup_bloom=args.dedup_bloom)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
+    elif args.case == 'build-index':
+        logging.info("Building LSH index for Case 2 queries...")
+        build_index(args.input_file, args.output_file, args.num_hashes, args.num_bands, args.rows_per_band,
+                    workers=args.workers, cache=cache, dedup_bloom=args.dedup_bloom)
+    elif args.case == 'query':
+        if (args.query is None) == (args.doc_id is None):
+            logging.error("Either --query or --doc-id is required for query")
+            sys.exit(1)
+        logging.info("Querying LSH index...")
+        try:
+            query_index(args.input_file, args.output_file, args.query, probes=args.probes, k=args.top_k,
+                        min_similarity=args.min_similarity, doc_id=args.doc_id)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
     else:
-        logging.error("Invalid case selected. Use 'case1', 'case1_imp' or 'case2'.")
+        logging.error("Invalid case selected. Use 'case1', 'case1_imp', 'case2', 'build-index' or 'query'.")
         sys.exit(1)
 
+    if cache is not None:
+        cache.report()
+        cache.close()
+
 
 if __name__ == "__main__":
     main()
@@ -50,6 +116,13 @@ if __name__ == "__main__":
 # python -m src.a2.cli.py case1 <input_file> <output_file>
 # eg:
 # python -m src.a2.cli case1 data/five.tsv data/result/sample_result_case1.txt
+# python -m src.a2.cli case1 data/five.tsv data/result/sample_result_case1.txt --engine numpy
+# python -m src.a2.cli case1 data/onek.tsv data/result/sample_result_case1.txt --engine numpy --workers 8
+# python -m src.a2.cli case1 data/onek.tsv data/result/sample_result_case1.txt --engine numpy --cache-dir .signature_cache
+# python -m src.a2.cli case1 data/onek.tsv data/result/sample_result_case1.txt --engine numpy --threshold 0.5
+# python -m src.a2.cli case1 data/onek.tsv data/result/sample_result_case1.txt --engine numpy --report data/result/case1_report.jsonl --exact-similarity
+# python -m src.a2.cli case1 data/hundred.tsv data/result/sample_result_case1.txt --engine numpy --state-dir data/result/case1_state
+# python -m src.a2.cli case1 data/new_batch.tsv data/result/sample_result_case1_changes.txt --engine numpy --state-dir data/result/case1_state --append
 
 # python -m src.a2.cli.py case1_imp <input_file> <output_file>
 # eg:
@@ -58,3 +131,11 @@ if __name__ == "__main__":
 # python -m src.a2.cli.py case2 <input_file> <output_file> --query "YOUR_QUERY_TEXT"
 # eg:
 # python -m src.a2.cli case2 data/five.tsv data/result/sample_result_case2.txt --query "cherry garcia ice"
+
+# python -m src.a2.cli build-index <input_file> <index_file>
+# python -m src.a2.cli query <index_file> <output_file> --query "YOUR_QUERY_TEXT"
+# eg:
+# python -m src.a2.cli build-index data/onek.tsv data/result/onek.lshidx --workers 4
+# python -m src.a2.cli query data/result/onek.lshidx data/result/sample_result_query.txt --query "cherry garcia ice"
+# python -m src.a2.cli query data/result/onek.lshidx data/result/sample_result_query.txt --query "cherry garcia ice" --probes 20
+# python -m src.a2.cli query data/result/onek.lshidx data/result/sample_result_query.txt --doc-id 6 --top-k 5 --min-similarity 0.5
@@ -0,0 +1,105 @@
+import json
+import logging
+
+import numpy as np
+
+from .dedup import clean_and_normalize, read_documents_at, signature_matrix
+from .shingling import word_shingle_hashes
+
+# Clusters with more pairs than this report every member against the first member only.
+DEFAULT_MAX_PAIRS = 10000
+
+
+def estimated_similarities(signatures, rows=None) -> np.ndarray:
+    """
+    Estimates the Jaccard similarity of cluster members to every member of the cluster from their signatures.
+    :param signatures: (m, num_permutations) uint64 signature matrix of the cluster members.
+    :param rows: Positions of the members to compare; all m members by default.
+    :return: (len(rows), m) matrix of the fractions of agreeing minhash rows.
+    """
+    signatures = np.asarray(signatures)
+    rows = range(len(signatures)) if rows is None else rows
+    similarities = np.empty((len(rows), len(signatures)))
+    for index, row in enumerate(rows):
+        similarities[index] = np.mean(signatures == signatures[row], axis=1)
+    return similarities
+
+
+def exact_similarity(shingles1: np.ndarray, shingles2: np.ndarray) -> float:
+    """
+    Computes the exact Jaccard similarity of two sorted, de-duplicated shingle hash arrays.
+    :param shingles1: Unique shingle hashes of the first document.
+    :param shingles2: Unique shingle hashes of the second document.
+    :return: Jaccard similarity as a float.
+    """
+    intersection = np.intersect1d(shingles1, shingles2, assume_unique=True).size
+    union = shingles1.size + shingles2.size - intersection
+    return intersection / union if union else 0.0
+
+
+def write_cluster_report(report_path: str, documents, clusters, signatures, file_path: str = None,
+                         exact: bool = False, max_pairs: int = DEFAULT_MAX_PAIRS) -> int:
+    """
+    Writes one JSON line per multi-document cluster with its members and pairwise similarities.
+
+    Similarities are estimated from the Minhash signatures already computed for
+    clustering. With exact=True, the texts of the reported documents are re-read
+    once from file_path and word-shingled once each, and the exact Jaccard
+    similarity is added to every pair.
+
+    :param report_path: Path to the output `.jsonl` file.
+    :param documents: Unique documents by row, with 'id' and 'ordinal'.
+    :param clusters: Dictionary mapping each cluster root to the list of its member rows.
+    :param signatures: Signatures by row (numpy matrix or list of md5 signatures).
+    :param file_path: Source TSV file, required for exact similarities.
+    :param exact: Also compute the exact word Jaccard similarity of every reported pair.
+    :param max_pairs: Largest number of pairs reported per cluster before falling back to the first member.
+    :return: Number of clusters written.
+    """
+    if exact and not file_path:
+        raise ValueError("Exact similarities need the source file to re-read the documents.")
+    reported = {root: rows for root, rows in clusters.items() if len(rows) > 1}
+    all_rows = [row for rows in reported.values() for row in rows]
+    position = {row: index for index, row in enumerate(all_rows)}
+    if isinstance(signatures, np.ndarray):
+        gathered = signature_matrix(signatures[np.asarray(all_rows, dtype=np.int64)])
+    else:
+        gathered = signature_matrix([signatures[row] for row in all_rows])
+
+    shingles = {}
+    if exact:
+        texts = read_documents_at(file_path, [documents[row]['ordinal'] for row in all_rows])
+        for row in all_rows:
+            shingles[row] = np.unique(word_shingle_hashes(clean_and_normalize(texts[documents[row]['ordinal']]['text']), 1))
+
+    num_pairs = 0
+    with open(report_path, 'w') as file:
+        for root, rows in reported.items():
+            members = gathered[[position[row] for row in rows]]
+            if len(rows) * (len(rows) - 1) // 2 <= max_pairs:
+                scope, pairs = 'all', [(i, j) for i in range(len(rows)) for j in range(i + 1, len(rows))]
+                estimates = estimated_similarities(members)
+            else:
+                scope, pairs = 'first_member', [(0, j) for j in range(1, len(rows))]
+                estimates = estimated_similarities(members, rows=[0])
+            pair_records = []
+            for i, j in pairs:
+                record = {'doc1': documents[rows[i]]['id'], 'doc2': documents[rows[j]]['id'],
+                          'estimated': round(float(estimates[i, j]), 4)}
+                if exact:
+                    record['exact'] = round(exact_similarity(shingles[rows[i]], shingles[rows[j]]), 4)
+                pair_records.append(record)
+            scores = [record['estimated'] for record in pair_records]
+            file.write(json.dumps({
+                'cluster': documents[root]['id'],
+                'size': len(rows),
+                'ids': [documents[row]['id'] for row in rows],
+                'pairs_scope': scope,
+                'min_estimated': min(scores),
+                'mean_estimated': round(sum(scores) / len(scores), 4),
+                'pairs': pair_records,
+            }) + "\n")
+            num_pairs += len(pair_records)
+
+    logging.info(f"Wrote similarity report for {len(reported)} multi-document clusters ({num_pairs} pairs) to {report_path}.")
+    return len(reported)
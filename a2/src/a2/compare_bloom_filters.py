@@ -0,0 +1,126 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from .bloomfilter3 import StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter, BlockedBloomFilter
+from .bloomfilter3_cli import calculate_bloom_filter_size
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+FILTERS = {
+    'Standard Bloom Filter': lambda m, k: StandardBloomFilter(m, k),
+    'Chunked Bloom Filter': lambda m, k: ChunkedBloomFilter(m, k, 5),
+    'Improved Bloom Filter': lambda m, k: ImprovedBloomFilter(m, k, method='kirsch-mitzenmacher'),
+    'Blocked Bloom Filter': lambda m, k: BlockedBloomFilter(m, k),
+}
+COLORS = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc66']
+
+
+def measure(make_filter, members, non_members, false_positive_rate: float):
+    """
+    Fills one filter with the members and checks the non-members against it.
+    :param make_filter: Function of (size, num_hashes) returning an empty filter.
+    :param members: Items added to the filter.
+    :param non_members: Items never added; every positive among them is a false positive.
+    :param false_positive_rate: Target false positive rate used to size the filter.
+    :return: Tuple of the measured false positive rate and the check_many throughput in items per second.
+    """
+    m, k = calculate_bloom_filter_size(len(members), false_positive_rate)
+    bloom_filter = make_filter(m, k)
+    bloom_filter.add_many(members)
+    start = time.perf_counter()
+    positives = int(bloom_filter.check_many(non_members).sum())
+    elapsed = time.perf_counter() - start
+    return positives / len(non_members), len(non_members) / elapsed
+
+
+def compare_files(file_paths, false_positive_rate: float, insert_fraction: float = 0.2):
+    """
+    Measures the false positive rate of every filter on TSV files, as in the notebook comparison:
+    the first insert_fraction of the distinct lines is added and the remaining lines are checked.
+    :param file_paths: Paths to the TSV files.
+    :param false_positive_rate: Target false positive rate used to size the filters.
+    :param insert_fraction: Share of the lines added to the filters.
+    :return: Dictionary mapping each file to a dictionary of filter name -> false positive rate.
+    """
+    results = {}
+    for file_path in file_paths:
+        with open(file_path, 'r') as file:
+            lines = list(dict.fromkeys(line.strip() for line in file if line.strip()))
+        split = max(1, int(len(lines) * insert_fraction))
+        results[file_path] = {name: measure(make_filter, lines[:split], lines[split:], false_positive_rate)[0]
+                              for name, make_filter in FILTERS.items()}
+        logging.info(f"{file_path}: " + ", ".join(f"{name} {rate:.4f}" for name, rate in results[file_path].items()))
+    return results
+
+
+def compare_throughput(num_items: int, false_positive_rate: float):
+    """
+    Measures the false positive rate and the check_many throughput of every filter on synthetic items.
+    :param num_items: Number of items added, and of absent items checked.
+    :param false_positive_rate: Target false positive rate used to size the filters.
+    :return: Dictionary mapping each filter name to a tuple of (false positive rate, items per second).
+    """
+    members = [f"shingle {i} of the benchmark collection" for i in range(num_items)]
+    non_members = [f"absent {i}" for i in range(num_items)]
+    results = {}
+    for name, make_filter in FILTERS.items():
+        results[name] = measure(make_filter, members, non_members, false_positive_rate)
+        logging.info(f"{name:22s}: false positive rate {results[name][0]:.4f}, {results[name][1]:12,.0f} checks/s")
+    return results
+
+
+def plot_comparison(file_results, throughput_results, output_path: str) -> None:
+    """
+    Plots the false positive rate per file next to the throughput versus false positive rate of every filter.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, (ax_files, ax_tradeoff) = plt.subplots(1, 2, figsize=(16, 6))
+    names = list(FILTERS)
+    positions = np.arange(len(file_results))
+    width = 0.8 / len(names)
+    for i, (name, color) in enumerate(zip(names, COLORS)):
+        ax_files.bar(positions + (i - (len(names) - 1) / 2) * width,
+                     [rates[name] for rates in file_results.values()], width, label=name, color=color)
+    ax_files.set_xticks(positions)
+    ax_files.set_xticklabels([path.split('/')[-1] for path in file_results])
+    ax_files.set_xlabel('File')
+    ax_files.set_ylabel('False Positive Rate')
+    ax_files.set_title('Comparison of False Positive Rates by Bloom Filter Type')
+    ax_files.legend()
+
+    for name, color in zip(names, COLORS):
+        rate, throughput = throughput_results[name]
+        ax_tradeoff.scatter(rate, throughput, s=120, color=color, edgecolors='black', label=name)
+    ax_tradeoff.set_xlabel('False Positive Rate')
+    ax_tradeoff.set_ylabel('check_many Throughput (items/s)')
+    ax_tradeoff.set_title('Throughput versus False Positive Rate')
+    ax_tradeoff.grid(True)
+    ax_tradeoff.legend()
+
+    fig.tight_layout()
+    fig.savefig(output_path)
+    logging.info(f"Saved the comparison plot to {output_path}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="False positive rate and throughput of the bloomfilter3 filters")
+    parser.add_argument('--files', nargs='+', default=['data/thirty.tsv', 'data/hundred.tsv', 'data/threehundred.tsv', 'data/onek.tsv'],
+                        help="TSV files whose false positive rates are compared")
+    parser.add_argument('--num-items', type=int, default=200000, help="Number of synthetic items used for the throughput comparison")
+    parser.add_argument('--f', type=float, default=0.01, help="False positive rate used to size the filters")
+    parser.add_argument('--output', type=str, default='data/result/3_bloom_filters_comparision.png', help="Path of the saved plot")
+    args = parser.parse_args()
+
+    file_results = compare_files(args.files, args.f)
+    throughput_results = compare_throughput(args.num_items, args.f)
+    plot_comparison(file_results, throughput_results, args.output)
+
+
+if __name__ == "__main__":
+    main()
+
+# python -m src.a2.compare_bloom_filters --num-items 200000
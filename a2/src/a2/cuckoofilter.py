@@ -0,0 +1,455 @@
+import math
+import random
+import mmh3
+import numpy as np
+from bitarray import bitarray
+from .bloomfilter1 import _ShingledText
+from .bloom_io import write_filter, read_filter, check_hash
+
+# Hash method recorded in saved filters: bucket from the high and fingerprint from the low bits of a 64-bit murmur3 hash
+HASH_METHOD = 'murmur3_x64_64-cuckoo'
+# Multiplier spreading a fingerprint over the buckets for its alternate bucket (from MurmurHash2)
+_FINGERPRINT_MIX = np.uint64(0x5BD1E995)
+_SHIFT_32 = np.uint64(32)
+_SHIFT_6 = np.uint64(6)
+_WORD_BITS = np.uint64(64)
+# Fingerprints come from the low 32 bits of the hash, the high 32 bits pick the bucket
+MAX_FINGERPRINT_BITS = 32
+# Share of the slots filled at the requested capacity; buckets of 4 fill to 94-96% before inserts fail, less for small tables
+MAX_LOAD = 0.9
+# Evictions tried before an insert gives up
+MAX_KICKS = 500
+
+
+class CuckooFilter(_ShingledText):
+    """Cuckoo filter (Fan et al., "Cuckoo Filter: Practically Better Than Bloom"): a fingerprint of every item
+    is stored in one of two candidate buckets of bucket_size slots. The slots are bit-packed, fingerprint_bits
+    each, into a uint64 array, so a fingerprint may span two words.
+
+    A query compares the item's fingerprint with the slots of its two buckets, and removing an item clears one
+    slot holding its fingerprint. The two buckets of a fingerprint are i1 and i2 = (h(fp) - i1) mod num_buckets,
+    so either one follows from the other and the fingerprint alone, for any number of buckets. When both buckets
+    are full, an insert evicts a random fingerprint to its alternate bucket, up to MAX_KICKS times; the last
+    homeless fingerprint is kept aside, and once that happened the filter is full and further inserts fail.
+
+    Fingerprints are ceil(log2(2 * bucket_size / f)) bits wide, so that the false positive rate, about
+    2 * bucket_size / 2^bits, stays just below f. At a load of MAX_LOAD that is (log2(1/f) + 3) / 0.9 bits per
+    item against 1.44 * log2(1/f) for a Bloom filter: about the same at f = 0.1%, fewer below it, and unlike
+    a Bloom filter it supports removal.
+    """
+    def __init__(self, n, f, bucket_size = 4) -> None:
+        """Initialize an empty Cuckoo Filter for n items and false positive rate f
+
+        Args:
+            n (int): number of elements, dataset size
+            f (numeric): false positive rate
+            bucket_size (int): slots per bucket
+        """
+        self.n = n
+        self.f = f
+        self.bucket_size = bucket_size
+        self.fingerprint_bits = self.calculateFingerprintBits()
+        self.num_buckets = max(1, math.ceil(n / (bucket_size * MAX_LOAD)))
+        self.table = np.zeros(self._table_words(), dtype=np.uint64)
+        self.num_items = 0
+        self.victim = None # (bucket, fingerprint) left homeless by a failed insert
+        self._random = random.Random(0)
+
+    def calculateFingerprintBits(self) -> int:
+        """Calculate the fingerprint width: the fewest bits with 2 * bucket_size / 2^bits <= f, at most MAX_FINGERPRINT_BITS
+
+        Returns:
+            int: number of bits per fingerprint
+        """
+        return min(MAX_FINGERPRINT_BITS, max(1, math.ceil(math.log2(2 * self.bucket_size / self.f))))
+
+    def _table_words(self) -> int:
+        """Number of uint64 words holding the packed slots, plus one so that the last fingerprint can be read as a pair of words"""
+        return -(-self.num_buckets * self.bucket_size * self.fingerprint_bits // 64) + 1
+
+    def fingerprint_table(self):
+        """Unpack the slots
+
+        Returns:
+            np.ndarray: (num_buckets, bucket_size) uint64 array of fingerprints, 0 for an empty slot
+        """
+        return self._rows(np.arange(self.num_buckets, dtype=np.uint64))
+
+    def load_factor(self) -> float:
+        """Share of the slots holding a fingerprint
+
+        Returns:
+            float: load factor between 0 and 1
+        """
+        return int(np.count_nonzero(self.fingerprint_table())) / (self.num_buckets * self.bucket_size)
+
+    def bits_per_item(self) -> float:
+        """Table bits spent per stored item
+
+        Returns:
+            float: bits per item, inf while empty
+        """
+        return self.table.nbytes * 8 / self.num_items if self.num_items else math.inf
+
+    def false_positive_bound(self) -> float:
+        """Upper bound of the false positive rate at the current load: a query compares its fingerprint
+        with the occupied slots of two buckets, each matching with probability 1 / (2^bits - 1)
+
+        Returns:
+            float: false positive rate bound
+        """
+        compared = 2 * self.bucket_size * self.load_factor()
+        return 1 - (1 - 1 / (2 ** self.fingerprint_bits - 1)) ** compared
+
+    def report(self) -> str:
+        """Describe the fill of the filter: items, load factor, bits per item and false positive bound
+
+        Returns:
+            str: one-line report
+        """
+        return (f"{self.num_items} items in {self.num_buckets} buckets of {self.bucket_size} {self.fingerprint_bits}-bit slots; "
+                f"load factor = {self.load_factor():.3f}, bits per item = {self.bits_per_item():.2f}, "
+                f"false positive rate bound = {self.false_positive_bound():.3g}")
+
+    def _locate(self, hashes):
+        """Derive the fingerprint and both candidate buckets of every 64-bit hash
+
+        Args:
+            hashes (np.ndarray): uint64 hashes
+
+        Returns:
+            tuple: fingerprints (never 0, which marks an empty slot), first buckets and alternate buckets
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64).ravel()
+        mask = np.uint64((1 << self.fingerprint_bits) - 1)
+        fingerprints = hashes & mask
+        fingerprints[fingerprints == 0] = 1
+        buckets = (hashes >> _SHIFT_32) % np.uint64(self.num_buckets)
+        return fingerprints, buckets, self._alternate(buckets, fingerprints)
+
+    def _alternate(self, buckets, fingerprints):
+        """The other bucket of each fingerprint, (h(fp) - bucket) mod num_buckets; applying it twice gives the bucket back"""
+        num_buckets = np.uint64(self.num_buckets)
+        mixed = (np.asarray(fingerprints, dtype=np.uint64) * _FINGERPRINT_MIX) % num_buckets
+        return (mixed + num_buckets - np.asarray(buckets, dtype=np.uint64)) % num_buckets
+
+    def _words(self, buckets, slots):
+        """Word index and bit offset of every slot in the packed table"""
+        slots = np.asarray(buckets, dtype=np.uint64) * np.uint64(self.bucket_size) + np.asarray(slots, dtype=np.uint64)
+        positions = slots * np.uint64(self.fingerprint_bits)
+        return (positions >> _SHIFT_6).astype(np.intp), positions & np.uint64(63)
+
+    def _read(self, buckets, slots):
+        """Fingerprints in the given slots; buckets and slots broadcast against each other"""
+        words, offsets = self._words(buckets, slots)
+        values = self.table[words] >> offsets
+        spill = offsets + np.uint64(self.fingerprint_bits) > _WORD_BITS
+        values[spill] |= self.table[words[spill] + 1] << (_WORD_BITS - offsets[spill])
+        return values & np.uint64((1 << self.fingerprint_bits) - 1)
+
+    def _rows(self, buckets):
+        """The (len(buckets), bucket_size) fingerprints of the given buckets"""
+        return self._read(np.asarray(buckets, dtype=np.uint64)[:, None], np.arange(self.bucket_size, dtype=np.uint64))
+
+    def _write(self, buckets, slots, fingerprints) -> None:
+        """Store fingerprints (0 to clear) in distinct slots. ufunc.at applies every update, also where
+        several slots share a word."""
+        words, offsets = self._words(buckets, slots)
+        mask = np.uint64((1 << self.fingerprint_bits) - 1)
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        np.bitwise_and.at(self.table, words, ~(mask << offsets))
+        np.bitwise_or.at(self.table, words, fingerprints << offsets)
+        spill = offsets + np.uint64(self.fingerprint_bits) > _WORD_BITS
+        shifts = _WORD_BITS - offsets[spill]
+        np.bitwise_and.at(self.table, words[spill] + 1, ~(mask >> shifts))
+        np.bitwise_or.at(self.table, words[spill] + 1, fingerprints[spill] >> shifts)
+
+    def _bucket(self, bucket) -> list:
+        """The fingerprints of one bucket, on Python ints: its slots are contiguous bits, read in one slice"""
+        start = bucket * self.bucket_size * self.fingerprint_bits
+        word = start // 64
+        packed = int.from_bytes(self.table[word:word + self.bucket_size * self.fingerprint_bits // 64 + 2].tobytes(), 'little') >> start % 64
+        mask = (1 << self.fingerprint_bits) - 1
+        return [packed >> slot * self.fingerprint_bits & mask for slot in range(self.bucket_size)]
+
+    def _set(self, bucket, slot, fingerprint) -> None:
+        """Store one fingerprint, on Python ints"""
+        word, offset = divmod((bucket * self.bucket_size + slot) * self.fingerprint_bits, 64)
+        pair = int(self.table[word]) | int(self.table[word + 1]) << 64
+        pair = pair & ~(((1 << self.fingerprint_bits) - 1) << offset) | fingerprint << offset
+        self.table[word], self.table[word + 1] = pair & (2 ** 64 - 1), pair >> 64
+
+    def _items_hashes(self, items):
+        """One 64-bit murmur3 hash per str or bytes item"""
+        digests = b"".join([mmh3.hash_bytes(item) for item in items])
+        return np.frombuffer(digests, dtype='<u8').reshape(-1, 2)[:, 0]
+
+    def _place(self, buckets, fingerprints):
+        """Write fingerprints into free slots of the given buckets, all at once. Several fingerprints
+        for one bucket take its free slots in turn; the ones left over are not placed.
+
+        Returns:
+            np.ndarray: boolean array, True where the fingerprint was placed
+        """
+        order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[order]
+        starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        empty = self._rows(sorted_buckets) == 0
+        # The slot of the rank-th fingerprint of a bucket is that bucket's rank-th empty slot
+        slots = np.argmax(empty & (np.cumsum(empty, axis=1) == ranks[:, None] + 1), axis=1)
+        placed_sorted = ranks < empty.sum(axis=1)
+        self._write(sorted_buckets[placed_sorted], slots[placed_sorted], fingerprints[order][placed_sorted])
+        placed = np.zeros(len(order), dtype=bool)
+        placed[order] = placed_sorted
+        return placed
+
+    def _kick(self, bucket, fingerprint) -> None:
+        """Insert one fingerprint whose buckets are both full by evicting fingerprints to their alternate buckets.
+        Works on Python ints, which beat NumPy calls on single values."""
+        fingerprint, mix = int(fingerprint), int(_FINGERPRINT_MIX)
+        row = self._bucket(bucket)
+        for _ in range(MAX_KICKS):
+            slot = self._random.randrange(self.bucket_size)
+            self._set(bucket, slot, fingerprint)
+            fingerprint = row[slot]
+            bucket = ((fingerprint * mix) % 2 ** 64 % self.num_buckets - bucket) % self.num_buckets
+            row = self._bucket(bucket)
+            if 0 in row:
+                self._set(bucket, row.index(0), fingerprint)
+                return
+        self.victim = (bucket, fingerprint)
+
+    def insert_hashes(self, hashes) -> None:
+        """Insert a batch of 64-bit hashes. Like a Bloom filter the cuckoo filter holds a set: hashes that are
+        possibly present already are skipped, since two buckets hold at most 2 * bucket_size copies of one
+        fingerprint and shingles such as "of the" recur in most documents. Fingerprints with a free slot in one
+        of their buckets are placed together; only the rest are inserted one at a time by eviction.
+
+        Args:
+            hashes (np.ndarray): uint64 hashes, e.g. shingle hashes from shingling.word_shingle_hashes
+
+        Raises:
+            ValueError: the filter is full; the hashes inserted before stay in it
+        """
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64).ravel())
+        hashes = hashes[~self.query_hashes(hashes)]
+        fingerprints, first, second = self._locate(hashes)
+        if self.victim is not None and len(fingerprints):
+            raise ValueError(f"Cuckoo filter is full at load factor {self.load_factor():.3f}.")
+        placed = self._place(first, fingerprints)
+        rest = np.flatnonzero(~placed)
+        placed[rest] = self._place(second[rest], fingerprints[rest])
+        self.num_items += int(placed.sum())
+        for position in np.flatnonzero(~placed):
+            if self.victim is not None:
+                raise ValueError(f"Cuckoo filter is full at load factor {self.load_factor():.3f}.")
+            self._kick(int(first[position]), int(fingerprints[position]))
+            self.num_items += 1
+
+    def query_hashes(self, hashes):
+        """Look up a batch of 64-bit hashes
+
+        Args:
+            hashes (np.ndarray): uint64 hashes
+
+        Returns:
+            np.ndarray: boolean array, True where the hash is possibly in the filter
+        """
+        fingerprints, first, second = self._locate(hashes)
+        found = ((self._rows(first) == fingerprints[:, None]).any(axis=1)
+                 | (self._rows(second) == fingerprints[:, None]).any(axis=1))
+        if self.victim is not None:
+            bucket, fingerprint = self.victim
+            found |= (fingerprints == fingerprint) & ((first == bucket) | (second == bucket))
+        return found
+
+    def remove_hashes(self, hashes):
+        """Remove a batch of 64-bit hashes inserted before. Hashes that are definitely absent are left alone;
+        removing something never inserted can remove another item with the same fingerprint and bucket, so
+        only remove what was inserted. A hash given several times is removed once, since the filter stores
+        it once; for the same reason a hash inserted for several documents is gone for all of them once
+        removed for one.
+
+        Args:
+            hashes (np.ndarray): uint64 hashes
+
+        Returns:
+            np.ndarray: boolean array, True where the hash was possibly present and was removed
+        """
+        hashes, inverse = np.unique(np.asarray(hashes, dtype=np.uint64).ravel(), return_inverse=True)
+        return self._remove_unique(hashes)[inverse]
+
+    def _remove_unique(self, hashes):
+        """Remove distinct 64-bit hashes; see remove_hashes"""
+        fingerprints, first, second = self._locate(hashes)
+        removed = np.zeros(len(fingerprints), dtype=bool)
+        pending = np.arange(len(fingerprints))
+        missing = []
+        while pending.size:
+            # Every pending hash claims the first slot holding its fingerprint in either bucket; of several
+            # claims on one slot the first wins and the others look again in the next round
+            matches = np.concatenate([self._rows(first[pending]), self._rows(second[pending])], axis=1) == fingerprints[pending, None]
+            has_match = matches.any(axis=1)
+            column = np.argmax(matches, axis=1)
+            buckets = np.where(column < self.bucket_size, first[pending], second[pending])
+            slots = column % self.bucket_size
+            claims = np.flatnonzero(has_match)
+            _, winners = np.unique(buckets[claims] * np.uint64(self.bucket_size) + slots[claims].astype(np.uint64), return_index=True)
+            winners = claims[winners]
+            self._write(buckets[winners], slots[winners], np.zeros(len(winners), dtype=np.uint64))
+            removed[pending[winners]] = True
+            lost = np.ones(pending.size, dtype=bool)
+            lost[winners] = False
+            missing.extend(pending[~has_match])
+            pending = pending[lost & has_match]
+        for position in missing:
+            if self.victim is not None and self.victim[1] == fingerprints[position] and self.victim[0] in (first[position], second[position]):
+                self.victim = None
+                removed[position] = True
+        self.num_items -= int(removed.sum())
+        if self.victim is not None and removed.any():
+            # A slot was freed, so the homeless fingerprint gets another chance
+            bucket, fingerprint = self.victim
+            self.victim = None
+            self._kick(bucket, fingerprint)
+        return removed
+
+    def insert(self, item) -> None:
+        """Insert an item
+
+        Args:
+            item (Object): str or bytes item
+        """
+        self.insert_many([item])
+
+    def query(self, item) -> bool:
+        """Look up an item
+
+        Args:
+            item (Object): str or bytes item
+
+        Returns:
+            Boolean: Boolean value of whether the item is possibly in the filter
+        """
+        return bool(self.query_many([item])[0])
+
+    def remove(self, item) -> bool:
+        """Remove an item inserted before; see remove_hashes
+
+        Args:
+            item (Object): str or bytes item
+
+        Returns:
+            bool: True if the item was possibly present and was removed
+        """
+        return bool(self.remove_many([item])[0])
+
+    def insert_many(self, items) -> None:
+        """Insert a batch of items; see insert_hashes
+
+        Args:
+            items (Iterable): str or bytes items
+        """
+        self.insert_hashes(self._items_hashes(items))
+
+    def query_many(self, items):
+        """Look up a batch of items
+
+        Args:
+            items (Iterable): str or bytes items
+
+        Returns:
+            np.ndarray: boolean array, True where the item is possibly in the filter
+        """
+        return self.query_hashes(self._items_hashes(items))
+
+    def remove_many(self, items):
+        """Remove a batch of items; see remove_hashes
+
+        Args:
+            items (Iterable): str or bytes items
+
+        Returns:
+            np.ndarray: boolean array, True where the item was removed
+        """
+        return self.remove_hashes(self._items_hashes(items))
+
+    # The names the bloomfilter3 filters use
+    add, check, add_many, check_many = insert, query, insert_many, query_many
+
+    def remove_txt(self, doc_item) -> bool:
+        """Remove a document inserted with insert_txt. Its shingles are only removed if all of them
+        are possibly present, since a partial removal would take shingles away from other documents.
+        Shingles it shares with documents still in the filter are removed too, so those documents are no
+        longer found, and a later document sharing a removed shingle is not removed at all; keep a
+        CountingBloomFilter when documents sharing shingles are removed one by one.
+
+        Args:
+            doc_item (Object): document
+
+        Returns:
+            bool: True if the document was possibly present and was removed
+        """
+        return bool(self.remove_txt_many([doc_item])[0])
+
+    def remove_txt_many(self, documents):
+        """Remove a batch of documents; see remove_txt
+
+        Args:
+            documents (Iterable): documents
+
+        Returns:
+            np.ndarray: boolean array, True where the document was removed
+        """
+        documents = list(documents)
+        present = self.query_txt_many(documents)
+        hashes, _ = self._txt_hashes([doc_item for doc_item, found in zip(documents, present) if found])
+        self.remove_hashes(hashes)
+        return present
+
+    def save(self, path) -> None:
+        """Save the filter to one file: a header with its parameters, the hash method, the fingerprint width,
+        the item count and the homeless fingerprint, then the packed fingerprint table
+
+        Args:
+            path (str): destination path
+        """
+        table = bitarray(endian='big')
+        table.frombytes(self.table.tobytes())
+        header = {'filter': type(self).__name__,
+                  'params': {'n': self.n, 'f': self.f, 'bucket_size': self.bucket_size},
+                  'hash': HASH_METHOD, 'fingerprint_bits': self.fingerprint_bits,
+                  'num_items': self.num_items, 'victim': self.victim}
+        write_filter(path, header, [table])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a filter written by save. With mmap the table is mapped copy-on-write instead of read;
+        changes after loading never reach the file.
+
+        Args:
+            path (str): path of the saved filter
+            mmap (bool): map the table instead of reading it into memory
+
+        Returns:
+            CuckooFilter: the loaded filter
+
+        Raises:
+            ValueError: the file was saved with another fingerprint layout
+        """
+        header, (table,) = read_filter(path, cls.__name__, mmap)
+        check_hash(path, header, HASH_METHOD)
+        cuckoo = cls.__new__(cls)
+        cuckoo.n, cuckoo.f, cuckoo.bucket_size = header['params']['n'], header['params']['f'], header['params']['bucket_size']
+        cuckoo.fingerprint_bits = cuckoo.calculateFingerprintBits()
+        cuckoo.num_buckets = max(1, math.ceil(cuckoo.n / (cuckoo.bucket_size * MAX_LOAD)))
+        if header.get('fingerprint_bits') != cuckoo.fingerprint_bits:
+            raise ValueError(f"{path} was saved with another fingerprint layout than the packed "
+                             f"{cuckoo.fingerprint_bits}-bit one of this version. Rebuild the filter.")
+        # A view of the loaded (or copy-on-write mapped) bytes, not a copy
+        cuckoo.table = np.frombuffer(table, dtype='<u8')[:cuckoo._table_words()]
+        cuckoo.num_items = header['num_items']
+        cuckoo.victim = tuple(header['victim']) if header['victim'] else None
+        cuckoo._random = random.Random(0)
+        return cuckoo
@@ -5,6 +5,23 @@ import time
 import tracemalloc
 import logging
 
+import numpy as np
+
+from .minhash import hash_shingles, minhash_numpy
+from .shingling import word_shingle_hashes, char_shingle_hashes
+
+# Documents read, normalized and signed per step by the streaming pipelines.
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def iter_tsv(file_path: str):
+    """
+    Streams the rows of a TSV file with a header line as dictionaries.
+    :param file_path: Path to the TSV file.
+    :return: Generator of rows as dictionaries.
+    """
+    with open(file_path, mode='r', encoding='utf-8') as file:
+        yield from csv.DictReader(file, delimiter='\t')
 
 def read_tsv(file_path: str):
     """
@@ -12,12 +29,123 @@ def read_tsv(file_path: str):
     :param file_path: Path to the TSV file.
     :return: List of rows as dictionaries.
     """
-    data = []
+    return list(iter_tsv(file_path))
+
+def iter_tsv_no_headers(file_path: str):
+    """
+    Streams a TSV file without headers, one document per line, taking the first column as 'id' and the second as 'text'.
+    Logs the total number of rows processed and any malformed rows encountered once the file is exhausted.
+
+    :param file_path: Path to the TSV file.
+    :return: Generator of dictionaries with keys 'id' and 'text'.
+    """
+    total_rows = 0  # Track the number of rows encountered
+    malformed_rows = 0  # Track malformed or empty rows
+    documents = 0
+
     with open(file_path, mode='r', encoding='utf-8') as file:
-        reader = csv.DictReader(file, delimiter='\t')
-        for row in reader:
-            data.append(row)
-    return data
+        for line in file:
+            total_rows += 1
+            row = line.strip().split('\t')  # Split and strip whitespace
+
+            if len(row) == 2 and all(row):
+                documents += 1
+                yield {'id': row[0].strip(), 'text': row[1].strip()}
+            elif len(row) == 1 and row[0]:  # Single entry, treat as ID-only
+                documents += 1
+                yield {'id': str(documents), 'text': row[0].strip()}
+            else:
+                malformed_rows += 1  # Count malformed or empty rows
+
+    logging.info(f"Processed {total_rows} rows; read {documents} documents with {malformed_rows} malformed or empty rows skipped.")
+
+def iter_chunks(iterable, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Groups an iterable into lists of at most chunk_size items.
+    :param iterable: Any iterable, typically iter_tsv_no_headers.
+    :param chunk_size: Maximum number of items per chunk.
+    :return: Generator of lists.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def read_documents_at(file_path: str, ordinals):
+    """
+    Re-reads only the documents at the given positions of iter_tsv_no_headers.
+    :param file_path: Path to the TSV file.
+    :param ordinals: Positions of the wanted documents in the stream.
+    :return: Dictionary mapping each ordinal to its document.
+    """
+    wanted = set(ordinals)
+    found = {}
+    if not wanted:
+        return found
+    last = max(wanted)
+    for ordinal, doc in enumerate(iter_tsv_no_headers(file_path)):
+        if ordinal in wanted:
+            found[ordinal] = doc
+        if ordinal >= last:
+            break
+    return found
+
+def text_digest(text: str) -> bytes:
+    """
+    Digest of a document text, used to find exact duplicates without keeping the text.
+    :param text: Document text.
+    :return: 16-byte digest.
+    """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+class ExactDuplicateFilter:
+    """
+    Drops documents whose normalized text was already seen, remembering a 16-byte digest per distinct text,
+    so memory grows by a fixed amount per unique document whatever its length. Texts that differ only in
+    case, punctuation or spacing are duplicates.
+
+    An optional Bloom filter is a pre-check in front of the set: it is queried once for the whole chunk,
+    and only the digests it reports as possibly seen are looked up in the set. A digest it has definitely
+    not seen is new, and is added to the set and the Bloom filter after the check. The Bloom filter is
+    indexed by the digest's own bits, so it adds no hashing.
+    """
+    def __init__(self, normalize: bool = True, bloom_filter=None):
+        """
+        :param normalize: Digest clean_and_normalize(text); False when the texts are normalized already.
+        :param bloom_filter: Optional empty bloomfilter1 filter (e.g. a ScalableBloomFilter) for the pre-check.
+        """
+        self.normalize = normalize
+        self.bloom_filter = bloom_filter
+        self.seen = set()
+
+    def __call__(self, documents):
+        """
+        Splits a chunk of documents into first occurrences and exact duplicates.
+        :param documents: List of documents with 'id' and 'text'.
+        :return: Tuple containing a list of unique documents and a list of duplicates.
+        """
+        digests = [text_digest(clean_and_normalize(doc['text']) if self.normalize else doc['text']) for doc in documents]
+        if self.bloom_filter is None:
+            maybe_seen = [True] * len(digests)
+        else:
+            # The first 64 bits of every digest serve as its hash
+            maybe_seen = self.bloom_filter.query_hashes(np.frombuffer(b"".join(digests), dtype='<u8')[::2]).tolist()
+        unique_docs, duplicates, new_digests = [], [], {}
+        for doc, digest, maybe in zip(documents, digests, maybe_seen):
+            # A digest the Bloom filter has not seen can only repeat within this chunk
+            if (maybe and digest in self.seen) or digest in new_digests:
+                duplicates.append(doc)
+            else:
+                new_digests[digest] = None
+                unique_docs.append(doc)
+        self.seen.update(new_digests)
+        if self.bloom_filter is not None and new_digests:
+            self.bloom_filter.insert_hashes(np.frombuffer(b"".join(new_digests), dtype='<u8')[::2])
+        return unique_docs, duplicates
 
 def write_tsv(file_path: str, data, fieldnames):
     """
@@ -48,6 +176,18 @@ def generate_shingles(document, k=3):
     shingles = [tuple(words[i:i + k]) for i in range(len(words) - k + 1)]
     return shingles
 
+def document_shingles(document, k=3, engine='md5'):
+    """
+    Builds the word k-gram shingles of a document in the representation the minhash engine consumes.
+    :param document: The document text.
+    :param k: Number of words per shingle.
+    :param engine: 'md5' for a list of word tuples, 'numpy' for a uint64 array of shingle hashes.
+    :return: Shingles of the document.
+    """
+    if engine == 'numpy':
+        return word_shingle_hashes(clean_and_normalize(document), k)
+    return generate_shingles(document, k)
+
 from nltk.util import ngrams  # If you use the nltk library for n-grams
 
 def create_ngrams(text, n):
@@ -58,20 +198,28 @@ def hash_shingle(shingle, seed):
     h = hashlib.md5(str(shingle).encode('utf-8') + str(seed).encode('utf-8'))
     return int(h.hexdigest(), 16)
 
-def generate_minhash_signature(shingles, num_hashes=100):
+def generate_minhash_signature(shingles, num_hashes=100, engine='md5'):
+    if engine == 'numpy':
+        if not isinstance(shingles, np.ndarray):
+            shingles = hash_shingles(shingles)
+        return minhash_numpy(shingles, num_hashes)
     signature = []
     for i in range(num_hashes):
         min_hash = min([hash_shingle(shingle, i) for shingle in shingles])
         signature.append(min_hash)
     return signature
 
-def minhash_signature(text: str, num_permutations: int) -> list:
+def minhash_signature(text: str, num_permutations: int, engine: str = 'md5') -> list:
     """
     Generate a minhash signature for the given text.
     :param text: The document text.
     :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
-    :return: A list of integers representing the minhash signature.
+    :param engine: 'md5' for one MD5 per (shingle, permutation), 'numpy' for the vectorized universal-hash engine.
+    :return: A list of integers (or a uint64 array for the numpy engine) representing the minhash signature.
     """
+    if engine == 'numpy':
+        return minhash_numpy(word_shingle_hashes(text, 1), num_permutations)
+
     # Split the text into shingles (e.g., words)
     shingles = text.split()  # You may want to use n-grams instead of words
     
@@ -124,13 +272,14 @@ def track_memory_and_time(func):
         tracemalloc.start()
         start_time = time.time()
         
-        # Execute the function
-        result = func(*args, **kwargs)
-        
-        # Stop tracking memory and time
-        current, peak = tracemalloc.get_traced_memory()
-        end_time = time.time()
-        tracemalloc.stop()
+        # Execute the function, stopping the tracking even when it raises
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            # Stop tracking memory and time
+            current, peak = tracemalloc.get_traced_memory()
+            end_time = time.time()
+            tracemalloc.stop()
         
         # Calculate time and memory usage
         elapsed_time = end_time - start_time
@@ -143,7 +292,6 @@ def track_memory_and_time(func):
     return wrapper
 
 import hashlib
-import numpy as np
 
 def lsh_hash(signature, bands, rows):
     """
@@ -187,6 +335,75 @@ def lsh_banding(signatures, num_bands, rows_per_band):
 
     return candidates
 
+# Earlier members of a bucket a document is linked to when the links are verified on signatures
+MAX_VERIFIED_LINKS = 32
+
+def bucket_star_edges(band_hashes, max_links=1):
+    """
+    Links every document to the first max_links members of each LSH bucket it falls in, without listing all pairs.
+
+    Unioning these edges yields the same clusters as unioning the pairs of
+    find_candidate_pairs, but with max_links=1 a bucket of size s contributes s - 1 edges instead of s * (s - 1) / 2 pairs.
+    Before verify_edges, link to more members (e.g. MAX_VERIFIED_LINKS): with a single
+    link a document similar to a later member but not to the first loses its only link,
+    so recall would depend on the order of the documents.
+
+    :param band_hashes: List of LSH hashes for documents.
+    :param max_links: Number of earlier members of a bucket every document is linked to.
+    :return: (E, 2) int32 array of distinct (document, bucket member) edges.
+    """
+    members = {}
+    edges = []
+
+    for doc_id, hash_list in enumerate(band_hashes):
+        for band_id, band_hash in enumerate(hash_list):
+            bucket = members.setdefault((band_id, band_hash), [])
+            edges.extend((doc_id, member) for member in bucket)
+            if len(bucket) < max_links:
+                bucket.append(doc_id)
+
+    # The same edge recurs in every band the two documents share
+    return np.unique(np.array(edges, dtype=np.int32).reshape(-1, 2), axis=0)
+
+def signature_matrix(signatures) -> np.ndarray:
+    """
+    Packs minhash signatures into a (num_docs, num_permutations) uint64 matrix for vectorized comparison.
+    md5 signatures hold 128-bit integers (or inf for empty documents); their low 64 bits are kept,
+    which preserves equality up to a negligible collision probability.
+    :param signatures: uint64 signature matrix (numpy engine) or list of md5 signature lists.
+    :return: uint64 signature matrix.
+    """
+    if isinstance(signatures, np.ndarray) and signatures.dtype == np.uint64:
+        return signatures
+    mask = (1 << 64) - 1
+    return np.array([[mask if value == float('inf') else int(value) & mask for value in signature]
+                     for signature in signatures], dtype=np.uint64).reshape(len(signatures), -1)
+
+def verify_edges(edges, signatures, threshold: float, chunk_size: int = 65536):
+    """
+    Drops candidate edges whose estimated Jaccard similarity is below the threshold.
+    The signatures of both ends of every edge are compared in one vectorized pass (per chunk of edges),
+    so LSH false positives are discarded before they can chain unrelated documents into one cluster.
+    :param edges: (E, 2) array of document rows, e.g. from bucket_star_edges.
+    :param signatures: Signature matrix indexed by document row (see signature_matrix).
+    :param threshold: Minimum fraction of agreeing minhash rows, between 0 and 1.
+    :param chunk_size: Number of edges compared per block, bounding the (edges x permutations) matrix.
+    :return: (K, 2) array of the edges that passed.
+    """
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError(f"Verification threshold must be between 0 and 1, got {threshold}.")
+    edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
+    signatures = signature_matrix(signatures)
+    keep = np.zeros(len(edges), dtype=bool)
+    for start in range(0, len(edges), chunk_size):
+        block = edges[start:start + chunk_size]
+        scores = np.mean(signatures[block[:, 0]] == signatures[block[:, 1]], axis=1)
+        keep[start:start + chunk_size] = scores >= threshold
+    kept = edges[keep]
+    logging.info(f"Verification kept {len(kept)} and dropped {len(edges) - len(kept)} candidate edges "
+                 f"below estimated Jaccard {threshold}.")
+    return kept
+
 def find_candidate_pairs(band_hashes):
     """
     Finds candidate document pairs based on LSH hash buckets.
@@ -233,14 +450,50 @@ def find_candidate_pairs(band_hashes):
 
 # Union-Find, not using networkx
 class UnionFind:
+    """
+    Disjoint-set forest over the integers 0..n-1, backed by int32 NumPy arrays.
+
+    find is iterative with path halving, so long merge chains cannot exhaust the
+    recursion limit. find_many resolves the roots of an array of elements at once,
+    union_many merges a whole (E, 2) array of candidate pairs with vectorized
+    hooking, and components resolves every element's root at once.
+    """
     def __init__(self, n):
-        self.parent = list(range(n))
-        self.rank = [0] * n
+        self.parent = np.arange(n, dtype=np.int32)
+        self.rank = np.zeros(n, dtype=np.int32)
+
+    @classmethod
+    def from_arrays(cls, parent, rank):
+        """
+        Restores a union-find from saved parent and rank arrays. int32 arrays are used as they
+        are, so a memory-mapped array is only read where the forest is visited.
+        :param parent: Parent array.
+        :param rank: Rank array of the same length.
+        :return: UnionFind.
+        """
+        uf = cls(0)
+        uf.parent = np.asarray(parent, dtype=np.int32)
+        uf.rank = np.asarray(rank, dtype=np.int32)
+        return uf
+
+    def __len__(self):
+        return len(self.parent)
+
+    def extend(self, count):
+        """
+        Appends count new singleton elements.
+        :param count: Number of elements to add.
+        """
+        start = len(self.parent)
+        self.parent = np.concatenate([self.parent, np.arange(start, start + count, dtype=np.int32)])
+        self.rank = np.concatenate([self.rank, np.zeros(count, dtype=np.int32)])
 
     def find(self, p):
-        if self.parent[p] != p:
-            self.parent[p] = self.find(self.parent[p])
-        return self.parent[p]
+        parent = self.parent
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]  # Path halving
+            p = parent[p]
+        return int(p)
 
     def union(self, p, q):
         rootP = self.find(p)
@@ -254,33 +507,66 @@ class UnionFind:
                 self.parent[rootQ] = rootP
                 self.rank[rootP] += 1
 
-def find_candidate_pairs_multi_probe(band_hashes, num_probes=2):
-    """
-    Finds candidate document pairs using Multi-Probe LSH.
-    :param band_hashes: List of LSH hashes for documents.
-    :param num_probes: Number of nearby buckets to probe for potential candidates.
-    :return: Set of candidate document pairs.
-    """
-    buckets = {}
-    candidate_pairs = set()
-    
-    for doc_id, hash_list in enumerate(band_hashes):
-        for band_id, band_hash in enumerate(hash_list):
-            # Main bucket
-            if (band_id, band_hash) not in buckets:
-                buckets[(band_id, band_hash)] = []
-            for candidate_doc_id in buckets[(band_id, band_hash)]:
-                candidate_pairs.add((min(doc_id, candidate_doc_id), max(doc_id, candidate_doc_id)))
-            buckets[(band_id, band_hash)].append(doc_id)
-            
-            # Probe nearby buckets
-            for probe in range(1, num_probes + 1):
-                nearby_hash = band_hash + probe
-                if (band_id, nearby_hash) in buckets:
-                    for candidate_doc_id in buckets[(band_id, nearby_hash)]:
-                        candidate_pairs.add((min(doc_id, candidate_doc_id), max(doc_id, candidate_doc_id)))
-    
-    return candidate_pairs
+    def find_many(self, elements):
+        """
+        Resolves the roots of many elements by pointer jumping, touching only their paths.
+        The elements are then pointed directly at their roots.
+        :param elements: Integer array of elements.
+        :return: int32 array of their roots.
+        """
+        elements = np.asarray(elements, dtype=np.int32)
+        roots = self.parent[elements]
+        while True:
+            above = self.parent[roots]
+            if np.array_equal(above, roots):
+                break
+            roots = above
+        self.parent[elements] = roots
+        return roots
+
+    def _compress(self):
+        """
+        Points every element directly at its root by repeated pointer jumping (parent = parent[parent]).
+        """
+        parent = self.parent
+        while True:
+            grandparents = parent[parent]
+            if np.array_equal(grandparents, parent):
+                break
+            parent = grandparents
+        self.parent = parent
+
+    def union_many(self, edges):
+        """
+        Merges every pair of an edge array in a few vectorized rounds.
+
+        Each round resolves the roots of the remaining edges with find_many and hooks
+        every larger root under the smallest root it is linked to (np.minimum.at), so
+        any number of edges sharing a root are merged in the same round. Hooking always
+        points to a smaller index, so no cycles can form; edges whose roots still differ
+        are retried on their new roots. The rank of a root that gains a subtree is raised
+        as in union, so later scalar unions keep balancing the trees.
+
+        :param edges: (E, 2) integer array (or iterable of pairs) of elements to merge.
+        """
+        edges = np.asarray(edges if isinstance(edges, np.ndarray) else list(edges), dtype=np.int32).reshape(-1, 2)
+        left, right = edges[:, 0], edges[:, 1]
+        while left.size:
+            root_left = self.find_many(left)
+            root_right = self.find_many(right)
+            pending = root_left != root_right
+            left = np.maximum(root_left[pending], root_right[pending])
+            right = np.minimum(root_left[pending], root_right[pending])
+            np.minimum.at(self.parent, left, right)
+            np.maximum.at(self.rank, self.parent[left], self.rank[left] + 1)
+
+    def components(self):
+        """
+        Resolves the root of every element, fully compressing the forest.
+        :return: int32 array of cluster labels (the root of each element).
+        """
+        self._compress()
+        return self.parent.copy()
 
 import hashlib
 
@@ -312,14 +598,17 @@ def get_dynamic_shingle_size(text: str, min_k=3, max_k=5) -> int:
     else:
         return max_k
 
-def minhash_signature_dynamic(text: str, num_permutations: int) -> list:
+def minhash_signature_dynamic(text: str, num_permutations: int, engine: str = 'md5') -> list:
     """
     Generate a minhash signature for the given text using a dynamic shingle size.
     :param text: The document text.
     :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
-    :return: A list of integers representing the minhash signature.
+    :param engine: 'md5' for one MD5 per (shingle, permutation), 'numpy' for the vectorized universal-hash engine.
+    :return: A list of integers (or a uint64 array for the numpy engine) representing the minhash signature.
     """
     k = get_dynamic_shingle_size(text)  # Get dynamic shingle size based on document length
+    if engine == 'numpy':
+        return minhash_numpy(char_shingle_hashes(text, k), num_permutations)
     shingles = [text[i:i+k] for i in range(len(text) - k + 1)]  # Create k-shingles
     signature = [float('inf')] * num_permutations
     
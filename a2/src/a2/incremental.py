@@ -0,0 +1,286 @@
+import os
+import json
+import logging
+import sqlite3
+
+import numpy as np
+
+from .dedup import UnionFind, text_digest, signature_matrix, verify_edges, MAX_VERIFIED_LINKS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS docs (row INTEGER PRIMARY KEY, id TEXT NOT NULL, root INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS docs_root ON docs (root);
+CREATE TABLE IF NOT EXISTS texts (digest BLOB PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (band, hash, row)
+) WITHOUT ROWID;
+"""
+_STATE_FILES = ('state.sqlite', 'parent.bin', 'rank.bin', 'signatures.bin')
+# SQLite limits the number of bound parameters per statement.
+_BATCH = 500
+
+
+def _bucket_key(band_hash) -> bytes:
+    # md5 band hashes are 128-bit.
+    return int(band_hash).to_bytes(16, 'big')
+
+
+class DedupState:
+    """
+    Persisted state of a deduplication run, extended in place by later batches.
+
+    The state directory holds:
+        state.sqlite   - parameters, the committed row count, row -> document id and cluster
+                         root, normalized text digests, and the first rows of every
+                         (band, hash) bucket (one, or MAX_VERIFIED_LINKS with a threshold)
+        parent.bin     - Union-Find parent array (int32, one entry per row)
+        rank.bin       - Union-Find rank array (int32, one entry per row)
+        signatures.bin - appended (rows, num_permutations) uint64 signatures (numpy engine)
+
+    A bucket only needs one representative: every earlier member of the bucket is
+    already in the representative's cluster, so a new document joins the cluster by
+    a single union. Verified links need a few more, since a new document may only be
+    similar to a later member. Appending a batch therefore costs one bucket lookup per
+    band per new document, independent of the size of the collection.
+
+    The same holds for the files: the Union-Find arrays are mapped copy-on-write, a batch
+    appends its rows to every file, and save writes back only the entries the batch changed.
+    Cluster members are looked up by their root in SQLite rather than by scanning all rows.
+    """
+
+    def __init__(self, state_dir: str, params: dict, append: bool = False):
+        """
+        Opens the state directory.
+        :param state_dir: Directory holding the state files.
+        :param params: Pipeline parameters (scheme, engine, num_permutations, bands, rows, threshold).
+        :param append: Load the existing state; otherwise any previous state is replaced.
+        """
+        self.state_dir = state_dir
+        # States written before exact duplicates were keyed on the normalized text hold raw text digests;
+        # states of layout 1 kept the Union-Find arrays in rewritten .npy files and no roots in SQLite,
+        # and those of layout 2 a single row per bucket
+        params = dict(params, exact_key='normalized', layout=3)
+        self.max_links = MAX_VERIFIED_LINKS if params.get('threshold') else 1
+        self.params = params
+        path = os.path.join(state_dir, 'state.sqlite')
+        if append:
+            if not os.path.exists(path):
+                raise ValueError(f"No deduplication state in {state_dir}; run once without --append first.")
+        else:
+            os.makedirs(state_dir, exist_ok=True)
+            for name in _STATE_FILES:
+                if os.path.exists(os.path.join(state_dir, name)):
+                    os.remove(os.path.join(state_dir, name))
+
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_SCHEMA)
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+        if stored is None:
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('params', ?)", (json.dumps(params, sort_keys=True),))
+            self.conn.commit()
+        elif json.loads(stored[0]) != params:
+            raise ValueError(f"State in {state_dir} was built with {stored[0]}; "
+                             f"cannot append with {json.dumps(params, sort_keys=True)}.")
+        if append and params.get('threshold') and params['engine'] != 'numpy':
+            raise ValueError("Verifying appended documents needs the persisted signatures of the numpy engine.")
+
+        rows = self.conn.execute("SELECT value FROM meta WHERE key = 'rows'").fetchone()
+        rows = int(rows[0]) if rows else 0
+        for name in ('parent.bin', 'rank.bin'):
+            # Drops rows appended by a batch that was never saved
+            with open(os.path.join(state_dir, name), 'ab') as file:
+                file.truncate(rows * 4)
+        self.uf = self._map_forest(rows)
+        self._dirty = []
+        self._new_digests = set()
+        self._new_buckets = {}
+        self._new_signatures = []
+
+    def __len__(self):
+        return len(self.uf)
+
+    def remove_exact_duplicates(self, documents):
+        """
+        Removes documents whose text is already in the state or repeated within the batch.
+        :param documents: List of documents with 'id' and normalized 'text' (see stream_signatures).
+        :return: Tuple containing a list of unique documents and a list of duplicates.
+        """
+        digests = [text_digest(doc['text']) for doc in documents]
+        # Digests of earlier batches that are not saved yet count as known too
+        known = set(digest for digest in digests if digest in self._new_digests)
+        unique_digests = list(dict.fromkeys(digests))
+        for start in range(0, len(unique_digests), _BATCH):
+            batch = unique_digests[start:start + _BATCH]
+            placeholders = ','.join('?' * len(batch))
+            known.update(bytes(row[0]) for row in
+                         self.conn.execute(f"SELECT digest FROM texts WHERE digest IN ({placeholders})", batch))
+
+        unique_docs, duplicates = [], []
+        for doc, digest in zip(documents, digests):
+            if digest in known:
+                duplicates.append(doc)
+            else:
+                known.add(digest)
+                self._new_digests.add(digest)
+                unique_docs.append(doc)
+        return unique_docs, duplicates
+
+    def _map_forest(self, rows: int) -> UnionFind:
+        """
+        Maps the first rows of the Union-Find files copy-on-write: only the pages a batch
+        touches are read, and changes stay in memory until save writes them back.
+        """
+        if rows == 0:
+            return UnionFind(0)
+        return UnionFind.from_arrays(*(np.memmap(os.path.join(self.state_dir, name), dtype='<i4', mode='c', shape=(rows,))
+                                       for name in ('parent.bin', 'rank.bin')))
+
+    def _grow_forest(self, count: int) -> None:
+        """
+        Appends count singleton rows to the Union-Find files and remaps them, keeping the unsaved changes.
+        """
+        start = len(self)
+        with open(os.path.join(self.state_dir, 'parent.bin'), 'ab') as file:
+            file.write(np.arange(start, start + count, dtype='<i4').tobytes())
+        with open(os.path.join(self.state_dir, 'rank.bin'), 'ab') as file:
+            file.write(np.zeros(count, dtype='<i4').tobytes())
+        dirty = np.unique(np.concatenate(self._dirty)) if self._dirty else np.empty(0, dtype=np.int32)
+        parent, rank = self.uf.parent[dirty], self.uf.rank[dirty]
+        self.uf = self._map_forest(start + count)
+        self.uf.parent[dirty], self.uf.rank[dirty] = parent, rank
+
+    def _members(self, band: int, key: bytes):
+        stored = [row for (row,) in self.conn.execute("SELECT row FROM buckets WHERE band = ? AND hash = ? ORDER BY row",
+                                                      (band, key))]
+        return stored + self._new_buckets.get((band, key), [])
+
+    def add_documents(self, documents, signatures, band_hashes):
+        """
+        Bands the new documents against the stored buckets and unions them into existing clusters.
+        With a verification threshold in the parameters, links below it are dropped before the union.
+        :param documents: New unique documents, in the same order as signatures and band_hashes.
+        :param signatures: Minhash signatures of the new documents.
+        :param band_hashes: LSH band hashes of the new documents (see dedup.lsh_hash).
+        :return: Set of cluster roots that gained documents or were merged.
+        """
+        start = len(self)
+        if len(documents):
+            self._grow_forest(len(documents))
+
+        edges = []
+        for offset, hashes in enumerate(band_hashes):
+            row = start + offset
+            for band, band_hash in enumerate(hashes):
+                key = _bucket_key(band_hash)
+                members = self._members(band, key)
+                edges.extend((row, member) for member in members)
+                if len(members) < self.max_links:
+                    self._new_buckets.setdefault((band, key), []).append(row)
+        edges = np.unique(np.array(edges, dtype=np.int32).reshape(-1, 2), axis=0)
+
+        if self.params.get('threshold') and len(edges):
+            # Gather only the signatures of the rows the edges touch; earlier rows come from the memmap
+            rows, local_edges = np.unique(edges, return_inverse=True)
+            new_signatures = signature_matrix(signatures)
+            old_rows = rows[rows < start]
+            gathered = np.vstack([np.asarray(self.signatures()[old_rows]) if old_rows.size else
+                                  np.empty((0, new_signatures.shape[1]), dtype=np.uint64),
+                                  new_signatures[rows[rows >= start] - start]])
+            kept = verify_edges(local_edges.reshape(-1, 2), gathered, self.params['threshold'])
+            edges = rows[kept]
+
+        # Hooking only rewrites the roots of the edges' clusters, and find_many only the elements it
+        # resolves, so these entries (and the new rows) are all that differs from the files
+        touched = np.unique(edges)
+        old_roots = np.unique(self.uf.find_many(touched[touched < start]))
+        self.uf.union_many(edges)
+        new_rows = np.arange(start, len(self), dtype=np.int32)
+        new_roots = self.uf.find_many(new_rows)
+        merged_into = self.uf.find_many(old_roots)
+        self._dirty.extend([touched, old_roots, new_rows])
+
+        self.conn.executemany("UPDATE docs SET root = ? WHERE root = ?",
+                              [(int(root), int(old_root)) for old_root, root in zip(old_roots, merged_into) if root != old_root])
+        self.conn.executemany("INSERT INTO docs (row, id, root) VALUES (?, ?, ?)",
+                              [(start + offset, doc['id'], int(root)) for offset, (doc, root) in enumerate(zip(documents, new_roots))])
+        if self.params['engine'] == 'numpy' and len(documents):
+            self._new_signatures.append(np.asarray(signatures, dtype='<u8'))
+        return set(new_roots.tolist())
+
+    def roots(self) -> np.ndarray:
+        """
+        Resolves the cluster root of every row.
+        :return: int32 array of roots, one per row.
+        """
+        return self.uf.components()
+
+    def clusters(self, roots_to_report):
+        """
+        Lists the members of the given clusters, looked up by root without scanning the other rows.
+        :param roots_to_report: Cluster roots to expand.
+        :return: Dictionary mapping each root to the list of member document ids, in row order.
+        """
+        roots_to_report = sorted(int(root) for root in roots_to_report)
+        members = []
+        for start in range(0, len(roots_to_report), _BATCH):
+            batch = roots_to_report[start:start + _BATCH]
+            placeholders = ','.join('?' * len(batch))
+            members.extend(self.conn.execute(f"SELECT row, id, root FROM docs WHERE root IN ({placeholders})", batch))
+        clusters = {}
+        for row, doc_id, root in sorted(members):
+            clusters.setdefault(root, []).append(doc_id)
+        return clusters
+
+    def signatures(self) -> np.ndarray:
+        """
+        Memory-maps the persisted signatures (numpy engine only).
+        :return: (rows, num_permutations) uint64 array.
+        """
+        path = os.path.join(self.state_dir, 'signatures.bin')
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty((0, self.params['num_permutations']), dtype=np.uint64)
+        return np.memmap(path, dtype='<u8', mode='r').reshape(-1, self.params['num_permutations'])
+
+    def save(self) -> None:
+        """
+        Writes the new buckets, text digests and signatures, and the Union-Find entries the batches changed.
+        """
+        with open(os.path.join(self.state_dir, 'signatures.bin'), 'ab') as file:
+            for signatures in self._new_signatures:
+                file.write(signatures.tobytes())
+        self.conn.executemany("INSERT INTO buckets (band, hash, row) VALUES (?, ?, ?)",
+                              [(band, key, row) for (band, key), rows in self._new_buckets.items() for row in rows])
+        self.conn.executemany("INSERT INTO texts (digest) VALUES (?)", [(digest,) for digest in self._new_digests])
+        if self._dirty:
+            dirty = np.unique(np.concatenate(self._dirty))
+            for name, values in (('parent.bin', self.uf.parent), ('rank.bin', self.uf.rank)):
+                stored = np.memmap(os.path.join(self.state_dir, name), dtype='<i4', mode='r+', shape=(len(self),))
+                stored[dirty] = values[dirty]
+                stored.flush()
+                del stored
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rows', ?)", (str(len(self)),))
+        self.conn.commit()
+        self._new_buckets, self._new_digests, self._new_signatures, self._dirty = {}, set(), [], []
+        logging.info(f"Saved deduplication state with {len(self)} documents to {self.state_dir}.")
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def write_cluster_changes(output_path: str, clusters: dict, duplicates) -> None:
+    """
+    Writes the clusters touched by an appended batch, in the same format as a full run.
+    :param output_path: Path to the output `.txt` file.
+    :param clusters: Dictionary mapping cluster roots to member document ids.
+    :param duplicates: New documents dropped as exact duplicates.
+    """
+    with open(output_path, 'w') as file:
+        for root in sorted(clusters):
+            file.write(" ".join(clusters[root]) + "\n")
+        for dup in duplicates:
+            file.write(dup['id'] + "\n")
+    logging.info(f"Saved {len(clusters)} changed clusters and {len(duplicates)} exact duplicates to {output_path}.")
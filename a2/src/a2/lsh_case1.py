@@ -1,8 +1,12 @@
 import sys
 import csv
 import logging
-from .dedup import write_tsv, clean_and_normalize, minhash_signature, jaccard_similarity, track_memory_and_time
-from .dedup import lsh_hash, find_candidate_pairs, UnionFind
+from .dedup import write_tsv, track_memory_and_time
+from .dedup import iter_tsv_no_headers, ExactDuplicateFilter
+from .dedup import lsh_hash, find_candidate_pairs, bucket_star_edges, verify_edges, UnionFind, MAX_VERIFIED_LINKS
+from .signatures import stream_signatures
+from .incremental import DedupState, write_cluster_changes
+from .cluster_report import write_cluster_report
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,122 +19,104 @@ def read_tsv_no_headers(file_path: str):
     :param file_path: Path to the TSV file.
     :return: List of dictionaries with keys 'id' and 'text'.
     """
-    data = []
-    total_rows = 0  # Track the number of rows encountered
-    malformed_rows = 0  # Track malformed or empty rows
-
-    with open(file_path, mode='r', encoding='utf-8') as file:
-        for line in file:
-            total_rows += 1
-            row = line.strip().split('\t')  # Split and strip whitespace
-
-            if len(row) == 2 and all(row):
-                data.append({'id': row[0].strip(), 'text': row[1].strip()})
-            elif len(row) == 1 and row[0]:  # Single entry, treat as ID-only
-                data.append({'id': str(len(data) + 1), 'text': row[0].strip()})
-            else:
-                malformed_rows += 1  # Count malformed or empty rows
-    
-    logging.info(f"Processed {total_rows} rows; read {len(data)} documents with {malformed_rows} malformed or empty rows skipped.")
-    return data
+    return list(iter_tsv_no_headers(file_path))
 
 def remove_exact_duplicates(documents):
     """
-    Removes exact duplicate documents from the collection based on document text content.
+    Removes exact duplicate documents from the collection based on a digest of the normalized document text,
+    so documents differing only in case, punctuation or spacing are duplicates.
 
     :param documents: List of documents, each represented as a dictionary with 'id' and 'text' keys.
     :return: Tuple containing a list of unique documents and a list of duplicates.
     """
-    unique_docs = {}
-    duplicates = []
-
-    for doc in documents:
-        if doc['text'] not in unique_docs:
-            unique_docs[doc['text']] = doc
-        else:
-            duplicates.append(doc)
+    unique_docs, duplicates = ExactDuplicateFilter()(documents)
 
     logging.info(f"Processed {len(unique_docs)} unique documents and found {len(duplicates)} duplicates.")
-    return list(unique_docs.values()), duplicates
-
-def compute_jaccard_similarity(cluster):
-    """
-    Compute the Jaccard similarity for all pairs of documents in a given cluster.
-
-    :param cluster: List of documents in a cluster, each represented as a dictionary.
-    :return: List of tuples containing the document IDs and their Jaccard similarity score.
-    """
-    similarities = []
-    for i in range(len(cluster)):
-        for j in range(i + 1, len(cluster)):
-            doc1_shingles = set(cluster[i]['text'].split())
-            doc2_shingles = set(cluster[j]['text'].split())
-            similarity = jaccard_similarity(doc1_shingles, doc2_shingles)
-            similarities.append((cluster[i]['id'], cluster[j]['id'], similarity))
-    return similarities
+    return unique_docs, duplicates
 
 @track_memory_and_time
-def deduplicate_collection(file_path, output_path, num_permutations=100, bands=20):
+def deduplicate_collection(file_path, output_path, num_permutations=100, bands=20, engine='md5', workers=1, cache=None,
+                           state_dir=None, append=False, emit_pairs=None, threshold=None,
+                           report=None, exact_similarity=False, dedup_bloom=False):
     """
     Main function to deduplicate a collection of documents using basic LSH and clustering.
     Saves deduplicated clusters and exact duplicates in a `.txt` format.
+
+    :param engine: Minhash engine, 'md5' (reference) or 'numpy' (vectorized universal hashing).
+    :param workers: Number of processes used to compute signatures.
+    :param cache: Optional SignatureCache consulted before computing signatures.
+    :param state_dir: Directory where the deduplication state is persisted for later appends.
+    :param append: Add the documents to the state in state_dir and write only the changed clusters.
+    :param emit_pairs: Optional TSV path receiving every candidate pair, for evaluation.
+    :param threshold: Optional minimum estimated Jaccard similarity; candidate links below it are dropped before clustering.
+    :param report: Optional `.jsonl` path receiving the members and pairwise similarities of every multi-document cluster.
+    :param exact_similarity: Add exact word Jaccard similarities to the report, re-reading the clustered texts once.
+    :param dedup_bloom: Put a Bloom filter pre-check in front of the exact duplicate set (without state_dir).
     """
     logging.info("Starting deduplication process...")
 
-    # Step 1: Read documents
-    documents = read_tsv_no_headers(file_path)
-
-    # Step 2: Remove exact duplicates
-    unique_docs, removed_duplicates = remove_exact_duplicates(documents)
+    rows = num_permutations // bands
+    state = None
+    if state_dir:
+        params = {'scheme': 'word', 'engine': engine, 'num_permutations': num_permutations,
+                  'bands': bands, 'rows': rows,
+                  'threshold': threshold}
+        state = DedupState(state_dir, params, append=append)
+
+    # Steps 1-4: Stream the documents in chunks, removing exact duplicates (against the persisted
+    # state when appending), normalizing and computing Minhash signatures; texts are not kept
+    logging.info(f"Computing Minhash signatures ({engine} engine)...")
+    unique_docs, signatures, removed_duplicates = stream_signatures(
+        file_path, 'word', num_permutations, engine=engine, workers=workers, cache=cache,
+        remove_duplicates=state.remove_exact_duplicates if state is not None else None, dedup_bloom=dedup_bloom)
     logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
 
-    # Step 3: Clean and normalize document text
-    for doc in unique_docs:
-        doc['text'] = clean_and_normalize(doc['text'])
-
-    # Step 4: Compute Minhash signatures
-    logging.info("Computing Minhash signatures...")
-    for doc in unique_docs:
-        doc['minhash'] = minhash_signature(doc['text'], num_permutations)
-
     # Step 5: LSH to find candidate pairs
-    signatures = [doc['minhash'] for doc in unique_docs]
-    rows = num_permutations // bands
     lsh_hashes = [lsh_hash(signature, bands, rows) for signature in signatures]
-    candidate_pairs = find_candidate_pairs(lsh_hashes)
-    logging.info(f"Found {len(candidate_pairs)} candidate pairs.")
+    if state is not None:
+        changed_roots = state.add_documents(unique_docs, signatures, lsh_hashes)
+        state.save()
+        if append:
+            write_cluster_changes(output_path, state.clusters(changed_roots), removed_duplicates)
+            state.close()
+            return
+        state.close()
+
+    # Every candidate pair is only listed on request; clustering links each bucket in a star
+    if emit_pairs:
+        candidate_pairs = find_candidate_pairs(lsh_hashes)
+        logging.info(f"Found {len(candidate_pairs)} candidate pairs.")
+        write_tsv(emit_pairs, [{'doc1': unique_docs[doc1]['id'], 'doc2': unique_docs[doc2]['id']}
+                               for doc1, doc2 in sorted(candidate_pairs)], ['doc1', 'doc2'])
+    edges = bucket_star_edges(lsh_hashes, max_links=MAX_VERIFIED_LINKS if threshold else 1)
+    logging.info(f"Linked bucket members with {len(edges)} star edges.")
+    if threshold:
+        # Step 5b: Verify each link on the signatures so LSH false positives do not chain clusters
+        edges = verify_edges(edges, signatures, threshold)
 
     # Step 6: Cluster documents using Union-Find
     uf = UnionFind(len(unique_docs))
-    for doc1, doc2 in candidate_pairs:
-        uf.union(doc1, doc2)
+    uf.union_many(edges)
+    labels = uf.components()
 
     clusters = {}
+    cluster_rows = {}
     for idx, doc in enumerate(unique_docs):
-        root = uf.find(idx)
+        root = int(labels[idx])
         if root not in clusters:
             clusters[root] = []
+            cluster_rows[root] = []
         clusters[root].append(doc['id'])
+        cluster_rows[root].append(idx)
 
     logging.info(f"Formed {len(clusters)} clusters after deduplication.")
 
     for root, cluster in clusters.items():
-        # Convert each item in cluster to a document ID if cluster items are just strings (IDs)
-        if isinstance(cluster[0], str):  # Check if cluster contains only document IDs
-            logging.info(f"Cluster {root} contains document IDs: " + ", ".join(cluster))
-            # Retrieve full document objects for similarity calculation based on IDs
-            cluster_docs = [doc for doc in unique_docs if doc['id'] in cluster]
-        else:
-            logging.info(f"Cluster {root} contains document IDs: " + ", ".join(doc['id'] for doc in cluster))
-            cluster_docs = cluster  # Cluster already contains full document objects
-        
-        # Compute Jaccard similarity if there are multiple documents in the cluster
-        similarities = compute_jaccard_similarity(cluster_docs)
-        if similarities:
-            for doc1_id, doc2_id, similarity in similarities:
-                logging.info(f"Jaccard similarity between {doc1_id} and {doc2_id}: {similarity:.3f}")
-        else:
-            logging.info("No similarities to compute (only one document in cluster).")
+        logging.debug(f"Cluster {root} contains document IDs: " + ", ".join(cluster))
+
+    # Similarities of multi-document clusters go to a structured report instead of the log
+    if report:
+        write_cluster_report(report, unique_docs, cluster_rows, signatures, file_path, exact=exact_similarity)
 
 
     # Step 7: Save deduplicated document IDs in the `.txt` format
@@ -1,8 +1,10 @@
 import sys
-import csv
-from .dedup import write_tsv, clean_and_normalize, generate_minhash_signature, generate_shingles, track_memory_and_time
-from .dedup import lsh_banding, find_candidate_pairs
-from .dedup import UnionFind
+import numpy as np
+from .dedup import clean_and_normalize, generate_minhash_signature, track_memory_and_time, document_shingles
+from .dedup import iter_tsv_no_headers, read_documents_at, ExactDuplicateFilter, signature_matrix
+from .signatures import stream_signatures
+from .lsh_index import LSHIndex, top_k_scores, sort_band_keys, bucket_members
+from .minhash import band_keys
 import logging
 
 # Configure logging
@@ -15,98 +17,152 @@ def read_tsv_no_headers(file_path: str):
     :param file_path: Path to the TSV file.
     :return: List of dictionaries with keys 'id' and 'text'.
     """
-    data = []
-    with open(file_path, mode='r', encoding='utf-8') as file:
-        reader = csv.reader(file, delimiter='\t')
-        for row in reader:
-            if len(row) >= 2:  # Ensure both 'id' and 'text' columns are present
-                data.append({'id': row[0], 'text': row[1]})
-            elif len(row) == 1:  # Handle rows with only text (no id)
-                data.append({'id': str(len(data) + 1), 'text': row[0]})  # Assign auto-generated id
-    return data
+    return list(iter_tsv_no_headers(file_path))
 
 def remove_exact_duplicates(documents):
     """
-    Removes exact duplicate documents from the collection.
+    Removes exact duplicate documents from the collection, ignoring case, punctuation and spacing.
     :param documents: List of documents.
     :return: Deduplicated list of documents.
     """
-    unique_docs = {}
-    duplicates = []
+    unique_docs, duplicates = ExactDuplicateFilter()(documents)
 
-    for doc in documents:
-        if doc['text'] not in unique_docs:
-            unique_docs[doc['text']] = doc
-        else:
-            duplicates.append(doc)
+    logging.info(f"Processed {len(unique_docs)} unique documents and found {len(duplicates)} duplicates.")
+    return unique_docs, duplicates
 
-    print(f"Processed {len(unique_docs)} unique documents and found {len(duplicates)} duplicates.")  # Debugging
-    return list(unique_docs.values()), duplicates
+def top_k(query_signature, signatures, num_bands, rows_per_band, k=10, min_similarity=0.0, buckets=None, exclude=None):
+    """
+    Ranks the documents that share at least one LSH band with the query by estimated Jaccard similarity.
+    Only the members of the query's buckets are scored. The buckets are found by binary search in the
+    sorted band keys, which are built here unless passed in to be reused across queries.
+    :param query_signature: Minhash signature of the query.
+    :param signatures: Minhash signatures of the documents (numpy matrix or list of md5 signatures).
+    :param num_bands: Number of bands.
+    :param rows_per_band: Rows per band.
+    :param k: Maximum number of neighbours returned.
+    :param min_similarity: Smallest estimated Jaccard similarity returned.
+    :param buckets: Tuple (bucket_keys, bucket_rows) from sort_band_keys(signature_matrix(signatures), ...).
+    :param exclude: Row left out of the result, e.g. the row of the queried document.
+    :return: List of (row, estimated Jaccard similarity), best match first.
+    """
+    matrix = signature_matrix(signatures)
+    query_row = signature_matrix([query_signature])[0]
+    bucket_keys, bucket_rows = buckets if buckets is not None else sort_band_keys(matrix, num_bands, rows_per_band)
+    rows = bucket_members(bucket_keys, bucket_rows, enumerate(band_keys(query_row, num_bands, rows_per_band)[0]))
+    if exclude is not None:
+        rows = rows[rows != exclude]
+    if rows.size == 0:
+        return []
+    scores = np.mean(matrix[rows] == query_row, axis=1)
+    return top_k_scores(rows, scores, k, min_similarity)
 
 @track_memory_and_time
-def nearest_neighbor_search(file_path, output_path, query, num_hashes=300, num_bands=50, rows_per_band=2):
-    # Step 1: Read the documents without headers
+def nearest_neighbor_search(file_path, output_path, query=None, num_hashes=300, num_bands=50, rows_per_band=2, engine='md5', workers=1, cache=None,
+                            k=10, min_similarity=0.0, doc_id=None, dedup_bloom=False):
+    """
+    Finds the documents most similar to the query and writes the best match to output_path.
+    :param query: Query text; give either query or doc_id.
+    :param k: Maximum number of neighbours returned.
+    :param min_similarity: Smallest estimated Jaccard similarity returned.
+    :param doc_id: Id of a document of the file whose nearest neighbours are wanted; the document itself is excluded.
+    :param dedup_bloom: Put a Bloom filter pre-check in front of the exact duplicate set.
+    :return: List of (document id, estimated Jaccard similarity), best match first.
+    """
+    if (query is None) == (doc_id is None):
+        raise ValueError("Give either a query text or a document id.")
+    # Steps 1-4: Stream the documents without headers in chunks, removing exact duplicates,
+    # normalizing and computing Minhash signatures; texts are re-read only for the matches
     logging.info("Starting deduplication process...")
-    documents = read_tsv_no_headers(file_path)
-    # print(documents)
-    # Step 2: Remove exact duplicates
-    unique_docs, removed_duplicates = remove_exact_duplicates(documents)
-    logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
-
-    # Step 3: Clean and normalize documents
-    for doc in unique_docs:
-        doc['text'] = clean_and_normalize(doc['text'])
-    
-
-    # Step 4: Compute Minhash signatures for each document
     logging.info("\nGenerating shingles and computing Minhash signatures...")
-    for doc in unique_docs:
-        doc['shingle'] = generate_shingles(doc['text'])
-        doc['minhash'] = generate_minhash_signature(doc['shingle'], num_hashes)
-        # print(f"Document {doc['id']} shingles: {shingles}")
-        # print(f"Document {doc['id']} MinHash: {doc['minhash']}")
-
-
+    unique_docs, signatures, removed_duplicates = stream_signatures(
+        file_path, 'word_shingle', num_hashes, engine=engine, workers=workers, cache=cache, dedup_bloom=dedup_bloom)
+    logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
 
-    # Step 5: LSH banding to find candidate pairs
-    logging.info("\nFinding candidate pairs with LSH banding...")
-    signatures = [doc['minhash'] for doc in unique_docs]
-    # candidates = lsh_banding(signatures, num_bands, rows_per_band)
+    # Band keys are sorted once, so the query scores only the members of its buckets
+    matrix = signature_matrix(signatures)
+    buckets = sort_band_keys(matrix, num_bands, rows_per_band)
 
-    # Step 6: Process the query
+    # Step 5: Process the query
     logging.info("\nProcessing the query...")
-    query_cleaned = clean_and_normalize(query)
-    query_shingle = generate_shingles(query_cleaned)
-    query_signature = generate_minhash_signature(query_shingle, num_hashes)
-
-    query_candidates = lsh_banding(signatures + [query_signature], num_bands, rows_per_band)
-    logging.info(f"Query candidates after LSH: {query_candidates}")
-
-    # Step 6: Cluster candidate documents using Union-Find
-    # print("\nClustering documents using Union-Find...")
-    uf = UnionFind(len(unique_docs) + 1)
-    for doc1, doc2 in query_candidates:
-        uf.union(doc1, doc2)
-
-    # make sure query and document are in the same cluster
-    find = False 
-    query_doc_id = len(unique_docs)  # The ID of the Query document can be set to the length of the document list
-    for doc_id in range(len(unique_docs)):  # iterate ID
-        if uf.find(doc_id) == uf.find(query_doc_id):  # make sure query and document are in the same cluster
-            #print(f"Document {doc_id} belongs to the same cluster as the query")
-            logging.info(f"Best match for the query from {doc_id}")
-            logging.info(unique_docs[doc_id]['text'])
-            find = True
-            # return unique_docs[doc_id]['text']
-    if not find:
-        logging.info(f'There is no similarity between query and documents.')
+    exclude = None
+    if doc_id is not None:
+        rows = [row for row, doc in enumerate(unique_docs) if doc['id'] == doc_id]
+        if not rows:
+            raise ValueError(f"Document {doc_id} is not among the unique documents of {file_path}.")
+        exclude = rows[0]
+        query_signature = matrix[exclude]
+    else:
+        query_cleaned = clean_and_normalize(query)
+        query_shingle = document_shingles(query_cleaned, engine=engine)
+        query_signature = generate_minhash_signature(query_shingle, num_hashes, engine=engine)
+
+    # Step 6: Rank the documents sharing a band with the query by estimated Jaccard similarity
+    ranked = top_k(query_signature, matrix, num_bands, rows_per_band, k, min_similarity, buckets=buckets, exclude=exclude)
+    texts = read_documents_at(file_path, [unique_docs[row]['ordinal'] for row, _ in ranked[:1]])
+    for row, score in ranked:
+        logging.info(f"Match for the query: document {unique_docs[row]['id']} (estimated Jaccard {score:.3f})")
+    if not ranked:
+        logging.info('There is no similarity between query and documents.')
 
     with open(output_path, 'w') as f:
-        f.write(unique_docs[doc_id]['text'])
+        if ranked:
+            f.write(clean_and_normalize(texts[unique_docs[ranked[0][0]]['ordinal']]['text']))
 
         if removed_duplicates:
             for dup in removed_duplicates:
                 f.write(dup['id'] + "\n")
+    return [(unique_docs[row]['id'], score) for row, score in ranked]
+
+
+@track_memory_and_time
+def build_index(file_path, index_path, num_hashes=300, num_bands=50, rows_per_band=2, workers=1, cache=None, dedup_bloom=False):
+    """
+    Signs and bands the collection once and writes the result to an index file for later queries.
+    :param file_path: Path to the input TSV file.
+    :param index_path: Path of the index file to write.
+    :param num_hashes: Number of minhash permutations.
+    :param num_bands: Number of LSH bands.
+    :param rows_per_band: Rows per band.
+    :param workers: Number of processes used to compute signatures.
+    :param cache: Optional SignatureCache consulted before computing signatures.
+    :param dedup_bloom: Put a Bloom filter pre-check in front of the exact duplicate set.
+    :return: The built LSHIndex.
+    """
+    logging.info(f"Building LSH index for {file_path}...")
+    unique_docs, signatures, removed_duplicates = stream_signatures(
+        file_path, 'word_shingle', num_hashes, engine='numpy', workers=workers, cache=cache, keep_text=True, dedup_bloom=dedup_bloom)
+    logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
+
+    index = LSHIndex.from_documents(unique_docs, num_hashes, num_bands, rows_per_band,
+                                    source_path=file_path, signatures=signatures)
+    index.save(index_path)
+    return index
+
+
+@track_memory_and_time
+def query_index(index_path, output_path, query=None, probes=0, k=10, min_similarity=0.0, doc_id=None):
+    """
+    Answers a nearest neighbor query from a prebuilt index, signing only the query text.
+    :param index_path: Path to an index file written by build_index.
+    :param output_path: Path to the output file; receives the best matching document.
+    :param query: Query text; give either query or doc_id.
+    :param probes: Multi-probe budget: extra perturbed buckets looked up per query.
+    :param k: Maximum number of neighbours returned.
+    :param min_similarity: Smallest estimated Jaccard similarity returned.
+    :param doc_id: Id of an indexed document whose nearest neighbours are wanted.
+    :return: List of (document id, estimated Jaccard similarity), best match first.
+    """
+    index = LSHIndex.load(index_path)
+    ranked = index.top_k(query, k, min_similarity, doc_id=doc_id, probes=probes)
+    if not ranked:
+        logging.info('There is no similarity between query and documents.')
+    for match_id, score in ranked:
+        logging.info(f"Match for the query: document {match_id} (estimated Jaccard {score:.3f})")
+
+    with open(output_path, 'w') as f:
+        if ranked:
+            f.write(index.texts[index.row_of(ranked[0][0])])
+    return ranked
 
 
 if __name__ == '__main__':
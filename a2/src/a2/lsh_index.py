@@ -0,0 +1,387 @@
+import os
+import json
+import hashlib
+import logging
+
+import numpy as np
+
+from .dedup import clean_and_normalize, document_shingles
+from .minhash import band_keys, minhash_numpy_runner_up, probe_band_keys
+from .signatures import compute_signatures, sign_document
+
+# On-disk layout:
+#   MAGIC (8 bytes) | format version (uint32) | header length (uint32) | JSON header | arrays
+# Every array starts on a 64-byte boundary so it can be memory-mapped in place;
+# the header records the offset, dtype and shape of each one.
+MAGIC = b'A2LSHIDX'
+FORMAT_VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE_SIZE = len(MAGIC) + 8
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    Computes the SHA-256 checksum of a file, reading it in 1 MB blocks.
+    :param file_path: Path to the file.
+    :return: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(file_path: str) -> dict:
+    """
+    Describes a source file so that an index built from it can later be checked for staleness.
+    :param file_path: Path to the source TSV file.
+    :return: Dictionary with the absolute path, size, modification time and SHA-256 checksum.
+    """
+    stat = os.stat(file_path)
+    return {
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(file_path),
+    }
+
+
+def top_k_scores(rows, scores, k: int, min_similarity: float = 0.0):
+    """
+    Selects the k best scoring rows at or above a similarity floor.
+    :param rows: Array of candidate rows.
+    :param scores: Estimated Jaccard similarity of each candidate row.
+    :param k: Maximum number of rows returned; None keeps every row above the floor.
+    :param min_similarity: Smallest similarity returned.
+    :return: List of (row, score), best first; ties keep the lower row first.
+    """
+    rows, scores = np.asarray(rows), np.asarray(scores, dtype=np.float64)
+    keep = scores >= min_similarity
+    rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))
+    if k is not None:
+        order = order[:max(k, 0)]
+    return [(int(rows[i]), float(scores[i])) for i in order]
+
+
+def sort_band_keys(signatures, num_bands: int, rows_per_band: int):
+    """
+    Bands every signature and sorts the keys within each band, so that a bucket is found by binary search.
+    :param signatures: (num_docs, num_hashes) uint64 signature matrix.
+    :param num_bands: Number of bands.
+    :param rows_per_band: Rows per band.
+    :return: Tuple of the (num_bands, num_docs) sorted band keys and the document rows in the same order.
+    """
+    keys = band_keys(signatures, num_bands, rows_per_band).T
+    order = np.argsort(keys, axis=1, kind='stable').astype(np.int32)
+    return np.ascontiguousarray(np.take_along_axis(keys, order, axis=1)), order
+
+
+def bucket_members(bucket_keys, bucket_rows, lookups) -> np.ndarray:
+    """
+    Collects the rows of the looked-up buckets with two binary searches per bucket.
+    :param bucket_keys: (num_bands, num_docs) band keys sorted within each band (see sort_band_keys).
+    :param bucket_rows: Document rows in the same order as bucket_keys.
+    :param lookups: Iterable of (band, uint64 bucket key).
+    :return: Sorted array of the distinct member rows.
+    """
+    matches = []
+    for band, key in lookups:
+        band_keys_sorted = bucket_keys[band]
+        start = np.searchsorted(band_keys_sorted, key, side='left')
+        end = np.searchsorted(band_keys_sorted, key, side='right')
+        if end > start:
+            matches.append(np.asarray(bucket_rows[band, start:end]))
+    if not matches:
+        return np.empty(0, dtype=np.int32)
+    return np.unique(np.concatenate(matches))
+
+
+class StringTable:
+    """
+    Immutable list of strings stored as one UTF-8 blob plus an offsets array, so it can be memory-mapped.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(item) for item in encoded], dtype=np.int64)
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(offsets, blob)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.blob[start:end].tobytes().decode('utf-8')
+
+
+class LSHIndex:
+    """
+    Banded MinHash index over a document collection (word 3-gram shingles, numpy engine).
+
+    Attributes:
+        params (dict): num_hashes, num_bands, rows_per_band, scheme and engine used to sign documents.
+        signatures (np.ndarray): (num_docs, num_hashes) uint64 signature matrix.
+        bucket_keys (np.ndarray): (num_bands, num_docs) band keys, sorted within each band.
+        bucket_rows (np.ndarray): (num_bands, num_docs) document rows in the same order as bucket_keys.
+        ids (StringTable): document ids by row.
+        texts (StringTable): normalized document texts by row.
+        source (dict): fingerprint of the TSV file the index was built from.
+    """
+
+    def __init__(self, params, signatures, bucket_keys, bucket_rows, ids, texts, source=None):
+        self.params = params
+        self.signatures = signatures
+        self.bucket_keys = bucket_keys
+        self.bucket_rows = bucket_rows
+        self.ids = ids
+        self.texts = texts
+        self.source = source or {}
+        self._rows_by_id = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_documents(cls, documents, num_hashes=300, num_bands=50, rows_per_band=2, workers=1, source_path=None,
+                       cache=None, signatures=None):
+        """
+        Signs and bands a collection of unique, normalized documents.
+        :param documents: List of dictionaries with 'id' and normalized 'text'.
+        :param num_hashes: Number of minhash permutations.
+        :param num_bands: Number of LSH bands.
+        :param rows_per_band: Rows per band.
+        :param workers: Number of processes used to compute signatures.
+        :param source_path: TSV file the documents were read from, fingerprinted for staleness checks.
+        :param cache: Optional SignatureCache consulted before computing signatures.
+        :param signatures: Precomputed (num_docs, num_hashes) uint64 signatures of the documents, if already signed.
+        :return: LSHIndex held in memory.
+        """
+        params = {'num_hashes': num_hashes, 'num_bands': num_bands, 'rows_per_band': rows_per_band,
+                  'scheme': 'word_shingle', 'engine': 'numpy'}
+        texts = [doc['text'] for doc in documents]
+        if signatures is None:
+            signatures = compute_signatures(texts, params['scheme'], num_hashes, engine='numpy', workers=workers,
+                                            cache=cache)
+        bucket_keys, order = sort_band_keys(signatures, num_bands, rows_per_band)
+        source = source_fingerprint(source_path) if source_path else None
+        return cls(params, signatures, bucket_keys, order,
+                   StringTable.from_strings([doc['id'] for doc in documents]),
+                   StringTable.from_strings(texts), source)
+
+    def _arrays(self):
+        return {
+            'signatures': self.signatures,
+            'bucket_keys': self.bucket_keys,
+            'bucket_rows': self.bucket_rows,
+            'id_offsets': self.ids.offsets,
+            'id_blob': self.ids.blob,
+            'text_offsets': self.texts.offsets,
+            'text_blob': self.texts.blob,
+        }
+
+    def save(self, index_path: str) -> None:
+        """
+        Writes the index to a single memory-mappable file.
+        :param index_path: Destination path of the index file.
+        """
+        arrays = {name: np.ascontiguousarray(array) for name, array in self._arrays().items()}
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            layout[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        header = {'format_version': FORMAT_VERSION, 'params': self.params, 'source': self.source,
+                  'num_docs': len(self), 'arrays': layout}
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = -(-(_PREAMBLE_SIZE + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+
+        with open(index_path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(np.array([FORMAT_VERSION, len(header_bytes)], dtype='<u4').tobytes())
+            file.write(header_bytes)
+            for name, array in arrays.items():
+                file.seek(data_start + layout[name]['offset'])
+                file.write(array.tobytes())
+            file.truncate(data_start + offset)
+        logging.info(f"Saved LSH index with {len(self)} documents to {index_path}.")
+
+    @staticmethod
+    def read_header(index_path: str):
+        """
+        Reads and validates the header of an index file.
+        :param index_path: Path to the index file.
+        :return: Tuple of the header dictionary and the file offset where the arrays start.
+        """
+        with open(index_path, 'rb') as file:
+            preamble = file.read(_PREAMBLE_SIZE)
+            if len(preamble) < _PREAMBLE_SIZE or preamble[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{index_path} is not an LSH index file.")
+            version, header_length = np.frombuffer(preamble[len(MAGIC):], dtype='<u4')
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{index_path} has index format version {version}; "
+                                 f"this version reads format {FORMAT_VERSION}. Rebuild the index.")
+            header = json.loads(file.read(int(header_length)).decode('utf-8'))
+        data_start = -(-(_PREAMBLE_SIZE + int(header_length)) // _ALIGNMENT) * _ALIGNMENT
+        return header, data_start
+
+    @classmethod
+    def load(cls, index_path: str, mmap: bool = True, check_source: bool = True):
+        """
+        Opens an index file, memory-mapping its arrays by default.
+        :param index_path: Path to the index file.
+        :param mmap: Map the arrays read-only instead of reading them into memory.
+        :param check_source: Raise ValueError if the source TSV changed since the index was built.
+        :return: LSHIndex.
+        """
+        header, data_start = cls.read_header(index_path)
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+            offset = data_start + spec['offset']
+            if mmap and int(np.prod(shape)) > 0:
+                arrays[name] = np.memmap(index_path, dtype=dtype, mode='r', offset=offset, shape=shape)
+            else:
+                with open(index_path, 'rb') as file:
+                    file.seek(offset)
+                    arrays[name] = np.fromfile(file, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        index = cls(header['params'], arrays['signatures'], arrays['bucket_keys'], arrays['bucket_rows'],
+                    StringTable(arrays['id_offsets'], arrays['id_blob']),
+                    StringTable(arrays['text_offsets'], arrays['text_blob']), header.get('source'))
+        if check_source:
+            index.check_source()
+        return index
+
+    def is_stale(self) -> bool:
+        """
+        Tells whether the source TSV file changed since the index was built.
+        The checksum is only recomputed when the file size or modification time differ.
+        :return: True if the source file content changed, False if unchanged or unavailable.
+        """
+        path = self.source.get('path')
+        if not path or not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size == self.source['size'] and stat.st_mtime_ns == self.source['mtime_ns']:
+            return False
+        return file_sha256(path) != self.source['sha256']
+
+    def check_source(self) -> None:
+        """
+        Raises ValueError if the index is stale; logs a warning if the source file is gone.
+        """
+        path = self.source.get('path')
+        if path and not os.path.exists(path):
+            logging.warning(f"Source file {path} of the LSH index no longer exists; skipping staleness check.")
+        elif self.is_stale():
+            raise ValueError(f"LSH index is stale: {path} changed since the index was built. Rebuild the index.")
+
+    def sign(self, text: str) -> np.ndarray:
+        """
+        Normalizes and signs a query text with the index's parameters.
+        :param text: Raw query text.
+        :return: uint64 signature row.
+        """
+        return sign_document(clean_and_normalize(text), self.params['scheme'], self.params['num_hashes'],
+                             engine=self.params['engine'])
+
+    def sign_with_runner_up(self, text: str):
+        """
+        Normalizes and signs a query text, also returning the runner-up values used for multi-probe.
+        :param text: Raw query text.
+        :return: Tuple of the uint64 signature row and the uint64 runner-up row.
+        """
+        return minhash_numpy_runner_up(document_shingles(clean_and_normalize(text), engine='numpy'),
+                                       self.params['num_hashes'])
+
+    def bucket_lookups(self, signature, runner_up=None, probes: int = 0):
+        """
+        Lists the buckets a query looks up: one per band, then the multi-probe buckets.
+        :param signature: uint64 signature row.
+        :param runner_up: uint64 runner-up row (see sign_with_runner_up), required for probes.
+        :param probes: Probe budget: number of extra perturbed buckets looked up, most likely first.
+        :return: List of (band, uint64 bucket key).
+        """
+        num_bands, rows_per_band = self.params['num_bands'], self.params['rows_per_band']
+        lookups = list(enumerate(band_keys(signature, num_bands, rows_per_band)[0]))
+        if probes:
+            if runner_up is None:
+                raise ValueError("Multi-probe queries need the runner-up values of the query signature.")
+            lookups += zip(*probe_band_keys(signature, runner_up, num_bands, rows_per_band, probes))
+        return lookups
+
+    def candidates(self, signature, runner_up=None, probes: int = 0) -> np.ndarray:
+        """
+        Finds the rows sharing at least one band bucket with the signature.
+        :param signature: uint64 signature row.
+        :param runner_up: uint64 runner-up row (see sign_with_runner_up), required for probes.
+        :param probes: Probe budget: number of extra perturbed buckets looked up, most likely first.
+        :return: Sorted array of candidate rows.
+        """
+        return bucket_members(self.bucket_keys, self.bucket_rows, self.bucket_lookups(signature, runner_up, probes))
+
+    def row_of(self, doc_id: str) -> int:
+        """
+        Looks up the row of a document id; the id -> row map is built on first use.
+        :param doc_id: Document id.
+        :return: Row of the document.
+        """
+        if self._rows_by_id is None:
+            self._rows_by_id = {self.ids[row]: row for row in range(len(self))}
+        if doc_id not in self._rows_by_id:
+            raise ValueError(f"Document {doc_id} is not in the LSH index.")
+        return self._rows_by_id[doc_id]
+
+    def _ranked_rows(self, signature, runner_up=None, probes: int = 0, exclude=None, k=None, min_similarity=0.0):
+        rows = self.candidates(signature, runner_up, probes)
+        if exclude is not None:
+            rows = rows[rows != exclude]
+        if rows.size == 0:
+            return []
+        # Only the candidate rows are compared, so the cost follows the candidate count
+        scores = np.mean(np.asarray(self.signatures[rows]) == signature, axis=1)
+        return top_k_scores(rows, scores, k, min_similarity)
+
+    def query(self, text: str, probes: int = 0):
+        """
+        Answers a query by signing only the query text and ranking its bucket neighbours.
+        :param text: Raw query text.
+        :param probes: Multi-probe budget; extra buckets are found by perturbing single minhash rows.
+        :return: List of (row, estimated Jaccard similarity), best match first.
+        """
+        if probes:
+            signature, runner_up = self.sign_with_runner_up(text)
+        else:
+            signature, runner_up = self.sign(text), None
+        return self._ranked_rows(signature, runner_up, probes)
+
+    def top_k(self, query: str = None, k: int = 10, min_similarity: float = 0.0, doc_id: str = None, probes: int = 0):
+        """
+        Ranks the documents sharing a bucket with a query text or with an indexed document.
+        :param query: Raw query text; give either query or doc_id.
+        :param k: Maximum number of neighbours returned.
+        :param min_similarity: Smallest estimated Jaccard similarity returned.
+        :param doc_id: Id of an indexed document whose neighbours are wanted; the document itself is excluded.
+        :param probes: Multi-probe budget for text queries.
+        :return: List of (document id, estimated Jaccard similarity), best match first.
+        """
+        if (query is None) == (doc_id is None):
+            raise ValueError("Give either a query text or a document id.")
+        if doc_id is not None:
+            if probes:
+                raise ValueError("Multi-probe queries need a query text; stored signatures have no runner-up values.")
+            row = self.row_of(doc_id)
+            ranked = self._ranked_rows(np.asarray(self.signatures[row]), exclude=row, k=k, min_similarity=min_similarity)
+        elif probes:
+            signature, runner_up = self.sign_with_runner_up(query)
+            ranked = self._ranked_rows(signature, runner_up, probes, k=k, min_similarity=min_similarity)
+        else:
+            ranked = self._ranked_rows(self.sign(query), k=k, min_similarity=min_similarity)
+        return [(self.ids[row], score) for row, score in ranked]
@@ -0,0 +1,195 @@
+import mmh3
+import numpy as np
+
+from .shingling import mix64
+
+# Universal hashing is done modulo the Mersenne prime 2^61 - 1 so that every
+# permutation value fits in a uint64 and the reduction can be done with shifts.
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH_64 = np.uint64((1 << 64) - 1)
+MAX_HASH_32 = np.uint64((1 << 32) - 1)
+
+ENGINES = ('md5', 'numpy')
+
+_MASK_29 = np.uint64((1 << 29) - 1)
+_MASK_32 = np.uint64((1 << 32) - 1)
+_SHIFT_29 = np.uint64(29)
+_SHIFT_32 = np.uint64(32)
+_SHIFT_61 = np.uint64(61)
+_EIGHT = np.uint64(8)
+_BAND_BASE = np.uint64(0x100000001B3)
+_BAND_SALT = np.uint64(0x9E3779B97F4A7C15)
+
+_permutation_cache = {}
+
+
+def make_permutations(num_permutations: int, seed: int = 1):
+    """
+    Draws the (a, b) coefficients of the universal hash family h(x) = (a * x + b) mod p.
+    :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+    :param seed: Seed for the coefficient generator, fixing the hash family.
+    :return: Tuple of two uint64 arrays of shape (num_permutations, 1).
+    """
+    key = (num_permutations, seed)
+    if key not in _permutation_cache:
+        rng = np.random.RandomState(seed)
+        prime = int(MERSENNE_PRIME)
+        a = rng.randint(1, prime, size=num_permutations, dtype=np.uint64)
+        b = rng.randint(0, prime, size=num_permutations, dtype=np.uint64)
+        _permutation_cache[key] = (a.reshape(-1, 1), b.reshape(-1, 1))
+    return _permutation_cache[key]
+
+
+def _reduce_mersenne(x):
+    """
+    Folds a uint64 array below 2^63 into the range [0, 2^61 - 1).
+    """
+    x = (x & MERSENNE_PRIME) + (x >> _SHIFT_61)
+    x = (x & MERSENNE_PRIME) + (x >> _SHIFT_61)
+    return np.where(x >= MERSENNE_PRIME, x - MERSENNE_PRIME, x)
+
+
+def _mulmod_mersenne(a, x):
+    """
+    Computes (a * x) mod (2^61 - 1) exactly for uint64 arrays with a, x < 2^61.
+
+    The 122-bit product is split into 32-bit limbs; because 2^61 = 1 (mod p),
+    every partial product can be folded back below 2^63 without overflowing.
+    """
+    a_hi, a_lo = a >> _SHIFT_32, a & _MASK_32
+    x_hi, x_lo = x >> _SHIFT_32, x & _MASK_32
+    # a_hi * x_hi * 2^64 = a_hi * x_hi * 8 (mod p)
+    high = (a_hi * x_hi) * _EIGHT
+    # mid * 2^32 = (mid >> 29) * 2^61 + (mid & (2^29 - 1)) * 2^32
+    mid = a_hi * x_lo + a_lo * x_hi
+    mid = (mid >> _SHIFT_29) + ((mid & _MASK_29) << _SHIFT_32)
+    low = a_lo * x_lo
+    low = (low & MERSENNE_PRIME) + (low >> _SHIFT_61)
+    return _reduce_mersenne(high + mid + low)
+
+
+def hash_shingles(shingles) -> np.ndarray:
+    """
+    Hashes every shingle exactly once to a 64-bit integer.
+    :param shingles: Iterable of shingles (strings or tuples of words).
+    :return: uint64 array with one hash per shingle.
+    """
+    return np.fromiter(
+        (mmh3.hash64(str(shingle), signed=False)[0] for shingle in shingles),
+        dtype=np.uint64,
+    )
+
+
+def minhash_numpy(shingle_hashes, num_permutations: int, seed: int = 1, dtype=np.uint64, chunk_size: int = 4096) -> np.ndarray:
+    """
+    Computes a minhash signature by applying all permutations to the shingle hashes in one vectorized pass.
+    :param shingle_hashes: uint64 array with one hash per shingle.
+    :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+    :param seed: Seed of the universal hash family.
+    :param dtype: np.uint64 for full 61-bit values, np.uint32 for a compact signature.
+    :param chunk_size: Number of shingles processed per block, bounding the (permutations x shingles) matrix.
+    :return: Signature row of length num_permutations.
+    """
+    dtype = np.dtype(dtype)
+    max_hash = MAX_HASH_32 if dtype == np.uint32 else MAX_HASH_64
+    signature = np.full(num_permutations, max_hash, dtype=np.uint64)
+
+    shingle_hashes = np.asarray(shingle_hashes, dtype=np.uint64)
+    if shingle_hashes.size == 0:
+        return signature.astype(dtype)
+
+    a, b = make_permutations(num_permutations, seed)
+    values = shingle_hashes % MERSENNE_PRIME
+    for start in range(0, values.size, chunk_size):
+        block = values[start:start + chunk_size].reshape(1, -1)
+        permuted = _reduce_mersenne(_mulmod_mersenne(a, block) + b)
+        if dtype == np.uint32:
+            permuted &= MAX_HASH_32
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype(dtype)
+
+
+def minhash_numpy_runner_up(shingle_hashes, num_permutations: int, seed: int = 1, chunk_size: int = 4096):
+    """
+    Computes a minhash signature together with the second-smallest value of every permutation.
+    The runner-up is the value a similar document most likely holds in a row where it lacks this
+    document's minimizing shingle, which is what multi-probe LSH perturbs towards.
+    :param shingle_hashes: uint64 array with one hash per shingle.
+    :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+    :param seed: Seed of the universal hash family.
+    :param chunk_size: Number of shingles processed per block, bounding the (permutations x shingles) matrix.
+    :return: Tuple of two uint64 rows: the signature (equal to minhash_numpy) and the runner-up values,
+        MAX_HASH_64 where the document has fewer than two distinct shingles.
+    """
+    best = np.full((num_permutations, 2), MAX_HASH_64, dtype=np.uint64)
+    # Distinct shingles map to distinct values, so the runner-up never repeats the minimum
+    values = np.unique(np.asarray(shingle_hashes, dtype=np.uint64) % MERSENNE_PRIME)
+    if values.size:
+        a, b = make_permutations(num_permutations, seed)
+        for start in range(0, values.size, chunk_size):
+            block = values[start:start + chunk_size].reshape(1, -1)
+            permuted = _reduce_mersenne(_mulmod_mersenne(a, block) + b)
+            best = np.partition(np.concatenate([best, permuted], axis=1), 1, axis=1)[:, :2]
+    return best[:, 0].copy(), best[:, 1].copy()
+
+
+def probe_band_keys(signature, runner_up, num_bands: int, rows_per_band: int, budget: int):
+    """
+    Builds a multi-probe sequence of extra bucket keys by perturbing one minhash row per probe.
+
+    A near-duplicate misses a bucket when it disagrees on some row of the band; in
+    that row its minimum is most often this document's runner-up value, provided no
+    shingle outside this document hashes lower. That is less likely the smaller the
+    runner-up, so probes are ranked by increasing runner-up value across all bands.
+
+    :param signature: uint64 signature row.
+    :param runner_up: uint64 runner-up row from minhash_numpy_runner_up.
+    :param num_bands: Number of bands.
+    :param rows_per_band: Number of rows per band.
+    :param budget: Maximum number of probes, at most num_bands * rows_per_band.
+    :return: Tuple of the probed band indices and their uint64 bucket keys, most likely first.
+    """
+    width = num_bands * rows_per_band
+    runner_up = np.asarray(runner_up, dtype=np.uint64)[:width]
+    positions = np.flatnonzero(runner_up != MAX_HASH_64)
+    positions = positions[np.argsort(runner_up[positions], kind='stable')][:max(budget, 0)]
+    perturbed = np.tile(np.asarray(signature, dtype=np.uint64)[:width], (positions.size, 1))
+    perturbed[np.arange(positions.size), positions] = runner_up[positions]
+    bands = positions // rows_per_band
+    if positions.size == 0:
+        return bands, np.empty(0, dtype=np.uint64)
+    return bands, band_keys(perturbed, num_bands, rows_per_band)[np.arange(positions.size), bands]
+
+
+def estimate_jaccard(signature1, signature2) -> float:
+    """
+    Estimates the Jaccard similarity of two documents as the fraction of agreeing minhash rows.
+    :param signature1: First minhash signature.
+    :param signature2: Second minhash signature.
+    :return: Estimated Jaccard similarity as a float.
+    """
+    signature1, signature2 = np.asarray(signature1), np.asarray(signature2)
+    if signature1.size == 0:
+        return 0.0
+    return float(np.mean(signature1 == signature2))
+
+
+def band_keys(signatures, num_bands: int, rows_per_band: int) -> np.ndarray:
+    """
+    Hashes every band of every signature to one 64-bit bucket key, vectorized over the whole matrix.
+    :param signatures: (num_docs, num_permutations) signature matrix, or a single signature row.
+    :param num_bands: Number of bands.
+    :param rows_per_band: Number of rows per band.
+    :return: (num_docs, num_bands) uint64 array of bucket keys; equal keys mean equal bands.
+    """
+    signatures = np.asarray(signatures, dtype=np.uint64)
+    signatures = signatures.reshape(-1, signatures.shape[-1])
+    if num_bands * rows_per_band > signatures.shape[1]:
+        raise ValueError(f"{num_bands} bands of {rows_per_band} rows need more than {signatures.shape[1]} permutations.")
+    bands = signatures[:, :num_bands * rows_per_band].reshape(len(signatures), num_bands, rows_per_band)
+    keys = np.zeros((len(signatures), num_bands), dtype=np.uint64)
+    for row in range(rows_per_band):
+        keys = keys * _BAND_BASE + bands[:, :, row]
+    # Salt with the band index so that equal rows in different bands land in different buckets.
+    salt = np.arange(1, num_bands + 1, dtype=np.uint64) * _BAND_SALT
+    return mix64(keys ^ salt)
@@ -0,0 +1,168 @@
+import numpy as np
+
+# Bytes treated as token separators; these are the ASCII characters str.split() splits on.
+_SEPARATORS = np.array([9, 10, 11, 12, 13, 28, 29, 30, 31, 32], dtype=np.uint8)
+_IS_SEPARATOR = np.zeros(256, dtype=bool)
+_IS_SEPARATOR[_SEPARATORS] = True
+# The non-ASCII characters str.split() splits on (U+0085, U+00A0, U+2000..U+200A, U+3000, ...), mapped to a space.
+_UNICODE_SEPARATORS = {c: ' ' for c in range(128, 0x3001) if chr(c).isspace()}
+
+# Odd multipliers are invertible modulo 2^64, which lets a prefix sum be rescaled per token.
+_TOKEN_BASE = 0x100000001B3
+_TOKEN_BASE_INV = pow(_TOKEN_BASE, -1, 1 << 64)
+_GRAM_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SHIFT_30 = np.uint64(30)
+_SHIFT_27 = np.uint64(27)
+_SHIFT_31 = np.uint64(31)
+
+_EMPTY = np.empty(0, dtype=np.uint64)
+
+
+def mix64(x: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finalizer: spreads polynomial or combined hashes over all 64 bits.
+    :param x: uint64 array.
+    :return: Mixed uint64 array of the same shape.
+    """
+    x = (x ^ (x >> _SHIFT_30)) * _MIX_1
+    x = (x ^ (x >> _SHIFT_27)) * _MIX_2
+    return x ^ (x >> _SHIFT_31)
+
+
+def _powers(base: int, n: int) -> np.ndarray:
+    """
+    Returns [base^0, base^1, ..., base^(n-1)] modulo 2^64.
+    """
+    powers = np.full(n, base, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+def _text_bytes(text: str) -> np.ndarray:
+    """
+    Views the UTF-8 encoding of the text as a uint64 array, shifted by one so that no byte is zero.
+    """
+    return np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.uint64) + np.uint64(1)
+
+
+def _rolling_grams(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Combines every window of k consecutive values into one 64-bit hash.
+    """
+    count = values.size - k + 1
+    if k <= 0 or count <= 0:
+        return _EMPTY.copy()
+    grams = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        grams = grams * _GRAM_BASE + values[offset:offset + count]
+    return mix64(grams ^ np.uint64(k))
+
+
+def token_hashes(text: str) -> np.ndarray:
+    """
+    Hashes every whitespace-separated token of the text to a 64-bit integer.
+
+    Token boundaries follow str.split(), Unicode whitespace included. Every token
+    hash is derived from a single prefix sum over the encoded text, so no token
+    string is ever allocated.
+
+    :param text: The document text.
+    :return: uint64 array with one hash per token, in document order.
+    """
+    return _token_hashes(text)[0]
+
+
+def _token_hashes(text: str):
+    """
+    token_hashes, also giving the byte offset where every token starts in the UTF-8
+    encoding of the text (after mapping non-ASCII separators to a space).
+    """
+    if not text.isascii():
+        text = text.translate(_UNICODE_SEPARATORS)
+    data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    if data.size == 0:
+        return _EMPTY.copy(), np.empty(0, dtype=np.int64)
+    is_token = ~_IS_SEPARATOR[data]
+    # Token starts and ends alternate among the changes of is_token
+    changes = np.flatnonzero(np.diff(np.concatenate(([False], is_token, [False])).astype(np.int8)))
+    starts, ends = changes[0::2], changes[1::2]
+    if starts.size == 0:
+        return _EMPTY.copy(), starts
+
+    n = data.size
+    powers = _powers(_TOKEN_BASE, n + 1)
+    # prefix[i] = sum_{j < i} values[j] * base^(n - 1 - j), computed in place
+    prefix = np.zeros(n + 1, dtype=np.uint64)
+    weighted = prefix[1:]
+    np.add(data, np.uint64(1), out=weighted, dtype=np.uint64)
+    weighted *= powers[n - 1::-1]
+    np.cumsum(weighted, out=weighted)
+    # Rescale each token's slice of the prefix sum to base^(end - 1 - j), multiplying by base^end * base^-n.
+    raw = (prefix[ends] - prefix[starts]) * powers[ends] * np.uint64(pow(_TOKEN_BASE_INV, n, 1 << 64))
+    return mix64(raw), starts
+
+
+def word_shingle_hashes(text: str, k: int = 3) -> np.ndarray:
+    """
+    Hashes every word k-gram of the text to a 64-bit integer.
+    :param text: The document text (normalize it first for case-insensitive shingles).
+    :param k: Number of words per shingle.
+    :return: uint64 array with one hash per k-gram; empty when the text has fewer than k words.
+    """
+    return _rolling_grams(token_hashes(text), k)
+
+
+def word_shingle_hashes_many(texts, k: int = 3):
+    """
+    Hashes the word k-grams of a batch of texts in one pass over their concatenation,
+    giving the same hashes as word_shingle_hashes on each text.
+    :param texts: Iterable of document texts.
+    :param k: Number of words per shingle.
+    :return: Tuple of a uint64 array with the hashes of all texts in order, and len(texts) + 1
+             offsets: the hashes of text i are hashes[offsets[i]:offsets[i + 1]].
+    """
+    texts = [text if text.isascii() else text.translate(_UNICODE_SEPARATORS) for text in texts]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    # Texts are joined by a space, so no token spans two texts; a k-gram that does is dropped below
+    text_starts = np.zeros(len(texts), dtype=np.int64)
+    text_starts[1:] = np.cumsum([len(text.encode('utf-8')) + 1 for text in texts[:-1]])
+    tokens, token_starts = _token_hashes(' '.join(texts))
+    grams = _rolling_grams(tokens, k)
+    if grams.size == 0:
+        return grams, offsets
+    token_texts = np.searchsorted(text_starts, token_starts, side='right') - 1
+    first_texts = token_texts[:grams.size]
+    within = first_texts == token_texts[k - 1:]
+    offsets[1:] = np.cumsum(np.bincount(first_texts[within], minlength=len(texts)))
+    return grams[within], offsets
+
+
+def char_shingle_hashes(text: str, k: int = 5) -> np.ndarray:
+    """
+    Hashes every character k-gram of the text to a 64-bit integer.
+
+    Shingles are taken over the UTF-8 bytes, which equal the characters for
+    normalized (ASCII) text.
+
+    :param text: The document text.
+    :param k: Number of characters per shingle.
+    :return: uint64 array with one hash per k-gram; empty when the text is shorter than k.
+    """
+    return _rolling_grams(_text_bytes(text), k)
+
+
+def jaccard_similarity_hashes(hashes1: np.ndarray, hashes2: np.ndarray) -> float:
+    """
+    Computes the exact Jaccard similarity of two shingle hash arrays.
+    :param hashes1: Shingle hashes of the first document.
+    :param hashes2: Shingle hashes of the second document.
+    :return: Jaccard similarity as a float.
+    """
+    set1, set2 = np.unique(hashes1), np.unique(hashes2)
+    union = np.union1d(set1, set2).size
+    if union == 0:
+        return 0.0
+    return np.intersect1d(set1, set2, assume_unique=True).size / union
@@ -0,0 +1,130 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+
+import numpy as np
+
+# Shingle size used by each scheme; 'char_dynamic' derives k from the text itself,
+# so the text digest already determines it.
+SCHEME_SHINGLE_K = {'word': 1, 'char_dynamic': 'dynamic', 'word_shingle': 3}
+DEFAULT_CACHE_SIZE_MB = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    key BLOB PRIMARY KEY,
+    value BLOB NOT NULL,
+    last_used INTEGER NOT NULL
+)
+"""
+_LRU_INDEX = "CREATE INDEX IF NOT EXISTS signatures_last_used ON signatures (last_used)"
+# SQLite limits the number of bound parameters per statement.
+_BATCH = 500
+
+
+class SignatureCache:
+    """
+    On-disk, content-addressed cache of numpy-engine minhash signatures.
+
+    Entries are keyed by a digest of the normalized text together with the
+    hash-family parameters (scheme, shingle k, num_permutations, seed), so the
+    same document is signed once across runs and across overlapping datasets.
+    The cache holds at most max_bytes of signature data and evicts the least
+    recently used entries beyond that.
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: float = DEFAULT_CACHE_SIZE_MB):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'signatures.sqlite')
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(_SCHEMA)
+        self.conn.execute(_LRU_INDEX)
+        self.conn.commit()
+        self.evict()
+
+    @staticmethod
+    def key(text: str, scheme: str, num_permutations: int, seed: int = 1) -> bytes:
+        """
+        Builds the cache key of one normalized document.
+        :param text: Normalized document text.
+        :param scheme: Shingling scheme, one of signatures.SCHEMES.
+        :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+        :param seed: Seed of the universal hash family.
+        :return: 16-byte digest.
+        """
+        params = f"{scheme}:{SCHEME_SHINGLE_K[scheme]}:{num_permutations}:{seed}\0"
+        return hashlib.blake2b(params.encode('utf-8') + text.encode('utf-8'), digest_size=16).digest()
+
+    def get_many(self, keys):
+        """
+        Looks up signatures and refreshes their LRU position.
+        :param keys: List of cache keys.
+        :return: Dictionary mapping the keys found to uint64 signature arrays.
+        """
+        found = {}
+        for start in range(0, len(keys), _BATCH):
+            batch = keys[start:start + _BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(f"SELECT key, value FROM signatures WHERE key IN ({placeholders})", batch)
+            for key, value in rows:
+                found[bytes(key)] = np.frombuffer(value, dtype='<u8').astype(np.uint64)
+        if found:
+            now = time.time_ns()
+            self.conn.executemany("UPDATE signatures SET last_used = ? WHERE key = ?",
+                                  [(now, key) for key in found])
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items) -> None:
+        """
+        Stores signatures, then evicts least recently used entries above the size cap.
+        :param items: Iterable of (key, uint64 signature array) pairs.
+        """
+        now = time.time_ns()
+        rows = [(key, np.asarray(signature, dtype='<u8').tobytes(), now) for key, signature in items]
+        self.conn.executemany("INSERT OR REPLACE INTO signatures (key, value, last_used) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+        self.evict()
+
+    def size_bytes(self) -> int:
+        """
+        :return: Total size of the cached signature data in bytes.
+        """
+        return self.conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM signatures").fetchone()[0]
+
+    def evict(self) -> int:
+        """
+        Deletes least recently used entries until the cache fits in max_bytes.
+        :return: Number of entries evicted.
+        """
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        evicted, freed = [], 0
+        for key, size in self.conn.execute("SELECT key, LENGTH(value) FROM signatures ORDER BY last_used"):
+            if freed >= excess:
+                break
+            evicted.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM signatures WHERE key = ?", evicted)
+        self.conn.commit()
+        logging.info(f"Signature cache evicted {len(evicted)} entries to stay under {self.max_bytes} bytes.")
+        return len(evicted)
+
+    def report(self) -> None:
+        """
+        Logs the hit and miss counts of this run.
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        logging.info(f"Signature cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), "
+                     f"{self.size_bytes()} bytes in {self.path}.")
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,168 @@
+import logging
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .dedup import minhash_signature, minhash_signature_dynamic, generate_minhash_signature, document_shingles
+from .dedup import clean_and_normalize, iter_tsv_no_headers, iter_chunks, ExactDuplicateFilter, DEFAULT_CHUNK_SIZE
+from .bloomfilter1 import ScalableBloomFilter
+
+# Shingling scheme used by each pipeline:
+#   'word'         - single words (case1)
+#   'char_dynamic' - character k-grams with a length-dependent k (case1_imp)
+#   'word_shingle' - word 3-grams (case2)
+SCHEMES = ('word', 'char_dynamic', 'word_shingle')
+# Initial capacity and false positive rate of the Bloom pre-check of the exact duplicate filter; it grows with the input
+DEDUP_BLOOM_CAPACITY = 100000
+DEDUP_BLOOM_RATE = 0.01
+
+
+def sign_document(text: str, scheme: str, num_permutations: int, engine: str = 'md5'):
+    """
+    Computes the minhash signature of one normalized document.
+    :param text: Normalized document text.
+    :param scheme: Shingling scheme, one of SCHEMES.
+    :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+    :param engine: Minhash engine, 'md5' or 'numpy'.
+    :return: Minhash signature (list of ints for md5, uint64 array for numpy).
+    """
+    if scheme == 'word':
+        return minhash_signature(text, num_permutations, engine=engine)
+    if scheme == 'char_dynamic':
+        return minhash_signature_dynamic(text, num_permutations, engine=engine)
+    if scheme == 'word_shingle':
+        return generate_minhash_signature(document_shingles(text, engine=engine), num_permutations, engine=engine)
+    raise ValueError(f"Unknown shingling scheme '{scheme}'. Use one of {SCHEMES}.")
+
+
+def _sign_chunk(args):
+    """
+    Worker entry point: signs a chunk of documents and returns a compact result.
+
+    The numpy engine returns a single (chunk, num_permutations) uint64 array so that
+    only one buffer is pickled back per chunk; the md5 engine returns a list of
+    signature lists because its 128-bit values do not fit a fixed-width dtype.
+    """
+    texts, scheme, num_permutations, engine = args
+    signatures = [sign_document(text, scheme, num_permutations, engine) for text in texts]
+    if engine == 'numpy':
+        return np.vstack(signatures) if signatures else np.empty((0, num_permutations), dtype=np.uint64)
+    return signatures
+
+
+def compute_signatures(texts, scheme: str, num_permutations: int, engine: str = 'md5', workers: int = 1, chunk_size: int = 0,
+                       cache=None, executor=None):
+    """
+    Computes the minhash signatures of a list of normalized documents, optionally on a process pool.
+
+    Documents are split into contiguous chunks and the chunk results are
+    concatenated in input order, so the output is identical to a serial run.
+
+    :param texts: List of normalized document texts.
+    :param scheme: Shingling scheme, one of SCHEMES.
+    :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+    :param engine: Minhash engine, 'md5' or 'numpy'.
+    :param workers: Number of worker processes; 1 computes in the current process.
+    :param chunk_size: Documents per task; by default four chunks per worker.
+    :param cache: Optional SignatureCache; only documents missing from it are signed (numpy engine only).
+    :param executor: Optional running ProcessPoolExecutor with `workers` processes, reused instead of starting a pool.
+    :return: (len(texts), num_permutations) uint64 array for numpy, list of signature lists for md5.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown shingling scheme '{scheme}'. Use one of {SCHEMES}.")
+    texts = list(texts)
+    if cache is not None:
+        if engine == 'numpy':
+            return _compute_cached(texts, scheme, num_permutations, workers, chunk_size, cache, executor)
+        logging.warning("The signature cache only stores numpy-engine signatures; computing md5 signatures uncached.")
+    workers = max(1, int(workers or 1))
+    if workers == 1 or len(texts) < 2:
+        results = [_sign_chunk((texts, scheme, num_permutations, engine))]
+    else:
+        chunk_size = chunk_size or max(1, -(-len(texts) // (workers * 4)))
+        tasks = [(texts[start:start + chunk_size], scheme, num_permutations, engine)
+                 for start in range(0, len(texts), chunk_size)]
+        logging.info(f"Signing {len(texts)} documents in {len(tasks)} chunks on {workers} worker processes...")
+        with nullcontext(executor) if executor is not None else ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_sign_chunk, tasks))
+
+    if engine == 'numpy':
+        return np.vstack(results)
+    return [signature for chunk in results for signature in chunk]
+
+
+def stream_signatures(file_path: str, scheme: str, num_permutations: int, engine: str = 'md5', workers: int = 1,
+                      cache=None, chunk_size: int = DEFAULT_CHUNK_SIZE, remove_duplicates=None, keep_text: bool = False,
+                      dedup_bloom: bool = False):
+    """
+    Reads, normalizes, deduplicates and signs a TSV file one chunk at a time. Exact duplicates are
+    found on the normalized texts before any signature is computed.
+
+    Raw texts are dropped as soon as each chunk is signed, so peak memory grows with
+    the signatures rather than with the size of the collection. With several workers, one
+    process pool is started for the whole file and every chunk is signed on it.
+
+    :param file_path: Path to the input TSV file.
+    :param scheme: Shingling scheme, one of SCHEMES.
+    :param num_permutations: Number of hash functions to simulate (i.e., number of permutations).
+    :param engine: Minhash engine, 'md5' or 'numpy'.
+    :param workers: Number of worker processes signing the chunks.
+    :param cache: Optional SignatureCache consulted before computing signatures.
+    :param chunk_size: Documents read and signed per step.
+    :param remove_duplicates: Callable splitting a chunk of normalized documents into (unique, duplicates);
+                              an ExactDuplicateFilter by default.
+    :param keep_text: Keep the normalized text of every unique document.
+    :param dedup_bloom: Give the default ExactDuplicateFilter a ScalableBloomFilter pre-check.
+    :return: Tuple (documents, signatures, duplicates). Documents are dictionaries with 'id', 'ordinal'
+             (position in iter_tsv_no_headers) and, with keep_text, 'text'; duplicates carry 'id' and 'ordinal'.
+    """
+    if remove_duplicates is None:
+        bloom_filter = ScalableBloomFilter(DEDUP_BLOOM_CAPACITY, DEDUP_BLOOM_RATE) if dedup_bloom else None
+        remove_duplicates = ExactDuplicateFilter(normalize=False, bloom_filter=bloom_filter)
+    documents, duplicates, signature_chunks = [], [], []
+    ordinal = 0
+    workers = max(1, int(workers or 1))
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        for chunk in iter_chunks(iter_tsv_no_headers(file_path), chunk_size):
+            for doc in chunk:
+                doc['ordinal'] = ordinal
+                doc['text'] = clean_and_normalize(doc['text'])
+                ordinal += 1
+            unique_docs, chunk_duplicates = remove_duplicates(chunk)
+            duplicates.extend({'id': doc['id'], 'ordinal': doc['ordinal']} for doc in chunk_duplicates)
+            texts = [doc['text'] for doc in unique_docs]
+            signature_chunks.append(compute_signatures(texts, scheme, num_permutations, engine=engine,
+                                                       workers=workers, cache=cache, executor=executor))
+            for doc, text in zip(unique_docs, texts):
+                record = {'id': doc['id'], 'ordinal': doc['ordinal']}
+                if keep_text:
+                    record['text'] = text
+                documents.append(record)
+
+    logging.info(f"Processed {len(documents)} unique documents and found {len(duplicates)} duplicates.")
+    if engine == 'numpy':
+        signatures = np.vstack(signature_chunks) if signature_chunks else np.empty((0, num_permutations), dtype=np.uint64)
+    else:
+        signatures = [signature for chunk in signature_chunks for signature in chunk]
+    return documents, signatures, duplicates
+
+
+def _compute_cached(texts, scheme, num_permutations, workers, chunk_size, cache, executor=None):
+    """
+    Fills the signature matrix from the cache and signs only the missing documents.
+    """
+    keys = [cache.key(text, scheme, num_permutations) for text in texts]
+    found = cache.get_many(list(dict.fromkeys(keys)))
+    missing = list(dict.fromkeys(key for key in keys if key not in found))
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        computed = compute_signatures([text_by_key[key] for key in missing], scheme, num_permutations,
+                                      engine='numpy', workers=workers, chunk_size=chunk_size, executor=executor)
+        cache.put_many(zip(missing, computed))
+        found.update(zip(missing, computed))
+
+    signatures = np.empty((len(texts), num_permutations), dtype=np.uint64)
+    for row, key in enumerate(keys):
+        signatures[row] = found[key]
+    return signatures
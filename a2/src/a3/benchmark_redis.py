@@ -0,0 +1,81 @@
+import time
+import logging
+import argparse
+import threading
+
+import redis
+
+from a3.redis_io import read_documents, write_documents, DEFAULT_BATCH_SIZE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def write_one_by_one(client, key_prefix: str, documents) -> int:
+    """
+    Previous write path: one SET round trip per document.
+    """
+    for doc in documents:
+        client.set(f"{key_prefix}:{doc['id']}", doc['text'])
+    return len(documents)
+
+
+def read_one_by_one(client, key_prefix: str):
+    """
+    Previous read path: a blocking KEYS followed by one GET round trip per key.
+    """
+    return [{'id': key.split(":")[-1], 'text': client.get(key)} for key in client.keys(f"{key_prefix}:*")]
+
+
+def run_benchmark(client, num_docs: int, batch_size: int = DEFAULT_BATCH_SIZE, text_length: int = 200):
+    """
+    Times the per-key and the batched read and write paths on the same client.
+    :param client: Redis client (a fakeredis.FakeRedis stand-in or a real server).
+    :param num_docs: Number of documents written and read back by each path.
+    :param batch_size: Batch size of the SCAN/MGET and pipelined SET paths.
+    :param text_length: Length of every document text.
+    :return: Dictionary mapping each path to its throughput in documents per second.
+    """
+    documents = [{'id': str(i), 'text': f"{i:08d}" + "x" * text_length} for i in range(num_docs)]
+    paths = {
+        'write one-by-one': lambda: write_one_by_one(client, 'bench_single', documents),
+        'write pipelined': lambda: write_documents(client, 'bench_batched', documents, batch_size),
+        'read KEYS+GET': lambda: len(read_one_by_one(client, 'bench_single')),
+        'read SCAN+MGET': lambda: sum(1 for _ in read_documents(client, 'bench_batched', batch_size)),
+    }
+    results = {}
+    for name, path in paths.items():
+        start = time.perf_counter()
+        count = path()
+        results[name] = count / (time.perf_counter() - start)
+        logging.info(f"{name:18s}: {count} documents, {results[name]:,.0f} documents/s")
+    client.delete(*[f"bench_single:{doc['id']}" for doc in documents])
+    client.delete(*[f"bench_batched:{doc['id']}" for doc in documents])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of per-key versus batched Redis document I/O")
+    parser.add_argument("--num-docs", type=int, default=100000, help="Number of documents written and read")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Keys per SCAN/MGET and SETs per pipeline flush")
+    parser.add_argument("--redis-url", default=None, help="Benchmark a real Redis server (e.g. redis://localhost:6379/0) instead of fakeredis")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        run_benchmark(redis.Redis.from_url(args.redis_url, decode_responses=True), args.num_docs, args.batch_size)
+        return
+    # Serve fakeredis over a local TCP socket so every command pays a real round trip
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = redis.Redis(host="127.0.0.1", port=server.server_address[1], decode_responses=True)
+        run_benchmark(client, args.num_docs, args.batch_size)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
+
+# python -m src.a3.benchmark_redis --num-docs 100000
+# python -m src.a3.benchmark_redis --num-docs 100000 --redis-url redis://localhost:6379/0
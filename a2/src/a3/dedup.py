@@ -5,6 +5,11 @@ import time
 import tracemalloc
 import logging
 
+import numpy as np
+
+from a2.minhash import hash_shingles, minhash_numpy
+from a2.shingling import word_shingle_hashes
+
 
 def read_tsv(file_path: str):
     """
@@ -48,11 +53,27 @@ def generate_shingles(document, k=3):
     shingles = [tuple(words[i:i + k]) for i in range(len(words) - k + 1)]
     return shingles
 
+def document_shingles(document, k=3, engine='md5'):
+    """
+    Builds the word k-gram shingles of a document in the representation the minhash engine consumes.
+    :param document: The document text.
+    :param k: Number of words per shingle.
+    :param engine: 'md5' for a list of word tuples, 'numpy' for a uint64 array of shingle hashes.
+    :return: Shingles of the document.
+    """
+    if engine == 'numpy':
+        return word_shingle_hashes(clean_and_normalize(document), k)
+    return generate_shingles(document, k)
+
 def hash_shingle(shingle, seed):
     h = hashlib.md5(str(shingle).encode('utf-8') + str(seed).encode('utf-8'))
     return int(h.hexdigest(), 16)
 
-def generate_minhash_signature(shingles, num_hashes=100):
+def generate_minhash_signature(shingles, num_hashes=100, engine='md5'):
+    if engine == 'numpy':
+        if not isinstance(shingles, np.ndarray):
+            shingles = hash_shingles(shingles)
+        return minhash_numpy(shingles, num_hashes)
     signature = []
     for i in range(num_hashes):
         min_hash = min([hash_shingle(shingle, i) for shingle in shingles])
@@ -145,25 +166,3 @@ def lsh_banding(signatures, num_bands, rows_per_band):
 
     return candidates
 
-# Union-Find, not using networkx
-class UnionFind:
-    def __init__(self, n):
-        self.parent = list(range(n))
-        self.rank = [0] * n
-
-    def find(self, p):
-        if self.parent[p] != p:
-            self.parent[p] = self.find(self.parent[p])
-        return self.parent[p]
-
-    def union(self, p, q):
-        rootP = self.find(p)
-        rootQ = self.find(q)
-        if rootP != rootQ:
-            if self.rank[rootP] > self.rank[rootQ]:
-                self.parent[rootQ] = rootP
-            elif self.rank[rootP] < self.rank[rootQ]:
-                self.parent[rootP] = rootQ
-            else:
-                self.parent[rootQ] = rootP
-                self.rank[rootP] += 1
@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import threading
+
+from a2.lsh_case2 import build_index
+from a2.lsh_index import LSHIndex
+from a3.redis_index import open_or_build
+
+# Dataset states reported by /health
+PENDING, BUILDING, READY, FAILED = 'pending', 'building', 'ready', 'failed'
+
+
+class DatasetNotFound(KeyError):
+    """Raised when a query names a dataset that is not served."""
+
+
+class IndexNotReady(RuntimeError):
+    """Raised when a query reaches a dataset whose index is still warming or failed to build."""
+
+
+class IndexRegistry:
+    """
+    Keeps one LSH index per dataset resident in memory for the lifetime of the service.
+
+    Every `*.tsv` file in data_dir is a dataset. start() loads `<dataset>.lshidx`
+    from index_dir, or builds and saves it when it is missing, stale or written
+    by another format version. This happens on a background thread, so health
+    checks are answered while the indexes warm. Queries then only sign the query text.
+
+    Given a Redis client, the indexes live in Redis instead (see RedisLSHIndex):
+    every worker process of the backend shares them, and each one is built once
+    by whichever worker takes its build lock first.
+    """
+
+    def __init__(self, data_dir: str, index_dir: str = None, num_hashes: int = 300, num_bands: int = 50,
+                 rows_per_band: int = 2, client=None):
+        """
+        :param data_dir: Directory holding the dataset TSV files.
+        :param index_dir: Directory holding the index files; defaults to data_dir.
+        :param num_hashes: Number of minhash permutations of built indexes.
+        :param num_bands: Number of LSH bands of built indexes.
+        :param rows_per_band: Rows per band of built indexes.
+        :param client: Optional Redis client (decode_responses=False) holding shared indexes under 'lshidx:<dataset>'.
+        """
+        self.data_dir = data_dir
+        self.index_dir = index_dir or data_dir
+        self.params = {'num_hashes': num_hashes, 'num_bands': num_bands, 'rows_per_band': rows_per_band}
+        self.client = client
+        self.indexes = {}
+        self.states = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> threading.Thread:
+        """
+        Lists the datasets, then loads or builds every dataset index on a daemon thread.
+        :return: The warming thread.
+        """
+        with self._lock:
+            self.states = {name: PENDING for name in sorted(os.listdir(self.data_dir)) if name.endswith('.tsv')}
+        self._thread = threading.Thread(target=self._warm, name='lsh-index-warmup', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _warm(self) -> None:
+        for name in list(self.states):
+            with self._lock:
+                self.states[name] = BUILDING
+            try:
+                index = self._load_or_build(name)
+            except Exception as e:
+                logging.exception(f"Could not prepare the LSH index of {name}.")
+                with self._lock:
+                    self.states[name], self.errors[name] = FAILED, str(e)
+                continue
+            with self._lock:
+                self.indexes[name] = index
+                self.states[name] = READY
+
+    def _load_or_build(self, name: str) -> LSHIndex:
+        file_path = os.path.join(self.data_dir, name)
+        if self.client is not None:
+            return open_or_build(self.client, f"lshidx:{name}", file_path, **self.params)
+        index_path = os.path.join(self.index_dir, os.path.splitext(name)[0] + '.lshidx')
+        if os.path.exists(index_path):
+            try:
+                index = LSHIndex.load(index_path)
+                stored = {key: index.params[key] for key in self.params}
+                if stored == self.params:
+                    logging.info(f"Loaded LSH index of {name} with {len(index)} documents.")
+                    return index
+                logging.info(f"LSH index of {name} was built with {stored}; rebuilding with {self.params}.")
+            except ValueError as e:
+                logging.info(f"{e} Rebuilding the LSH index of {name}.")
+        return build_index(file_path, index_path, **self.params)
+
+    def health(self) -> dict:
+        """
+        :return: Dictionary with 'status' ('ok' once every dataset is ready, 'warming' or 'degraded' otherwise)
+            and the state of every dataset.
+        """
+        with self._lock:
+            states = dict(self.states)
+            errors = dict(self.errors)
+        if states and all(state == READY for state in states.values()):
+            status = 'ok'
+        elif self._thread is None or any(state in (PENDING, BUILDING) for state in states.values()):
+            status = 'warming'
+        else:
+            status = 'degraded'
+        return {'status': status, 'datasets': states, 'errors': errors}
+
+    def query(self, dataset: str, text: str, limit: int = 10, probes: int = 0) -> dict:
+        """
+        Answers a nearest neighbor query from the resident index of a dataset.
+        :param dataset: Dataset file name, e.g. 'five.tsv'.
+        :param text: Raw query text.
+        :param limit: Maximum number of matches returned.
+        :param probes: Multi-probe budget: extra perturbed buckets looked up.
+        :return: Dictionary with the dataset, the matches (id, text, score; best first) and the query time in ms.
+        """
+        with self._lock:
+            if dataset not in self.states:
+                raise DatasetNotFound(dataset)
+            index, state = self.indexes.get(dataset), self.states[dataset]
+        if index is None:
+            raise IndexNotReady(f"The index of {dataset} is {state}.")
+        start = time.perf_counter()
+        ranked = index.query(text, probes=probes)[:limit]
+        matches = [{'id': index.ids[row], 'text': index.texts[row], 'score': round(score, 4)} for row, score in ranked]
+        return {'dataset': dataset, 'matches': matches, 'took_ms': round(1000 * (time.perf_counter() - start), 3)}
@@ -1,8 +1,8 @@
-import sys
-import csv
-from a3.dedup import clean_and_normalize, generate_minhash_signature, generate_shingles, track_memory_and_time
+from a3.dedup import clean_and_normalize, generate_minhash_signature, track_memory_and_time, document_shingles
 from a3.dedup import lsh_banding
-from a3.dedup import UnionFind
+from a2.lsh_index import LSHIndex
+from a2.dedup import iter_tsv_no_headers, iter_chunks, ExactDuplicateFilter, UnionFind
+from a3.redis_io import get_client, read_documents, write_documents, DEFAULT_BATCH_SIZE
 import logging
 
 # Configure logging
@@ -15,89 +15,80 @@ def read_tsv_no_headers(file_path: str):
     :param file_path: Path to the TSV file.
     :return: List of dictionaries with keys 'id' and 'text'.
     """
-    data = []
-    with open(file_path, mode='r', encoding='utf-8') as file:
-        reader = csv.reader(file, delimiter='\t')
-        for row in reader:
-            if len(row) >= 2:  # Ensure both 'id' and 'text' columns are present
-                data.append({'id': row[0], 'text': row[1]})
-            elif len(row) == 1:  # Handle rows with only text (no id)
-                data.append({'id': str(len(data) + 1), 'text': row[0]})  # Assign auto-generated id
-    return data
-
-def read_from_redis(redis_key_prefix: str):
+    return list(iter_tsv_no_headers(file_path))
+
+def read_from_redis(redis_key_prefix: str, client=None, batch_size: int = DEFAULT_BATCH_SIZE):
     """
     Reads data from Redis and generates a list of documents.
+    Keys are walked with SCAN and fetched with one MGET per batch.
     :param redis_key_prefix: Redis key prefix used to filter related data.
+    :param client: Redis client; defaults to the shared connection pool.
+    :param batch_size: Number of keys fetched per round trip.
     :return: List of dictionaries with keys 'id' and 'text'.
     """
-    data = []
-    for key in r.keys(f"{redis_key_prefix}:*"):  # Filter keys starting with the prefix
-        value = r.get(key)
-        doc_id = key.split(":")[-1]  # Extract the unique ID from the key
-        data.append({'id': doc_id, 'text': value})
-    return data
+    return list(read_documents(client or r, redis_key_prefix, batch_size))
 
 
 def remove_exact_duplicates(documents):
     """
-    Removes exact duplicate documents from the collection.
+    Removes exact duplicate documents from the collection, ignoring case, punctuation and spacing.
     :param documents: List of documents.
     :return: Deduplicated list of documents.
     """
-    unique_docs = {}
-    duplicates = []
-
-    for doc in documents:
-        if doc['text'] not in unique_docs:
-            unique_docs[doc['text']] = doc
-        else:
-            duplicates.append(doc)
+    unique_docs, duplicates = ExactDuplicateFilter()(documents)
 
-    print(f"Processed {len(unique_docs)} unique documents and found {len(duplicates)} duplicates.")  # Debugging
-    return list(unique_docs.values()), duplicates
+    logging.info(f"Processed {len(unique_docs)} unique documents and found {len(duplicates)} duplicates.")
+    return unique_docs, duplicates
 
 @track_memory_and_time
-def nearest_neighbor_search(file_path=None, redis_key_prefix=None, query=None, num_hashes=300, num_bands=50, rows_per_band=2):
+def nearest_neighbor_search(file_path=None, redis_key_prefix=None, query=None, num_hashes=300, num_bands=50, rows_per_band=2, engine='md5', index_path=None):
+    # A prebuilt index (python -m a2.cli build-index) answers the query without re-signing the collection
+    if index_path:
+        logging.info("Querying prebuilt LSH index...")
+        index = LSHIndex.load(index_path)
+        matches = index.query(query)
+        if not matches:
+            logging.info('There is no similarity between query and documents.')
+            return
+        best_row = matches[0][0]
+        logging.info(f"Best match for the query from {index.ids[best_row]}")
+        logging.info(index.texts[best_row])
+        return index.texts[best_row]
+
     # Step 1: Read the documents without headers
     if file_path:
         logging.info("Reading documents from file...")
-        documents = read_tsv_no_headers(file_path)
+        documents = iter_tsv_no_headers(file_path)
     elif redis_key_prefix:
         logging.info("Reading documents from Redis...")
         documents = read_from_redis(redis_key_prefix)
     else:
-        raise ValueError("Either file_path or redis_key_prefix must be provided.")
+        raise ValueError("Either file_path, redis_key_prefix or index_path must be provided.")
 
-    # Step 2: Remove exact duplicates
-    unique_docs, removed_duplicates = remove_exact_duplicates(documents)
-    logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
-
-    # Step 3: Clean and normalize documents
-    for doc in unique_docs:
-        doc['text'] = clean_and_normalize(doc['text'])
-    
-
-    # Step 4: Compute Minhash signatures for each document
+    # Steps 2-4: In chunks, clean and normalize documents, remove exact duplicates of the normalized text,
+    # and compute Minhash signatures (shingles are dropped once a document is signed)
     logging.info("\nGenerating shingles and computing Minhash signatures...")
-    for doc in unique_docs:
-        doc['shingle'] = generate_shingles(doc['text'])
-        doc['minhash'] = generate_minhash_signature(doc['shingle'], num_hashes)
-        # print(f"Document {doc['id']} shingles: {shingles}")
-        # print(f"Document {doc['id']} MinHash: {doc['minhash']}")
-
-
+    remove_duplicates = ExactDuplicateFilter(normalize=False)
+    unique_docs, removed_duplicates, signatures = [], [], []
+    for chunk in iter_chunks(documents):
+        for doc in chunk:
+            doc['text'] = clean_and_normalize(doc['text'])
+        chunk_docs, chunk_duplicates = remove_duplicates(chunk)
+        removed_duplicates.extend(chunk_duplicates)
+        for doc in chunk_docs:
+            signatures.append(generate_minhash_signature(document_shingles(doc['text'], engine=engine), num_hashes, engine=engine))
+            unique_docs.append(doc)
+    logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
 
     # Step 5: LSH banding to find candidate pairs
     logging.info("\nFinding candidate pairs with LSH banding...")
-    signatures = [doc['minhash'] for doc in unique_docs]
     # candidates = lsh_banding(signatures, num_bands, rows_per_band)
 
     # Step 6: Process the query
     logging.info("\nProcessing the query...")
     query_cleaned = clean_and_normalize(query)
-    query_shingle = generate_shingles(query_cleaned)
-    query_signature = generate_minhash_signature(query_shingle, num_hashes)
+    query_shingle = document_shingles(query_cleaned, engine=engine)
+    query_signature = generate_minhash_signature(query_shingle, num_hashes, engine=engine)
 
     query_candidates = lsh_banding(signatures + [query_signature], num_bands, rows_per_band)
     logging.info(f"Query candidates after LSH: {query_candidates}")
@@ -105,21 +96,21 @@ def nearest_neighbor_search(file_path=None, redis_key_prefix=None, query=None, n
     # Step 6: Cluster candidate documents using Union-Find
     # print("\nClustering documents using Union-Find...")
     uf = UnionFind(len(unique_docs) + 1)
-    for doc1, doc2 in query_candidates:
-        uf.union(doc1, doc2)
+    uf.union_many(query_candidates)
+    labels = uf.components()
 
     # make sure query and document are in the same cluster
     find = False 
     query_doc_id = len(unique_docs)  # The ID of the Query document can be set to the length of the document list
     for doc_id in range(len(unique_docs)):  # iterate ID
-        if uf.find(doc_id) == uf.find(query_doc_id):  # make sure query and document are in the same cluster
+        if labels[doc_id] == labels[query_doc_id]:  # make sure query and document are in the same cluster
             #print(f"Document {doc_id} belongs to the same cluster as the query")
             logging.info(f"Best match for the query from {doc_id}")
             logging.info(unique_docs[doc_id]['text'])
             find = True
             return unique_docs[doc_id]['text']
     if not find:
-        logging.info(f'There is no similarity between query and documents.')
+        logging.info('There is no similarity between query and documents.')
         return 
 
     # with open(output_path, 'w') as f:
@@ -130,20 +121,18 @@ def nearest_neighbor_search(file_path=None, redis_key_prefix=None, query=None, n
     #             f.write(dup['id'] + "\n")
     # write_to_redis("cluster_results", unique_docs)
 
-import redis
-
-r = redis.Redis(host="lsh-redis-data", port=6379, db=0)
+r = get_client()
 
-def write_to_redis(cluster_key: str, documents):
+def write_to_redis(cluster_key: str, documents, client=None, batch_size: int = DEFAULT_BATCH_SIZE):
     """
-    Writes clustering results to Redis.
+    Writes clustering results to Redis with pipelined SETs.
     :param cluster_key: Redis key prefix used to identify the result set.
     :param documents: Collection of documents to be stored.
+    :param client: Redis client; defaults to the shared connection pool.
+    :param batch_size: Number of SET commands sent per round trip.
+    :return: Number of documents written.
     """
-    for doc in documents:
-        redis_key = f"{cluster_key}:{doc['id']}"
-        print(f"Saving to Redis: {redis_key} -> {doc['text']}")
-        r.set(redis_key, doc['text'])
+    return write_documents(client or r, cluster_key, documents, batch_size)
 
 
 if __name__ == '__main__':
@@ -177,10 +166,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Nearest Neighbor Search using LSH.")
     parser.add_argument("--file", help="Input file path (TSV format).")
     parser.add_argument("--redis_prefix", help="Redis key prefix for input data.")
+    parser.add_argument("--index", help="Prebuilt LSH index file (see a2.cli build-index).")
     parser.add_argument("--query", help="Query text to find nearest neighbor.")
     parser.add_argument("--hashes", type=int, default=300, help="Number of MinHash signatures.")
     parser.add_argument("--bands", type=int, default=50, help="Number of bands for LSH.")
     parser.add_argument("--rows", type=int, default=2, help="Rows per band for LSH.")
+    parser.add_argument("--engine", choices=['md5', 'numpy'], default='md5', help="Minhash engine.")
 
     args = parser.parse_args()
 
@@ -191,4 +182,6 @@ if __name__ == '__main__':
         num_hashes=args.hashes,
         num_bands=args.bands,
         rows_per_band=args.rows,
+        engine=args.engine,
+        index_path=args.index,
     )
\ No newline at end of file
@@ -1,29 +1,54 @@
 # brew services start redis
-import redis
-from flask import Flask, request, render_template_string
-from lsh import nearest_neighbor_search
+import os
+from flask import Flask, request, render_template_string, jsonify
+from index_service import IndexRegistry, DatasetNotFound, IndexNotReady
+from a3.redis_io import get_client
 
-r = redis.Redis(host="lsh-redis-data", port=6379, db=0)
+r = get_client()
 app = Flask(__name__)
 
+# One LSH index per dataset stays resident; it is loaded or built in the background at startup
+DATA_DIR = os.environ.get("LSH_DATA_DIR", "/app/src/a3/data")
+# With LSH_INDEX_BACKEND=redis the indexes live in Redis and are shared by every worker process
+index_client = get_client(decode_responses=False) if os.environ.get("LSH_INDEX_BACKEND") == "redis" else None
+registry = IndexRegistry(DATA_DIR, os.environ.get("LSH_INDEX_DIR"), num_hashes=300, num_bands=50, rows_per_band=2,
+                         client=index_client)
+
 # the output got printed on http://127.0.0.1:5001
 
 
+@app.route("/health", methods=["GET"])
+def health():
+    # Answers while the indexes warm; status becomes "ok" once every dataset is queryable
+    return jsonify(registry.health())
+
+
+@app.route("/query", methods=["POST"])
+def query():
+    payload = request.get_json(silent=True) or {}
+    if not payload.get("dataset") or not payload.get("query"):
+        return jsonify({"error": "Both 'dataset' and 'query' are required."}), 400
+    try:
+        limit, probes = int(payload.get("limit", 10)), int(payload.get("probes", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'limit' and 'probes' must be integers."}), 400
+    try:
+        return jsonify(registry.query(payload["dataset"], payload["query"], limit=limit, probes=probes))
+    except DatasetNotFound:
+        return jsonify({"error": f"Unknown dataset {payload['dataset']}."}), 404
+    except IndexNotReady as e:
+        return jsonify({"error": str(e)}), 503
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST" and "query" in request.form:
         try:
             query_text = request.form["query"]
             filename = request.form["filename"]
-            # Call nearest neighbor search METHOD
-            result = nearest_neighbor_search(
-                file_path=f"/app/src/a3/data/{filename}",
-                redis_key_prefix=filename,
-                query=query_text,
-                num_hashes=300,
-                num_bands=50,
-                rows_per_band=2,
-            )
+            # Ask the resident index of the dataset for the best match
+            matches = registry.query(filename, query_text, limit=1)["matches"]
+            result = matches[0]["text"] if matches else None
             # stored_data = []
             # keys = r.keys(f"{filename}:*")
             # if not keys:
@@ -45,7 +70,9 @@ def index():
                 """,
                 result=result,
             )
-        except FileNotFoundError:
+        except IndexNotReady as e:
+            return f'<h1 style="font-size: 36px; color: red; margin-bottom: 20px;">{str(e)} Please try again shortly.</h1>'
+        except DatasetNotFound:
             return """
                 <div style="display: flex; flex-direction: column; justify-content: center; align-items: center; height: 100vh; text-align: center; position: relative;">
                     <h1 style="font-size: 36px; color: red;">File not found. Please make sure the file exists in the data directory.</h1>
@@ -76,6 +103,7 @@ def index():
 
 
 if __name__ == "__main__":
+    registry.start()
     app.run(host="0.0.0.0", port=5001)  # Makes the server accessible externally
 
 #  * Running on all addresses (0.0.0.0)
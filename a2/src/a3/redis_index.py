@@ -0,0 +1,334 @@
+import json
+import time
+import uuid
+import logging
+import threading
+
+import numpy as np
+
+from a2.lsh_index import LSHIndex, source_fingerprint
+from a2.minhash import band_keys
+from a2.signatures import compute_signatures, stream_signatures
+from a3.redis_io import DEFAULT_BATCH_SIZE, iter_key_batches
+
+# Key layout under one prefix (e.g. 'lshidx:five.tsv'):
+#   <prefix>:meta                hash: params (JSON), source fingerprint (JSON), num_docs (row allocator), ready flag
+#   <prefix>:sig                 hash: row -> packed little-endian uint64 signature
+#   <prefix>:ids / :texts        hash: row -> document id / normalized text
+#   <prefix>:rows                hash: document id -> row
+#   <prefix>:b:<band>:<key hex>  set of rows in one band bucket
+#   <prefix>:build               build lock holding the token of the one worker building the index
+
+# Delete or extend the build lock only while it still holds the caller's token
+_RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+_EXTEND_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class _RedisRows:
+    """
+    Read-only row accessor over one Redis hash, fetching many rows with a single HMGET.
+    """
+
+    def __init__(self, index, field: str, decode):
+        self.index = index
+        self.key = f"{index.prefix}:{field}"
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, rows):
+        if np.ndim(rows) == 0:
+            return self.decode([self.index.client.hget(self.key, int(rows))])[0]
+        rows = [int(row) for row in np.asarray(rows).ravel()]
+        values = []
+        for start in range(0, len(rows), DEFAULT_BATCH_SIZE):
+            values.extend(self.index.client.hmget(self.key, rows[start:start + DEFAULT_BATCH_SIZE]))
+        return self.decode(values)
+
+
+class _BuildLock:
+    """
+    Redis lock owned through a random token and extended by a heartbeat thread while it is held.
+
+    A builder that stalls past the timeout loses the lock to the next worker; its
+    release then finds another token and leaves the new owner's lock in place.
+    """
+
+    def __init__(self, client, key: str, timeout: float):
+        """
+        :param client: Redis client.
+        :param key: Key of the lock.
+        :param timeout: Seconds after which the lock expires unless extended.
+        """
+        self.client = client
+        self.key = key
+        self.timeout_ms = max(1, int(timeout * 1000))
+        self.token = uuid.uuid4().hex
+        self._release = client.register_script(_RELEASE_LOCK)
+        self._extend = client.register_script(_EXTEND_LOCK)
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def acquire(self) -> bool:
+        """
+        Takes the lock if it is free and starts extending it every third of the timeout.
+        :return: True if the lock was taken.
+        """
+        if not self.client.set(self.key, self.token, nx=True, px=self.timeout_ms):
+            return False
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._keep_alive, name='lsh-build-lock', daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _keep_alive(self) -> None:
+        while not self._stop.wait(self.timeout_ms / 3000):
+            if not self._extend(keys=[self.key], args=[self.token, self.timeout_ms]):
+                logging.warning(f"Lost the build lock {self.key} to another worker.")
+                return
+
+    def release(self) -> None:
+        """
+        Stops extending the lock and deletes it if it still holds this lock's token.
+        """
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        self._release(keys=[self.key], args=[self.token])
+
+
+class RedisLSHIndex(LSHIndex):
+    """
+    LSH index whose signatures, documents and band buckets live in Redis, shared by every worker.
+
+    It answers the same calls as the in-memory LSHIndex (candidates, query, top_k,
+    row_of, ids[row], texts[row], signatures[rows]). Each query is one pipelined
+    round trip for all of its bucket lookups plus one HMGET for the candidates'
+    packed signatures. Any worker may add documents: rows are allocated atomically
+    with HINCRBY, and a document's signature and text are written before its buckets,
+    so readers never see a candidate row without data.
+    """
+
+    def __init__(self, client, prefix: str, params: dict, source=None):
+        """
+        :param client: Redis client created with decode_responses=False (signatures are binary).
+        :param prefix: Key prefix of this index.
+        :param params: num_hashes, num_bands, rows_per_band, scheme and engine.
+        :param source: Fingerprint of the TSV file the index was built from (see source_fingerprint).
+        """
+        self.client = client
+        self.prefix = prefix
+        self.params = params
+        self.source = source or {}
+        self.signatures = _RedisRows(self, 'sig', self._unpack_signatures)
+        self.ids = _RedisRows(self, 'ids', lambda values: [_decode(value) for value in values])
+        self.texts = _RedisRows(self, 'texts', lambda values: [_decode(value) for value in values])
+
+    @classmethod
+    def create(cls, client, prefix: str, num_hashes=300, num_bands=50, rows_per_band=2):
+        """
+        Opens the index under prefix, creating it when empty.
+        :param client: Redis client created with decode_responses=False.
+        :param prefix: Key prefix of this index.
+        :param num_hashes: Number of minhash permutations.
+        :param num_bands: Number of LSH bands.
+        :param rows_per_band: Rows per band.
+        :return: RedisLSHIndex; ValueError if the stored index has other parameters.
+        """
+        params = {'num_hashes': num_hashes, 'num_bands': num_bands, 'rows_per_band': rows_per_band,
+                  'scheme': 'word_shingle', 'engine': 'numpy'}
+        client.hsetnx(f"{prefix}:meta", 'params', json.dumps(params, sort_keys=True))
+        index = cls.open(client, prefix)
+        if index.params != params:
+            raise ValueError(f"Redis index {prefix} was built with {index.params}; cannot open it with {params}.")
+        return index
+
+    @classmethod
+    def open(cls, client, prefix: str):
+        """
+        Opens an existing index.
+        :param client: Redis client created with decode_responses=False.
+        :param prefix: Key prefix of this index.
+        :return: RedisLSHIndex; ValueError if nothing is stored under prefix.
+        """
+        stored, source = client.hmget(f"{prefix}:meta", ['params', 'source'])
+        if stored is None:
+            raise ValueError(f"No LSH index stored in Redis under {prefix}.")
+        return cls(client, prefix, json.loads(_decode(stored)), json.loads(_decode(source)) if source else None)
+
+    def __len__(self):
+        return int(self.client.hget(f"{self.prefix}:meta", 'num_docs') or 0)
+
+    def _unpack_signatures(self, values):
+        num_hashes = self.params['num_hashes']
+        return np.frombuffer(b''.join(values), dtype='<u8').astype(np.uint64).reshape(len(values), num_hashes)
+
+    def _bucket(self, band: int, key) -> str:
+        return f"{self.prefix}:b:{band}:{int(key):016x}"
+
+    def is_ready(self) -> bool:
+        """
+        :return: True once a complete build was marked with mark_ready.
+        """
+        return self.client.hget(f"{self.prefix}:meta", 'ready') == b'1'
+
+    def mark_ready(self) -> None:
+        self.client.hset(f"{self.prefix}:meta", 'ready', 1)
+
+    def set_source(self, source: dict) -> None:
+        """
+        Records the fingerprint of the source file, against which is_stale compares it.
+        :param source: Fingerprint from source_fingerprint.
+        """
+        self.client.hset(f"{self.prefix}:meta", 'source', json.dumps(source, sort_keys=True))
+        self.source = source
+
+    def add_documents(self, documents, signatures=None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Adds unique, normalized documents, pipelining the writes in batches.
+        A document whose id is already in the index replaces the stored one and keeps its row.
+        :param documents: List of dictionaries with 'id' and normalized 'text'.
+        :param signatures: Precomputed (num_docs, num_hashes) uint64 signatures, if already signed.
+        :param batch_size: Number of documents written per pipeline round trip.
+        :return: Array of the rows assigned to the documents.
+        """
+        ids = [doc['id'] for doc in documents]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Document ids must be unique within a batch.")
+        if signatures is None:
+            signatures = compute_signatures([doc['text'] for doc in documents], self.params['scheme'],
+                                            self.params['num_hashes'], engine='numpy')
+        signatures = np.asarray(signatures, dtype='<u8')
+        existing = []
+        for start in range(0, len(ids), batch_size):
+            existing.extend(self.client.hmget(f"{self.prefix}:rows", ids[start:start + batch_size]))
+        replaced = [int(row) for row in existing if row is not None]
+        if replaced:
+            # Replaced rows leave the buckets of their old signatures before the new ones are added
+            old_keys = band_keys(self.signatures[replaced], self.params['num_bands'], self.params['rows_per_band'])
+            for start in range(0, len(replaced), batch_size):
+                pipe = self.client.pipeline(transaction=False)
+                for row, keys in zip(replaced[start:start + batch_size], old_keys[start:start + batch_size]):
+                    for band, key in enumerate(keys):
+                        pipe.srem(self._bucket(band, key), row)
+                pipe.execute()
+        end = self.client.hincrby(f"{self.prefix}:meta", 'num_docs', len(documents) - len(replaced))
+        fresh = iter(range(end - len(documents) + len(replaced), end))
+        rows = np.array([int(row) if row is not None else next(fresh) for row in existing], dtype=np.int64)
+        keys = band_keys(signatures, self.params['num_bands'], self.params['rows_per_band'])
+
+        for start in range(0, len(documents), batch_size):
+            pipe = self.client.pipeline(transaction=False)
+            for offset in range(start, min(start + batch_size, len(documents))):
+                row, doc = int(rows[offset]), documents[offset]
+                pipe.hset(f"{self.prefix}:sig", row, signatures[offset].tobytes())
+                pipe.hset(f"{self.prefix}:ids", row, doc['id'])
+                pipe.hset(f"{self.prefix}:texts", row, doc['text'])
+                pipe.hset(f"{self.prefix}:rows", doc['id'], row)
+            for offset in range(start, min(start + batch_size, len(documents))):
+                for band, key in enumerate(keys[offset]):
+                    pipe.sadd(self._bucket(band, key), int(rows[offset]))
+            pipe.execute()
+        logging.info(f"Added {len(documents)} documents to the Redis LSH index {self.prefix} ({len(replaced)} replaced).")
+        return rows
+
+    def candidates(self, signature, runner_up=None, probes: int = 0) -> np.ndarray:
+        """
+        Finds the rows sharing at least one band bucket with the signature, in one pipelined round trip.
+        :param signature: uint64 signature row.
+        :param runner_up: uint64 runner-up row (see sign_with_runner_up), required for probes.
+        :param probes: Probe budget: number of extra perturbed buckets looked up, most likely first.
+        :return: Sorted array of candidate rows.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for band, key in self.bucket_lookups(signature, runner_up, probes):
+            pipe.smembers(self._bucket(band, key))
+        rows = {int(row) for members in pipe.execute() for row in members}
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def row_of(self, doc_id: str) -> int:
+        """
+        Looks up the row of a document id.
+        :param doc_id: Document id.
+        :return: Row of the document.
+        """
+        row = self.client.hget(f"{self.prefix}:rows", doc_id)
+        if row is None:
+            raise ValueError(f"Document {doc_id} is not in the LSH index.")
+        return int(row)
+
+
+def open_or_build(client, prefix: str, file_path: str, num_hashes=300, num_bands=50, rows_per_band=2,
+                  lock_timeout: int = 600, poll_interval: float = 0.5) -> RedisLSHIndex:
+    """
+    Returns the shared index of a dataset, building it at most once across all workers.
+    The worker that takes the build lock signs and uploads the dataset, extending the lock
+    while it builds; the others wait for the ready flag, and take over if the builder dies
+    and the lock expires. A ready index whose source file changed is rebuilt the same way.
+    :param client: Redis client created with decode_responses=False.
+    :param prefix: Key prefix of the index, e.g. 'lshidx:five.tsv'.
+    :param file_path: Path to the dataset TSV file.
+    :param num_hashes: Number of minhash permutations.
+    :param num_bands: Number of LSH bands.
+    :param rows_per_band: Rows per band.
+    :param lock_timeout: Seconds after which a build lock that is no longer extended expires.
+    :param poll_interval: Seconds between checks of the ready flag while another worker builds.
+    :return: Ready RedisLSHIndex.
+    """
+    lock = _BuildLock(client, f"{prefix}:build", lock_timeout)
+    reported_stale = False
+    while True:
+        index = _open_current(client, prefix, num_hashes, num_bands, rows_per_band)
+        if index is not None:
+            return index
+        if not reported_stale and client.hget(f"{prefix}:meta", 'ready') == b'1':
+            logging.info(f"Source of the Redis LSH index {prefix} changed since it was built; rebuilding it.")
+            reported_stale = True
+        if lock.acquire():
+            break
+        time.sleep(poll_interval)
+
+    try:
+        # Another worker may have finished a build between the check and the lock
+        index = _open_current(client, prefix, num_hashes, num_bands, rows_per_band)
+        if index is not None:
+            return index
+        # A partial or stale index is dropped before rebuilding
+        lock_key = lock.key.encode('utf-8')
+        for keys in iter_key_batches(client, f"{prefix}:*"):
+            stale = [key for key in keys if key != lock_key]
+            if stale:
+                client.delete(*stale)
+        logging.info(f"Building Redis LSH index {prefix} for {file_path}...")
+        # Fingerprinted first, so a file changed during the build reads as stale
+        source = source_fingerprint(file_path)
+        unique_docs, signatures, removed_duplicates = stream_signatures(
+            file_path, 'word_shingle', num_hashes, engine='numpy', keep_text=True)
+        logging.info(f"Removed {len(removed_duplicates)} exact duplicates.")
+        index = RedisLSHIndex.create(client, prefix, num_hashes, num_bands, rows_per_band)
+        index.add_documents(unique_docs, signatures)
+        index.set_source(source)
+        index.mark_ready()
+        return index
+    finally:
+        lock.release()
+
+
+def _open_current(client, prefix: str, num_hashes, num_bands, rows_per_band):
+    """
+    Opens the index under prefix if it is ready and its source file is unchanged.
+    :return: RedisLSHIndex, or None if the index must be (re)built or is being built.
+    """
+    if client.hget(f"{prefix}:meta", 'ready') != b'1':
+        return None
+    index = RedisLSHIndex.create(client, prefix, num_hashes, num_bands, rows_per_band)
+    if index.is_stale():
+        return None
+    logging.info(f"Opened Redis LSH index {prefix} with {len(index)} documents.")
+    return index
@@ -0,0 +1,85 @@
+import os
+import logging
+
+import redis
+
+# Connection settings of the Redis container (see save_lsh_data_docker.sh)
+REDIS_HOST = os.environ.get("REDIS_HOST", "lsh-redis-data")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+# Keys per SCAN step, per MGET and per pipeline flush
+DEFAULT_BATCH_SIZE = 1000
+
+_pools = {}
+
+
+def get_client(host: str = REDIS_HOST, port: int = REDIS_PORT, db: int = 0, decode_responses: bool = True) -> redis.Redis:
+    """
+    Returns a Redis client backed by one connection pool shared across the process.
+    Connections are opened lazily, so creating the client does not contact the server.
+    :param host: Redis host.
+    :param port: Redis port.
+    :param db: Redis database number.
+    :param decode_responses: Decode responses to str; binary payloads such as packed signatures need False.
+    :return: redis.Redis client.
+    """
+    key = (host, port, db, decode_responses)
+    if key not in _pools:
+        _pools[key] = redis.ConnectionPool(host=host, port=port, db=db, decode_responses=decode_responses)
+    return redis.Redis(connection_pool=_pools[key])
+
+
+def iter_key_batches(client, pattern: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Walks the keyspace with cursor-based SCAN instead of the blocking KEYS command.
+    :param client: Redis client.
+    :param pattern: Glob pattern of the keys, e.g. 'five.tsv:*'.
+    :param batch_size: SCAN COUNT hint and size of the yielded batches.
+    :return: Generator of lists of at most batch_size keys.
+    """
+    batch = []
+    for key in client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_documents(client, key_prefix: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Reads every document stored under a key prefix, one MGET per batch of scanned keys.
+    :param client: Redis client.
+    :param key_prefix: Key prefix; documents are stored as '<prefix>:<id>'.
+    :param batch_size: Number of keys fetched per round trip.
+    :return: Generator of dictionaries with keys 'id' and 'text'.
+    """
+    for keys in iter_key_batches(client, f"{key_prefix}:*", batch_size):
+        for key, value in zip(keys, client.mget(keys)):
+            # A key can expire between SCAN and MGET
+            if value is None:
+                continue
+            if isinstance(key, bytes):
+                key, value = key.decode('utf-8'), value.decode('utf-8')
+            yield {'id': key.split(":")[-1], 'text': value}
+
+
+def write_documents(client, key_prefix: str, documents, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Stores documents as '<prefix>:<id>' keys with a non-transactional pipeline flushed every batch_size SETs.
+    :param client: Redis client.
+    :param key_prefix: Key prefix of the result set.
+    :param documents: Iterable of dictionaries with keys 'id' and 'text'.
+    :param batch_size: Number of SET commands sent per round trip.
+    :return: Number of documents written.
+    """
+    written = 0
+    pipe = client.pipeline(transaction=False)
+    for doc in documents:
+        pipe.set(f"{key_prefix}:{doc['id']}", doc['text'])
+        written += 1
+        if written % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    logging.info(f"Saved {written} documents to Redis under {key_prefix}:*.")
+    return written
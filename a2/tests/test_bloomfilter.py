@@ -1,11 +1,20 @@
 # The test file for Bloom Filters
 import pytest
-from a2.bloomfilter1 import BloomFilter # type: ignore
-from a2.bloomfilter3 import StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter
+from a2.bloomfilter1 import BloomFilter, ScalableBloomFilter, CountingBloomFilter, SharedBloomFilter, MAX_COUNT # type: ignore
+from a2.bloomfilter1 import build_sharded as build_sharded1
+from a2.bloomfilter3 import StandardBloomFilter, ChunkedBloomFilter, ImprovedBloomFilter, BlockedBloomFilter, load_filter
+from a2.bloomfilter3 import build_sharded as build_sharded3
+from a2.cuckoofilter import CuckooFilter
+from a2.bloomfilter3_cli import load_any_filter
+from a2.bloomfilter1_cli import main as bloomfilter1_main
+from a2.bloom_io import iter_line_chunks
 import math
+import numpy as np
 import zipfile
 import random
 import time
+import sys
+import logging
 
 def test_example():
     """test task ensure the test file exist
@@ -121,6 +130,478 @@ def test_bloomF_withText_5():
     
     assert results == expected_outputs, f"Expected {len(expected_outputs)} findings, but found {len(results)}"
 
+def test_bloomF_shingle_hashes():
+    """testing batch insert and query of shingle hash arrays
+    """
+    from a2.shingling import word_shingle_hashes
+    bf = BloomFilter(10**5, 0.01)
+    inserted = word_shingle_hashes("two cherry pumpkin tarts and cherry garcia ice cream", 4)
+    bf.insert_hashes(inserted)
+    assert bf.query_hashes(inserted).all()
+    assert not bf.query_hashes(word_shingle_hashes("cheeseburgers in paradise tonight please", 4)).any()
+    assert bf.query_txt("TWO CHERRY PUMPKIN TARTS AND CHERRY")
+    assert not bf.query_txt("TWO CHERRY PUMPKIN PIES")
+
+def test_bloomF_batch_matches_single():
+    """testing insert_many/query_many set and test the same bits as insert/query
+    """
+    items = [f"item {i}" for i in range(500)]
+    single, batched = BloomFilter(10**4, 0.01), BloomFilter(10**4, 0.01)
+    for item in items:
+        single.insert(item)
+    batched.insert_many(items)
+    assert single.bit_array == batched.bit_array
+    queries = items[::10] + [f"absent {i}" for i in range(500)]
+    assert list(batched.query_many(queries)) == [single.query(item) for item in queries]
+    assert batched.query_many([]).size == 0
+
+def test_bloomF_txt_batch_matches_single():
+    """testing insert_txt_many/query_txt_many against insert_txt/query_txt, including documents without shingles
+    """
+    with open('./tests/five.tsv', 'r') as file:
+        documents = [line.strip() for line in file.read().strip().splitlines()]
+    single, batched = BloomFilter(10**5, 0.01), BloomFilter(10**5, 0.01)
+    for document in documents:
+        single.insert_txt(document)
+    batched.insert_txt_many(documents)
+    assert single.bit_array == batched.bit_array
+    queries = ["TWO CHERRY PUMPKIN TARTS", "CHEESEBURGERS IN PARADISE", "THE RAIN STOPPED SUDDENLY TODAY", ""]
+    assert list(batched.query_txt_many(queries)) == [single.query_txt(query) for query in queries]
+
+@pytest.mark.parametrize("make_filter", [
+    lambda: StandardBloomFilter(2000, 3),
+    lambda: ChunkedBloomFilter(2000, 5, 3),
+    lambda: ImprovedBloomFilter(2000, 3),
+    lambda: ImprovedBloomFilter(2000, 3, method='kirsch-mitzenmacher'),
+    lambda: BlockedBloomFilter(2000, 7),
+])
+def test_bloomfilter3_batch_matches_single(make_filter):
+    """testing add_many/check_many set and test the same bits as add/check
+    """
+    items = [f"item {i}" for i in range(200)]
+    single, batched = make_filter(), make_filter()
+    for item in items:
+        single.add(item)
+    batched.add_many(items)
+    assert single.bits == batched.bits
+    queries = items[::5] + [f"absent {i}" for i in range(200)]
+    assert list(batched.check_many(queries)) == [single.check(item) for item in queries]
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_bloomF_save_load(tmp_path, mmap):
+    """testing a saved and reloaded Bloom Filter answers like the original and keeps its parameters
+    """
+    items = [f"item {i}" for i in range(300)]
+    bf = BloomFilter(10**4, 0.01)
+    bf.insert_many(items)
+    bf.save(tmp_path / "filter.bloom")
+    loaded = BloomFilter.load(tmp_path / "filter.bloom", mmap=mmap)
+    assert (loaded.n, loaded.f, loaded.m, loaded.k, loaded.num_items) == (bf.n, bf.f, bf.m, bf.k, 300)
+    queries = items + [f"absent {i}" for i in range(300)]
+    assert list(loaded.query_many(queries)) == list(bf.query_many(queries))
+    # inserts after loading stay in memory and never reach the file
+    loaded.insert("added later")
+    assert loaded.query("added later")
+    assert not BloomFilter.load(tmp_path / "filter.bloom", mmap=mmap).query("added later")
+    with pytest.raises(ValueError):
+        StandardBloomFilter.load(tmp_path / "filter.bloom")
+
+@pytest.mark.parametrize("make_filter", [
+    lambda: StandardBloomFilter(2000, 3),
+    lambda: ChunkedBloomFilter(2000, 5, 3),
+    lambda: ImprovedBloomFilter(2000, 3, method='kirsch-mitzenmacher'),
+    lambda: BlockedBloomFilter(2000, 7),
+])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_bloomfilter3_save_load(tmp_path, make_filter, mmap):
+    """testing load_filter restores any bloomfilter3 filter from its saved header
+    """
+    items = [f"item {i}" for i in range(100)]
+    bf = make_filter()
+    bf.add_many(items)
+    bf.save(tmp_path / "filter.bloom")
+    loaded = load_filter(tmp_path / "filter.bloom", mmap=mmap)
+    assert type(loaded) is type(bf)
+    assert loaded.num_items == 100
+    queries = items + [f"absent {i}" for i in range(100)]
+    assert list(loaded.check_many(queries)) == list(bf.check_many(queries))
+
+def test_mmap_loaded_filter_saved_over_its_own_file(tmp_path):
+    """testing a filter mapped from its file can take more items and be saved back to the same path
+    """
+    items = [f"item {i}" for i in range(300)]
+    path = tmp_path / "filter.bloom"
+    bf = BloomFilter(10**4, 0.01)
+    bf.insert_many(items[:150])
+    bf.save(path)
+    loaded = BloomFilter.load(path, mmap=True)
+    loaded.insert_many(items[150:])
+    loaded.save(path)
+    # the saved-over filter still reads its mapped pages
+    assert loaded.query_many(items).all()
+    reloaded = BloomFilter.load(path, mmap=True)
+    assert reloaded.num_items == 300 and reloaded.query_many(items).all()
+
+    sf = StandardBloomFilter(2000, 3)
+    sf.add_many(items[:150])
+    sf.save(path)
+    loaded = load_filter(path, mmap=True)
+    loaded.add_many(items[150:])
+    loaded.save(path)
+    assert loaded.check_many(items).all()
+    assert load_filter(path, mmap=True).check_many(items).all()
+
+def test_blocked_bloomF_one_block_per_item():
+    """testing every item sets all its bits inside one 512-bit block and the false positive rate stays near the target
+    """
+    bf = BlockedBloomFilter(2000, 7)
+    assert bf.size == 2048 and bf.num_blocks == 4
+    indices = bf._indices([f"item {i}" for i in range(500)])
+    assert (indices // 512 == indices[:, :1] // 512).all()
+    assert all(len(set(row)) == 7 for row in indices.tolist())
+
+    n, f = 20000, 0.01
+    m = math.ceil((n * math.log(1/f)) / (math.log(2)**2))
+    bf = BlockedBloomFilter(m, math.ceil((m / n) * math.log(2)))
+    bf.add_many([f"item {i}" for i in range(n)])
+    assert bf.check_many([f"item {i}" for i in range(n)]).all()
+    assert bf.check_many([f"absent {i}" for i in range(n)]).mean() < 2 * f
+
+@pytest.mark.parametrize("filter_class", [BloomFilter, CountingBloomFilter])
+def test_bloomF_union_intersection(filter_class):
+    """testing union answers like one filter holding both shards and intersection estimates their overlap
+    """
+    first, second = [f"item {i}" for i in range(0, 3000)], [f"item {i}" for i in range(2000, 5000)]
+    a, b, whole = filter_class(10**4, 0.01), filter_class(10**4, 0.01), filter_class(10**4, 0.01)
+    a.insert_many(first)
+    b.insert_many(second)
+    whole.insert_many(first + second)
+    merged = a.union(b)
+    assert type(merged) is filter_class and merged.num_items == 6000
+    queries = first + second + [f"absent {i}" for i in range(3000)]
+    assert list(merged.query_many(queries)) == list(whole.query_many(queries))
+    overlap = a.intersection(b)
+    assert overlap.query_many([f"item {i}" for i in range(2000, 3000)]).all()
+    assert abs(overlap.num_items - 1000) < 100
+    with pytest.raises(ValueError):
+        a.union(filter_class(10**4, 0.02))
+    with pytest.raises(ValueError):
+        a.union(ScalableBloomFilter(10**4, 0.01))
+
+@pytest.mark.parametrize("make_filter", [
+    lambda: StandardBloomFilter(2000, 3),
+    lambda: ChunkedBloomFilter(2000, 5, 3),
+    lambda: ImprovedBloomFilter(2000, 3, method='kirsch-mitzenmacher'),
+    lambda: BlockedBloomFilter(2000, 7),
+])
+def test_bloomfilter3_union(make_filter):
+    """testing the union of two filters has the bits of one filter holding both
+    """
+    a, b, whole = make_filter(), make_filter(), make_filter()
+    a.add_many([f"item {i}" for i in range(100)])
+    b.add_many([f"item {i}" for i in range(100, 200)])
+    whole.add_many([f"item {i}" for i in range(200)])
+    merged = a.union(b)
+    assert merged._bit_arrays() == whole._bit_arrays() and merged.num_items == 200
+    assert a.intersection(b).check_many([f"item {i}" for i in range(200)]).sum() < 200
+    with pytest.raises(ValueError):
+        a.union(ImprovedBloomFilter(2000, 3))
+
+def test_bloom_build_sharded(tmp_path):
+    """testing shards built on worker processes merge into the filter a single process builds
+    """
+    paths = []
+    for shard in range(3):
+        paths.append(tmp_path / f"shard{shard}.tsv")
+        paths[-1].write_text("".join(f"{i}\tDOCUMENT NUMBER {i} OF SHARD {shard}\n" for i in range(50)))
+    for make_filter, build in [(lambda: BloomFilter(10**4, 0.01), build_sharded1),
+                               (lambda: ImprovedBloomFilter(20000, 5, method='kirsch-mitzenmacher'), build_sharded3)]:
+        single = build(make_filter(), paths, workers=1)
+        sharded = build(make_filter(), paths, workers=3)
+        assert sharded.num_items == single.num_items
+        assert (sharded.bit_array == single.bit_array) if isinstance(single, BloomFilter) else (sharded.bits == single.bits)
+
+def test_shared_bloomF_combines_and_shards_like_plain(tmp_path):
+    """testing a shared filter unions with a plain one of the same m and k and is built from plain shards
+    """
+    import os
+    items = [f"item {i}" for i in range(2000)]
+    plain = BloomFilter(10**4, 0.01)
+    plain.insert_many(items[1000:])
+    with SharedBloomFilter(10**4, 0.01) as shared:
+        shared.insert_many(items[:1000])
+        for merged in (shared.union(plain), plain.union(shared)):
+            assert type(merged) is BloomFilter and merged.query_many(items).all()
+        with pytest.raises(ValueError):
+            shared.union(CountingBloomFilter(10**4, 0.01))
+
+    paths = []
+    for shard in range(2):
+        paths.append(tmp_path / f"shard{shard}.tsv")
+        paths[-1].write_text("".join(f"{i}\tDOCUMENT NUMBER {i} OF SHARD {shard}\n" for i in range(50)))
+    segments = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    with SharedBloomFilter(10**4, 0.01) as shared:
+        sharded = build_sharded1(shared, paths, workers=2)
+        single = build_sharded1(BloomFilter(10**4, 0.01), paths, workers=1)
+        assert sharded.num_items == single.num_items and sharded.bit_array[:sharded.m] == single.bit_array
+    if segments:
+        assert set(os.listdir("/dev/shm")) <= segments
+
+def _query_shared(args):
+    bf, items = args
+    return list(bf.query_many(items)), bf.num_items
+
+def test_shared_bloomF_workers_attach(tmp_path):
+    """testing pool workers query the writer's shared bits in place and cannot insert into them
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    items = [f"item {i}" for i in range(1000)]
+    with SharedBloomFilter(10**4, 0.01) as writer:
+        writer.insert_many(items)
+        queries = items[:100] + [f"absent {i}" for i in range(100)]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(_query_shared, [(writer, queries)] * 2))
+        assert results == [(list(writer.query_many(queries)), 1000)] * 2
+
+        reader = SharedBloomFilter.attach(writer.name)
+        writer.insert("added later")
+        assert reader.query("added later") and reader.num_items == 1001
+        with pytest.raises(ValueError):
+            reader.insert("from a reader")
+        with pytest.raises(ValueError):
+            reader.insert_txt("TWO CHERRY PUMPKIN TARTS")
+        with pytest.raises(ValueError):
+            reader.unlink()
+        reader.close()
+
+        # a reader in an unrelated process, with a resource tracker of its own, leaves the segment in place
+        import subprocess, sys
+        script = f"from a2.bloomfilter1 import SharedBloomFilter; print(SharedBloomFilter.attach({writer.name!r}).query('added later'))"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "True" and "leaked" not in result.stderr
+        assert SharedBloomFilter.attach(writer.name).query("added later")
+
+        writer.save(tmp_path / "shared.bloom")
+        loaded = BloomFilter.load(tmp_path / "shared.bloom")
+        with SharedBloomFilter.from_filter(loaded) as copy:
+            assert list(copy.query_many(queries)) == list(writer.query_many(queries))
+            assert copy.num_items == 1001
+    with pytest.raises(FileNotFoundError):
+        SharedBloomFilter.attach(writer.name)
+
+def test_bloom_load_rejects_other_files(tmp_path):
+    """testing loading a file that is not a saved filter fails with ValueError
+    """
+    (tmp_path / "five.tsv").write_text("1\tTWO CHERRY PUMPKIN TARTS\n")
+    with pytest.raises(ValueError):
+        load_filter(tmp_path / "five.tsv")
+
+def test_scalable_bloomF_keeps_fpr_bound():
+    """testing the scalable Bloom Filter grows past n without false negatives and below its false positive rate
+    """
+    sbf = ScalableBloomFilter(1000, 0.01)
+    items = [f"item {i}" for i in range(20000)]
+    sbf.insert_many(items[:10000])
+    for item in items[10000:12000]:
+        sbf.insert(item)
+    sbf.insert_hashes(np.arange(8000, dtype=np.uint64))
+    assert sbf.num_items == 20000
+    assert len(sbf.filters) > 1
+    assert all(bf.num_items <= bf.n for bf in sbf.filters)
+    assert sbf.query_many(items[:12000]).all()
+    assert sbf.query_hashes(np.arange(8000, dtype=np.uint64)).all()
+    assert sbf.false_positive_bound() <= 0.01
+    assert sbf.query_many([f"absent {i}" for i in range(20000)]).mean() <= 0.01
+
+def test_scalable_bloomF_fractional_growth(tmp_path):
+    """testing a non-integer growth rounds every sub-filter capacity up to a whole number of items
+    """
+    sbf = ScalableBloomFilter(100, 0.01, growth=1.5)
+    items = [f"item {i}" for i in range(1000)]
+    sbf.insert_many(items)
+    assert [bf.n for bf in sbf.filters[:4]] == [100, 150, 225, 338]
+    assert sbf.query_many(items).all()
+    sbf.save(tmp_path / "scalable.bloom")
+    loaded = ScalableBloomFilter.load(tmp_path / "scalable.bloom")
+    loaded.insert_many([f"more {i}" for i in range(500)])
+    assert loaded.query_many(items).all()
+
+def test_scalable_bloomF_txt_and_save_load(tmp_path):
+    """testing document inserts spread over sub-filters and a saved chain reloads and keeps growing
+    """
+    with open('./tests/hundred.tsv', 'r') as file:
+        documents = [line.strip() for line in file.read().strip().splitlines()]
+    sbf = ScalableBloomFilter(100, 0.01)
+    sbf.insert_txt_many(documents[:50])
+    assert sbf.query_txt(documents[0]) and sbf.query_txt_many(documents[:50]).all()
+    assert not sbf.query_txt("Sailing across the tranquil sea on a quiet morning")
+    sbf.save(tmp_path / "scalable.bloom")
+    loaded = ScalableBloomFilter.load(tmp_path / "scalable.bloom")
+    assert [bf.num_items for bf in loaded.filters] == [bf.num_items for bf in sbf.filters]
+    assert loaded.query_txt_many(documents[:50]).all()
+    loaded.insert_txt(documents[60])
+    assert loaded.query_txt(documents[60])
+    with pytest.raises(ValueError):
+        BloomFilter.load(tmp_path / "scalable.bloom")
+
+def test_counting_bloomF_insert_remove():
+    """testing the counting Bloom Filter answers like BloomFilter and forgets removed items
+    """
+    items = [f"item {i}" for i in range(800)]
+    cbf, bf = CountingBloomFilter(1000, 0.01), BloomFilter(1000, 0.01)
+    cbf.insert_many(items)
+    bf.insert_many(items)
+    queries = items + [f"absent {i}" for i in range(2000)]
+    assert list(cbf.query_many(queries)) == list(bf.query_many(queries))
+    assert cbf.remove_many(items[:400]).all()
+    assert cbf.num_items == 400
+    assert cbf.query_many(items[400:]).all()
+    assert cbf.query_many(items[:400]).mean() < 0.05
+    # removing an absent item changes nothing
+    assert not cbf.remove("never inserted")
+    assert cbf.num_items == 400
+
+def test_counting_bloomF_counters():
+    """testing repeated inserts count up, and saturated counters never count down
+    """
+    cbf = CountingBloomFilter(100, 0.01)
+    cbf.insert_many(["twice", "twice"])
+    assert cbf.remove("twice") and cbf.query("twice")
+    assert cbf.remove("twice") and not cbf.query("twice")
+    assert not cbf.counters.any()
+    for _ in range(MAX_COUNT + 5):
+        cbf.insert("hot")
+    assert (cbf.counts(cbf._items_indices(["hot"])) == MAX_COUNT).all()
+    for _ in range(MAX_COUNT + 5):
+        cbf.remove("hot")
+    assert cbf.query("hot")
+
+def test_counting_bloomF_remove_txt(tmp_path):
+    """testing documents expire one by one and a saved counting filter keeps its counters
+    """
+    with open('./tests/hundred.tsv', 'r') as file:
+        documents = [line.strip() for line in file.read().strip().splitlines()][:20]
+    cbf = CountingBloomFilter(10**5, 0.01)
+    cbf.insert_txt_many(documents)
+    assert cbf.remove_txt(documents[0])
+    assert not cbf.query_txt(documents[0])
+    assert cbf.query_txt_many(documents[1:]).all()
+    assert not cbf.remove_txt("Sailing across the tranquil sea on a quiet morning")
+    cbf.save(tmp_path / "counting.bloom")
+    loaded = CountingBloomFilter.load(tmp_path / "counting.bloom")
+    assert loaded.num_items == cbf.num_items
+    assert list(loaded.remove_txt_many(documents[:2])) == [False, True]
+    assert loaded.query_txt_many(documents[2:]).all()
+
+def test_cuckoo_insert_query_remove():
+    """testing the cuckoo filter finds every inserted item, keeps its false positive bound and forgets removed items
+    """
+    items = [f"item {i}" for i in range(5000)]
+    cf = CuckooFilter(5000, 0.001)
+    cf.insert_many(items)
+    assert cf.num_items == 5000 and cf.victim is None
+    assert cf.query_many(items).all()
+    assert cf.fingerprint_bits == 13
+    assert 0.8 < cf.load_factor() <= 0.9
+    assert cf.query_many([f"absent {i}" for i in range(20000)]).mean() <= cf.false_positive_bound() * 3
+    # inserting an item again stores nothing
+    cf.insert(items[0])
+    assert cf.num_items == 5000
+    assert cf.remove_many(items[:2500]).all()
+    assert cf.num_items == 2500 and np.count_nonzero(cf.fingerprint_table()) == 2500
+    assert cf.query_many(items[2500:]).all()
+    assert cf.query_many(items[:2500]).mean() <= cf.false_positive_bound() * 3
+    assert not cf.remove("never inserted")
+
+def test_cuckoo_packed_fingerprints():
+    """testing fingerprints of any width are packed across word boundaries and beat a Bloom filter at low rates
+    """
+    for f, bits in [(0.05, 8), (0.001, 13), (0.00001, 20)]:
+        cf = CuckooFilter(5000, f)
+        assert cf.fingerprint_bits == bits
+        items = [f"item {i}" for i in range(5000)]
+        cf.insert_many(items)
+        assert cf.query_many(items).all()
+        assert cf.fingerprint_table().max() < 2 ** bits
+        assert cf.table.nbytes * 8 <= cf.num_buckets * cf.bucket_size * bits + 128
+    assert cf.bits_per_item() < BloomFilter(5000, 0.00001).m / 5000
+    cf._set(1, 3, 2 ** 20 - 1)
+    assert cf._bucket(1)[3] == cf.fingerprint_table()[1, 3] == 2 ** 20 - 1
+
+def test_cuckoo_batch_matches_single():
+    """testing the batch methods of the cuckoo filter answer like the single-item ones
+    """
+    items = [f"item {i}" for i in range(300)]
+    queries = items + [f"absent {i}" for i in range(300)]
+    single, batched = CuckooFilter(400, 0.01), CuckooFilter(400, 0.01)
+    for item in items:
+        single.insert(item)
+    batched.insert_many(items)
+    assert [single.query(item) for item in queries] == list(batched.query_many(queries))
+    assert list(single.check_many(queries)) == list(batched.query_many(queries))
+
+def test_cuckoo_full():
+    """testing an overfull cuckoo filter keeps every item it took and refuses further inserts
+    """
+    cf = CuckooFilter(100, 0.01)
+    inserted = []
+    with pytest.raises(ValueError):
+        for i in range(200):
+            cf.insert(f"item {i}")
+            inserted.append(f"item {i}")
+    assert cf.victim is not None
+    assert cf.query_many(inserted).all()
+    # freeing slots gives the homeless fingerprint its place back
+    cf.remove_many(inserted[:20])
+    assert cf.victim is None
+    assert cf.query_many(inserted[20:]).all()
+
+def test_cuckoo_remove_file_shared_shingles(tmp_path, monkeypatch, caplog):
+    """testing removal through the CLI: repeated hashes are removed once, and shingles shared with kept documents go too
+    """
+    cf = CuckooFilter(100, 0.001)
+    cf.insert("x")
+    assert list(cf.remove_hashes(np.repeat(cf._items_hashes(["x"]), 2))) == [True, True]
+    assert cf.num_items == 0
+
+    kept, shared, expired = "cherry garcia ice cream in a cone", "two cherry pumpkin tarts and pies", "two cherry pumpkin tarts and cakes"
+    (tmp_path / "docs.tsv").write_text(f"{kept}\n{shared}\n{expired}\n")
+    (tmp_path / "expired.tsv").write_text(f"{expired}\n")
+    monkeypatch.setattr(sys, "argv", ["bloomfilter1_cli", "--init", "--cuckoo", "--n", "1000", "--f", "0.001",
+                                      "--insert-file", str(tmp_path / "docs.tsv"), "--remove-file", str(tmp_path / "expired.tsv"),
+                                      "--save", str(tmp_path / "window.cuckoo")])
+    with caplog.at_level(logging.INFO):
+        bloomfilter1_main()
+    assert "Removed 1 of 1 documents" in caplog.text
+    window = CuckooFilter.load(tmp_path / "window.cuckoo")
+    # 8 distinct 4-word shingles were inserted and the 3 of the expired document removed
+    assert window.num_items == 5
+    assert window.query_txt(kept)
+    # "two cherry pumpkin tarts" went with the expired document
+    assert not window.query_txt(shared)
+    assert not window.remove_txt(shared)
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_cuckoo_txt_save_load(tmp_path, mmap):
+    """testing documents in a saved cuckoo filter, loaded directly and through the bloomfilter3 CLI
+    """
+    with open('./tests/hundred.tsv', 'r') as file:
+        documents = [line.strip() for line in file.read().strip().splitlines()][:20]
+    cf = CuckooFilter(10**5, 0.001)
+    cf.insert_txt_many(documents)
+    assert cf.query_txt_many(documents).all()
+    cf.save(tmp_path / "cuckoo.bloom")
+    with pytest.raises(ValueError):
+        load_filter(tmp_path / "cuckoo.bloom", mmap)
+    for loaded in (CuckooFilter.load(tmp_path / "cuckoo.bloom", mmap), load_any_filter(tmp_path / "cuckoo.bloom")):
+        assert isinstance(loaded, CuckooFilter)
+        assert loaded.num_items == cf.num_items
+        assert (loaded.table == cf.table).all()
+        assert loaded.query_txt_many(documents).all()
+    assert loaded.remove_txt(documents[0])
+    assert not loaded.query_txt(documents[0])
+    assert CuckooFilter.load(tmp_path / "cuckoo.bloom").query_txt(documents[0])
+
 ## StandardBloomFilter test
 
 def test_StandardBloomFilter_withText_5():
@@ -206,4 +687,14 @@ def test_ImprovedBloomFilter_withText_5():
                 results.append(sent)
         
     
-    assert results == expected_outputs, f"Expected {len(expected_outputs)} findings, but found {len(results)}"
\ No newline at end of file
+    assert results == expected_outputs, f"Expected {len(expected_outputs)} findings, but found {len(results)}"
+
+def test_iter_line_chunks_matches_whole_file_read(tmp_path):
+    """testing that files are read in bounded chunks with the lines of read().strip().splitlines()
+    """
+    path = tmp_path / "items.txt"
+    path.write_text("\n  \nfirst\n second \n\n\nthird\n\n")
+    chunks = list(iter_line_chunks(str(path), chunk_size=2))
+    expected = [line.strip() for line in path.read_text().strip().splitlines()]
+    assert [line for chunk in chunks for line in chunk] == expected
+    assert all(len(chunk) <= 2 for chunk in chunks)
@@ -9,6 +9,29 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../'
 from src.a2.dedup import lsh_hash
 from src.a2.dedup import minhash_signature
 from src.a2.dedup import UnionFind
+from src.a2.dedup import minhash_signature_dynamic, jaccard_similarity, generate_shingles
+from src.a2.minhash import minhash_numpy, hash_shingles, estimate_jaccard, minhash_numpy_runner_up, probe_band_keys
+from src.a2.signatures import compute_signatures
+from src.a2.shingling import token_hashes, word_shingle_hashes, word_shingle_hashes_many, char_shingle_hashes, jaccard_similarity_hashes
+from src.a2.lsh_index import LSHIndex, sort_band_keys
+from src.a2.lsh_case2 import top_k, nearest_neighbor_search
+from src.a2.signature_cache import SignatureCache
+from src.a2.incremental import DedupState
+from src.a2.dedup import find_candidate_pairs, bucket_star_edges, verify_edges, iter_tsv_no_headers, iter_chunks, ExactDuplicateFilter, MAX_VERIFIED_LINKS
+from src.a2.signatures import stream_signatures
+from src.a2.bloomfilter1 import BloomFilter
+from src.a2.cluster_report import write_cluster_report
+from src.a3.index_service import IndexRegistry, DatasetNotFound, IndexNotReady
+from src.a3.redis_io import read_documents, write_documents, iter_key_batches
+from src.a3.redis_index import RedisLSHIndex, open_or_build, _BuildLock
+try:
+    import fakeredis
+except ImportError:  # optional: only the Redis tests need it
+    fakeredis = None
+import json
+import tempfile
+import time
+import numpy as np
 
 class TestMinhashSignature(unittest.TestCase):
     
@@ -32,6 +55,605 @@ class TestMinhashSignature(unittest.TestCase):
         # Verify the length of the signature matches the number of permutations
         self.assertEqual(len(signature), num_permutations, "Signature length should match num_permutations.")
 
+class TestNumpyMinhashEngine(unittest.TestCase):
+
+    pairs = [
+        ("the quick brown fox jumps over the lazy dog near the river bank today",
+         "the quick brown fox leaps over the lazy dog near the river bank today"),
+        ("two cherry pumpkin tarts and cherry garcia ice cream for dessert tonight",
+         "cheeseburgers in paradise with two cherry pumpkin tarts for dessert"),
+        ("pessimism about us china relations seems to be permeating the air recently",
+         "bachelor sam wood and new love snezana markoski on the season finale"),
+    ]
+
+    def test_numpy_signature_consistency(self):
+        text = "This is a sample document for testing"
+        signature1 = minhash_signature(text, 100, engine='numpy')
+        signature2 = minhash_signature(text, 100, engine='numpy')
+        self.assertTrue((signature1 == signature2).all(), "Numpy signatures should be deterministic.")
+        self.assertEqual(len(signature1), 100, "Signature length should match num_permutations.")
+        self.assertEqual(signature1.dtype.name, 'uint64')
+
+    def test_numpy_signature_uint32(self):
+        signature = minhash_numpy(hash_shingles("another document for testing".split()), 64, dtype='uint32')
+        self.assertEqual(signature.dtype.name, 'uint32')
+        self.assertEqual(len(signature), 64)
+
+    def test_numpy_signature_empty_document(self):
+        signature = minhash_signature("", 16, engine='numpy')
+        self.assertEqual(len(set(signature.tolist())), 1, "Empty documents should get a constant signature.")
+
+    def test_runner_up_is_second_smallest_value(self):
+        hashes = hash_shingles("two cherry pumpkin tarts and two cherry pies".split())
+        signature, runner_up = minhash_numpy_runner_up(hashes, 32)
+        per_shingle = np.sort(np.vstack([minhash_numpy(np.unique(hashes)[i:i + 1], 32) for i in range(len(np.unique(hashes)))]), axis=0)
+        self.assertTrue((signature == minhash_numpy(hashes, 32)).all())
+        self.assertTrue((runner_up == per_shingle[1]).all())
+        _, lone = minhash_numpy_runner_up(hashes[:1], 8)
+        self.assertEqual(len(set(lone.tolist())), 1, "A single shingle has no runner-up.")
+
+    def test_probe_sequence_ranked_by_runner_up(self):
+        signature, runner_up = minhash_numpy_runner_up(hash_shingles("a b c d e f g h".split()), 20)
+        bands, keys = probe_band_keys(signature, runner_up, 5, 2, 4)
+        self.assertEqual((len(bands), len(keys)), (4, 4))
+        self.assertEqual(bands.tolist(), (np.argsort(runner_up[:10], kind='stable')[:4] // 2).tolist())
+        self.assertEqual(len(probe_band_keys(signature, runner_up, 5, 2, 100)[0]), 10)
+
+    def test_jaccard_parity_with_md5_engine(self):
+        num_permutations = 256
+        for text1, text2 in self.pairs:
+            exact = jaccard_similarity(text1.split(), text2.split())
+            md5_estimate = estimate_jaccard(minhash_signature(text1, num_permutations),
+                                            minhash_signature(text2, num_permutations))
+            numpy_estimate = estimate_jaccard(minhash_signature(text1, num_permutations, engine='numpy'),
+                                              minhash_signature(text2, num_permutations, engine='numpy'))
+            self.assertAlmostEqual(md5_estimate, numpy_estimate, delta=0.12,
+                                   msg="Both engines should estimate the same Jaccard similarity.")
+            self.assertAlmostEqual(numpy_estimate, exact, delta=0.12,
+                                   msg="Numpy estimate should be close to the exact Jaccard similarity.")
+
+    def test_jaccard_parity_dynamic_shingles(self):
+        text1, text2 = self.pairs[0]
+        md5_estimate = estimate_jaccard(minhash_signature_dynamic(text1, 256),
+                                        minhash_signature_dynamic(text2, 256))
+        numpy_estimate = estimate_jaccard(minhash_signature_dynamic(text1, 256, engine='numpy'),
+                                          minhash_signature_dynamic(text2, 256, engine='numpy'))
+        self.assertAlmostEqual(md5_estimate, numpy_estimate, delta=0.12)
+
+class TestShingleHashes(unittest.TestCase):
+
+    def test_token_hashes_follow_split(self):
+        text = "ab  cd\tab\nxyz cd ab"
+        hashes = token_hashes(text)
+        self.assertEqual(len(hashes), len(text.split()))
+        self.assertEqual(hashes[0], hashes[2])
+        self.assertEqual(hashes[1], hashes[4])
+        self.assertNotEqual(hashes[0], hashes[3])
+
+    def test_token_hashes_split_unicode_whitespace(self):
+        text = "caf\u00e9\u00a0ab\u3000cd\u2009ab\u0085xyz"
+        hashes = token_hashes(text)
+        self.assertEqual(len(hashes), len(text.split()))
+        self.assertEqual(hashes[1], hashes[3])
+        self.assertTrue((token_hashes("ab cd") == token_hashes("ab\u2003cd")).all())
+
+    def test_word_shingle_count_matches_generate_shingles(self):
+        text = "two cherry pumpkin tarts and two cherry pumpkin pies"
+        hashes = word_shingle_hashes(text, 3)
+        self.assertEqual(hashes.dtype.name, 'uint64')
+        self.assertEqual(len(hashes), len(text.split()) - 2)
+        self.assertEqual(len(set(hashes.tolist())), len(set(generate_shingles(text, 3))))
+        self.assertEqual(len(word_shingle_hashes("too short", 3)), 0)
+
+    def test_word_shingle_hashes_many_matches_each_text(self):
+        texts = ["two cherry pumpkin tarts", "", "too short", "caf\u00e9\u00a0ab\u3000cd ab xyz\n", "a b c d e"]
+        hashes, offsets = word_shingle_hashes_many(texts, 3)
+        self.assertEqual(offsets.tolist()[-1], len(hashes))
+        for i, text in enumerate(texts):
+            self.assertTrue((hashes[offsets[i]:offsets[i + 1]] == word_shingle_hashes(text, 3)).all())
+        hashes, offsets = word_shingle_hashes_many([], 3)
+        self.assertEqual((len(hashes), offsets.tolist()), (0, [0]))
+
+    def test_char_shingle_count(self):
+        text = "cherry tarts"
+        hashes = char_shingle_hashes(text, 4)
+        self.assertEqual(len(hashes), len(text) - 3)
+        self.assertEqual(len(set(hashes.tolist())), len({text[i:i + 4] for i in range(len(text) - 3)}))
+
+    def test_jaccard_from_hashes_matches_sets(self):
+        text1, text2 = "a b c d", "a b c e"
+        self.assertAlmostEqual(jaccard_similarity_hashes(word_shingle_hashes(text1, 1), word_shingle_hashes(text2, 1)),
+                               jaccard_similarity(text1.split(), text2.split()))
+        self.assertEqual(jaccard_similarity_hashes(word_shingle_hashes("", 1), word_shingle_hashes("", 1)), 0.0)
+
+class TestParallelSignatures(unittest.TestCase):
+
+    texts = ["two cherry pumpkin tarts", "cherry garcia ice cream", "cheeseburgers in paradise",
+             "cheeseburger in paradise", "the rain stopped suddenly", "two cherry pumpkin pies"]
+
+    def test_parallel_matches_serial_numpy(self):
+        for scheme in ('word', 'char_dynamic', 'word_shingle'):
+            serial = compute_signatures(self.texts, scheme, 64, engine='numpy')
+            parallel = compute_signatures(self.texts, scheme, 64, engine='numpy', workers=2, chunk_size=1)
+            self.assertEqual(serial.shape, (len(self.texts), 64))
+            self.assertTrue((serial == parallel).all(), f"Parallel signatures differ for scheme {scheme}.")
+
+    def test_parallel_matches_serial_md5(self):
+        serial = compute_signatures(self.texts, 'word', 16)
+        parallel = compute_signatures(self.texts, 'word', 16, workers=2, chunk_size=2)
+        self.assertEqual(serial, parallel)
+
+class TestStreamingReader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'docs.tsv')
+        with open(self.path, 'w') as f:
+            f.write("1\tTwo cherry pumpkin tarts\n")
+            f.write("\n")
+            f.write("2\tCheeseburgers in paradise\n")
+            f.write("3\tTwo cherry pumpkin tarts\n")
+            f.write("a\tb\tc\n")
+            f.write("only text here\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reader_skips_malformed_rows(self):
+        with self.assertLogs(level='INFO') as logs:
+            documents = list(iter_tsv_no_headers(self.path))
+        self.assertEqual([doc['id'] for doc in documents], ['1', '2', '3', '4'])
+        self.assertEqual(documents[3]['text'], 'only text here')
+        self.assertIn("Processed 6 rows; read 4 documents with 2 malformed or empty rows skipped.", logs.output[-1])
+
+    def test_chunks_and_duplicate_filter(self):
+        remove_duplicates = ExactDuplicateFilter()
+        results = [remove_duplicates(chunk) for chunk in iter_chunks(iter_tsv_no_headers(self.path), 2)]
+        self.assertEqual(len(results), 2)
+        self.assertEqual([doc['id'] for doc in results[1][1]], ['3'])
+
+    def test_duplicate_filter_ignores_case_and_punctuation(self):
+        documents = [{'id': '1', 'text': "Two cherry pumpkin tarts"}, {'id': '2', 'text': "two cherry, pumpkin   TARTS!"},
+                     {'id': '3', 'text': "Cheeseburgers in paradise"}]
+        unique_docs, duplicates = ExactDuplicateFilter()(documents)
+        self.assertEqual([doc['id'] for doc in unique_docs], ['1', '3'])
+        self.assertEqual([doc['id'] for doc in duplicates], ['2'])
+        self.assertEqual(ExactDuplicateFilter(normalize=False)(documents)[1], [])
+
+    def test_duplicate_filter_remembers_earlier_chunks(self):
+        documents = [{'id': str(i), 'text': f"document {i % 700}"} for i in range(2000)]
+        remove_duplicates = ExactDuplicateFilter()
+        unique_ids = [doc['id'] for chunk in iter_chunks(documents, 300) for doc in remove_duplicates(chunk)[0]]
+        self.assertEqual(unique_ids, [str(i) for i in range(700)])
+        self.assertEqual(len(remove_duplicates.seen), 700)
+
+    def test_duplicate_filter_bloom_precheck_matches_plain(self):
+        documents = [{'id': str(i), 'text': f"document {i % 700}"} for i in range(2000)]
+        plain, checked = ExactDuplicateFilter(), ExactDuplicateFilter(bloom_filter=BloomFilter(1000, 0.01))
+        for chunk in iter_chunks(documents, 300):
+            expected, result = plain(chunk), checked(chunk)
+            self.assertEqual([[doc['id'] for doc in part] for part in result], [[doc['id'] for doc in part] for part in expected])
+        self.assertEqual(len(checked.seen), 700)
+        self.assertEqual(checked.bloom_filter.num_items, 700)
+        with_bloom = stream_signatures(self.path, 'word_shingle', 32, engine='numpy', chunk_size=1, dedup_bloom=True)
+        without = stream_signatures(self.path, 'word_shingle', 32, engine='numpy', chunk_size=1)
+        self.assertEqual(with_bloom[0], without[0])
+        self.assertEqual(with_bloom[2], without[2])
+
+    def test_stream_signatures_matches_compute_signatures(self):
+        documents, signatures, duplicates = stream_signatures(self.path, 'word_shingle', 32, engine='numpy', chunk_size=1)
+        expected = compute_signatures(["two cherry pumpkin tarts", "cheeseburgers in paradise", "only text here"],
+                                      'word_shingle', 32, engine='numpy')
+        self.assertEqual([(doc['id'], doc['ordinal']) for doc in documents], [('1', 0), ('2', 1), ('4', 3)])
+        self.assertEqual([dup['id'] for dup in duplicates], ['3'])
+        self.assertNotIn('text', documents[0])
+        self.assertTrue((signatures == expected).all())
+
+    def test_stream_signatures_starts_one_pool(self):
+        from unittest import mock
+        import src.a2.signatures as signatures_module
+        serial = stream_signatures(self.path, 'word_shingle', 32, engine='numpy', chunk_size=1)
+        with mock.patch.object(signatures_module, 'ProcessPoolExecutor', wraps=signatures_module.ProcessPoolExecutor) as pool:
+            parallel = stream_signatures(self.path, 'word_shingle', 32, engine='numpy', workers=2, chunk_size=2)
+        self.assertEqual(pool.call_count, 1)
+        self.assertEqual(parallel[0], serial[0])
+        self.assertTrue((parallel[1] == serial[1]).all())
+
+class TestClusterReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'docs.tsv')
+        with open(self.path, 'w') as f:
+            f.write("1\tTwo cherry pumpkin tarts\n")
+            f.write("2\tCheeseburgers in paradise\n")
+            f.write("3\tTwo cherry pumpkin pies\n")
+            f.write("4\tThe rain stopped\n")
+        self.report = os.path.join(self.tmpdir.name, 'report.jsonl')
+        self.documents, self.signatures, _ = stream_signatures(self.path, 'word', 64, engine='numpy')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_report_lists_multi_document_clusters(self):
+        written = write_cluster_report(self.report, self.documents, {0: [0, 2], 1: [1], 3: [3]}, self.signatures,
+                                       self.path, exact=True)
+        with open(self.report) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(written, 1)
+        self.assertEqual(records[0]['ids'], ['1', '3'])
+        pair = records[0]['pairs'][0]
+        self.assertEqual((pair['doc1'], pair['doc2'], pair['exact']), ('1', '3', 0.6))
+        self.assertEqual(pair['estimated'], round(estimate_jaccard(self.signatures[0], self.signatures[2]), 4))
+
+    def test_large_clusters_report_against_first_member(self):
+        write_cluster_report(self.report, self.documents, {0: [0, 1, 2, 3]}, self.signatures, max_pairs=3)
+        with open(self.report) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record['pairs_scope'], 'first_member')
+        self.assertEqual([pair['doc2'] for pair in record['pairs']], ['2', '3', '4'])
+        self.assertNotIn('exact', record['pairs'][0])
+
+class TestSignatureCache(unittest.TestCase):
+
+    texts = ["two cherry pumpkin tarts", "cherry garcia ice cream", "cheeseburgers in paradise"]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cached_signatures_match_uncached(self):
+        expected = compute_signatures(self.texts, 'word_shingle', 64, engine='numpy')
+        cache = SignatureCache(self.tmpdir.name)
+        first = compute_signatures(self.texts, 'word_shingle', 64, engine='numpy', cache=cache)
+        second = compute_signatures(self.texts + ["a brand new document"], 'word_shingle', 64, engine='numpy', cache=cache)
+        self.assertTrue((first == expected).all())
+        self.assertTrue((second[:3] == expected).all())
+        self.assertEqual((cache.hits, cache.misses), (3, 4))
+        cache.close()
+
+    def test_key_depends_on_parameters(self):
+        key = SignatureCache.key("cherry garcia ice cream", 'word', 64)
+        self.assertNotEqual(key, SignatureCache.key("cherry garcia ice cream", 'word', 128))
+        self.assertNotEqual(key, SignatureCache.key("cherry garcia ice cream", 'word_shingle', 64))
+        self.assertNotEqual(key, SignatureCache.key("cherry garcia ice cream", 'word', 64, seed=2))
+
+    def test_lru_eviction_respects_size_cap(self):
+        # Room for two 64-permutation signatures (512 bytes each)
+        cache = SignatureCache(self.tmpdir.name, max_size_mb=1024 / (1024 * 1024))
+        compute_signatures(self.texts[:2], 'word', 64, engine='numpy', cache=cache)
+        compute_signatures(self.texts[:1], 'word', 64, engine='numpy', cache=cache)
+        compute_signatures(self.texts[2:], 'word', 64, engine='numpy', cache=cache)
+        self.assertLessEqual(cache.size_bytes(), 1024)
+        found = cache.get_many([SignatureCache.key(text, 'word', 64) for text in self.texts])
+        self.assertEqual(len(found), 2)
+        self.assertNotIn(SignatureCache.key(self.texts[1], 'word', 64), found)
+        cache.close()
+
+class TestIncrementalDedup(unittest.TestCase):
+
+    documents = [{'id': '1', 'text': "two cherry pumpkin tarts"}, {'id': '2', 'text': "cheeseburgers in paradise"},
+                 {'id': '3', 'text': "two cherry pumpkin tarts"}, {'id': '4', 'text': "cheeseburger in paradise"},
+                 {'id': '5', 'text': "the rain stopped suddenly"}, {'id': '6', 'text': "two cherry pumpkin pies"}]
+    params = {'scheme': 'word', 'engine': 'numpy', 'num_permutations': 64, 'bands': 32, 'rows': 2}
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _add(self, state, documents):
+        unique_docs, duplicates = state.remove_exact_duplicates(documents)
+        signatures = compute_signatures([doc['text'] for doc in unique_docs], 'word', 64, engine='numpy')
+        lsh_hashes = [lsh_hash(signature, state.params['bands'], state.params['rows']) for signature in signatures]
+        changed = state.add_documents(unique_docs, signatures, lsh_hashes)
+        state.save()
+        return changed, duplicates, lsh_hashes
+
+    def test_append_matches_full_run(self):
+        state = DedupState(self.tmpdir.name, self.params)
+        _, _, first_hashes = self._add(state, self.documents[:3])
+        state.close()
+
+        state = DedupState(self.tmpdir.name, self.params, append=True)
+        changed, duplicates, second_hashes = self._add(state, self.documents[3:])
+        clusters = state.clusters(changed)
+        self.assertEqual([doc['id'] for doc in duplicates], [])
+        self.assertEqual(len(state), 5)
+        self.assertEqual(state.signatures().shape, (5, 64))
+
+        uf = UnionFind(5)
+        for doc1, doc2 in find_candidate_pairs(first_hashes + second_hashes):
+            uf.union(doc1, doc2)
+        roots = state.roots()
+        for i in range(5):
+            for j in range(5):
+                self.assertEqual(uf.find(i) == uf.find(j), roots[i] == roots[j])
+        self.assertIn(['2', '4'], list(clusters.values()))
+        state.close()
+
+    def test_append_detects_exact_duplicates_across_batches(self):
+        state = DedupState(self.tmpdir.name, self.params)
+        self._add(state, self.documents[:2])
+        state.close()
+        state = DedupState(self.tmpdir.name, self.params, append=True)
+        _, duplicates, _ = self._add(state, [{'id': '7', 'text': "two cherry pumpkin tarts"}])
+        self.assertEqual([doc['id'] for doc in duplicates], ['7'])
+        state.close()
+
+    def test_append_with_threshold_matches_full_run(self):
+        params = dict(self.params, bands=8, rows=1, threshold=0.6)
+        state = DedupState(self.tmpdir.name, params)
+        self._add(state, self.documents[:3])
+        state.close()
+        state = DedupState(self.tmpdir.name, params, append=True)
+        self._add(state, self.documents[3:])
+        roots = state.roots()
+
+        signatures = compute_signatures([doc['text'] for doc in self.documents[:2] + self.documents[3:]], 'word', 64, engine='numpy')
+        lsh_hashes = [lsh_hash(signature, 8, 1) for signature in signatures]
+        uf = UnionFind(5)
+        uf.union_many(verify_edges(bucket_star_edges(lsh_hashes), signatures, 0.6))
+        labels = uf.components()
+        self.assertTrue(((labels[:, None] == labels[None, :]) == (roots[:, None] == roots[None, :])).all())
+        state.close()
+
+    def test_batches_between_saves_and_reopened_state_agree(self):
+        state = DedupState(self.tmpdir.name, self.params)
+        for start in range(0, 6, 2):
+            unique_docs, _ = state.remove_exact_duplicates(self.documents[start:start + 2])
+            signatures = compute_signatures([doc['text'] for doc in unique_docs], 'word', 64, engine='numpy')
+            state.add_documents(unique_docs, signatures, [lsh_hash(signature, 32, 2) for signature in signatures])
+        state.save()
+        roots = state.roots()
+        state.close()
+        # Only the changed Union-Find entries were written back; reopening sees the same forest
+        state = DedupState(self.tmpdir.name, self.params, append=True)
+        self.assertEqual(os.path.getsize(os.path.join(self.tmpdir.name, 'parent.bin')), 5 * 4)
+        self.assertEqual(state.roots().tolist(), roots.tolist())
+        self.assertEqual(sorted(state.clusters(set(roots.tolist())).values()), [['1', '6'], ['2', '4'], ['5']])
+        state.close()
+
+    def test_append_rejects_different_parameters(self):
+        DedupState(self.tmpdir.name, self.params).close()
+        with self.assertRaises(ValueError):
+            DedupState(self.tmpdir.name, dict(self.params, bands=16), append=True)
+
+class TestLSHIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, 'docs.tsv')
+        self.index_path = os.path.join(self.tmpdir.name, 'docs.lshidx')
+        with open(self.source, 'w') as f:
+            f.write("1\tthe quick brown fox jumps over the lazy dog near the river bank\n")
+            f.write("2\tcheeseburgers in paradise are served all day long at the beach\n")
+            f.write("3\tthe quick brown fox jumps over the lazy dog near the river\n")
+        documents = [{'id': '1', 'text': 'the quick brown fox jumps over the lazy dog near the river bank'},
+                     {'id': '2', 'text': 'cheeseburgers in paradise are served all day long at the beach'},
+                     {'id': '3', 'text': 'the quick brown fox jumps over the lazy dog near the river'}]
+        self.index = LSHIndex.from_documents(documents, 100, 50, 2, source_path=self.source)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_load_roundtrip(self):
+        self.index.save(self.index_path)
+        loaded = LSHIndex.load(self.index_path)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(loaded.params, self.index.params)
+        self.assertEqual([loaded.ids[i] for i in range(3)], ['1', '2', '3'])
+        self.assertTrue((loaded.signatures == self.index.signatures).all())
+        self.assertEqual(loaded.texts[1], 'cheeseburgers in paradise are served all day long at the beach')
+
+    def test_query_ranks_best_match_first(self):
+        self.index.save(self.index_path)
+        matches = LSHIndex.load(self.index_path).query("The quick brown fox jumps over the lazy dog near the river bank!")
+        self.assertEqual(matches[0], (0, 1.0))
+        self.assertNotIn(1, [row for row, _ in matches])
+
+    def test_top_k_by_text_and_by_document_id(self):
+        matches = self.index.top_k("the quick brown fox jumps over the lazy dog near the river bank", k=5)
+        self.assertEqual([doc_id for doc_id, _ in matches], ['1', '3'])
+        self.assertEqual(matches[0][1], 1.0)
+        self.assertEqual(self.index.top_k("the quick brown fox jumps over the lazy dog near the river bank", k=1), matches[:1])
+        self.assertEqual(self.index.top_k("the quick brown fox jumps over the lazy dog near the river bank",
+                                          min_similarity=0.99), matches[:1])
+        self.assertEqual([doc_id for doc_id, _ in self.index.top_k(doc_id='3')], ['1'])
+        for kwargs in ({}, {'query': 'fox', 'doc_id': '1'}, {'doc_id': 'missing'}):
+            with self.assertRaises(ValueError):
+                self.index.top_k(**kwargs)
+
+    def test_case2_top_k_ranks_band_neighbours(self):
+        texts = ["two cherry pumpkin tarts and pies", "two cherry pumpkin tarts and cakes", "cheeseburgers in paradise"]
+        signatures = compute_signatures(texts, 'word', 64, engine='numpy')
+        ranked = top_k(signatures[0], signatures, 32, 2, k=5)
+        self.assertEqual([row for row, _ in ranked], [0, 1])
+        self.assertEqual(top_k(signatures[0], signatures, 32, 2, min_similarity=0.99), ranked[:1])
+        md5_signatures = [minhash_signature(text, 64) for text in texts]
+        self.assertEqual([row for row, _ in top_k(md5_signatures[1], md5_signatures, 32, 2)], [1, 0])
+        buckets = sort_band_keys(signatures, 32, 2)
+        self.assertEqual(top_k(signatures[0], signatures, 32, 2, k=5, buckets=buckets), ranked)
+        self.assertEqual([row for row, _ in top_k(signatures[0], signatures, 32, 2, buckets=buckets, exclude=0)], [1])
+        self.assertEqual(top_k(signatures[2], signatures, 32, 2, buckets=buckets, exclude=2), [])
+
+    def test_case2_queries_by_text_and_by_document_id(self):
+        output = os.path.join(self.tmpdir.name, 'case2.txt')
+        ranked = nearest_neighbor_search(self.source, output, "the quick brown fox jumps over the lazy dog near the river bank",
+                                         100, 50, 2, engine='numpy')
+        self.assertEqual([doc_id for doc_id, _ in ranked], ['1', '3'])
+        ranked = nearest_neighbor_search(self.source, output, num_hashes=100, num_bands=50, rows_per_band=2, engine='numpy', doc_id='3')
+        self.assertEqual([doc_id for doc_id, _ in ranked], ['1'])
+        with open(output) as f:
+            self.assertEqual(f.read(), 'the quick brown fox jumps over the lazy dog near the river bank')
+        for kwargs in ({}, {'query': 'fox', 'doc_id': '1'}, {'doc_id': 'missing'}):
+            with self.assertRaises(ValueError):
+                nearest_neighbor_search(self.source, output, engine='numpy', **kwargs)
+
+    def test_multi_probe_finds_document_differing_in_one_row(self):
+        documents = [{'id': '1', 'text': 'the quick brown fox'}, {'id': '2', 'text': 'cheeseburgers in paradise'}]
+        query, runner_up = minhash_numpy_runner_up(hash_shingles("the quick brown fox jumps".split()), 4)
+        signatures = np.vstack([query, compute_signatures(['cheeseburgers in paradise'], 'word_shingle', 4, engine='numpy')[0]])
+        signatures[0, np.argmin(runner_up[:2])] = runner_up[:2].min()
+        index = LSHIndex.from_documents(documents, 4, 1, 2, signatures=signatures)
+        self.assertEqual(index.candidates(query).tolist(), [])
+        self.assertEqual(index.candidates(query, runner_up, probes=1).tolist(), [0])
+        with self.assertRaises(ValueError):
+            index.candidates(query, probes=1)
+
+    def test_stale_source_detected(self):
+        self.index.save(self.index_path)
+        with open(self.source, 'a') as f:
+            f.write("4\ta new document\n")
+        with self.assertRaises(ValueError):
+            LSHIndex.load(self.index_path)
+        self.assertEqual(len(LSHIndex.load(self.index_path, check_source=False)), 3)
+
+    def test_rejects_other_format_version(self):
+        self.index.save(self.index_path)
+        with open(self.index_path, 'r+b') as f:
+            f.seek(8)
+            f.write((99).to_bytes(4, 'little'))
+        with self.assertRaises(ValueError):
+            LSHIndex.load(self.index_path)
+
+class TestIndexRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmpdir.name, 'docs.tsv'), 'w') as f:
+            f.write("1\tthe quick brown fox jumps over the lazy dog\n")
+            f.write("2\tcheeseburgers in paradise are served all day\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_builds_in_background_then_answers_queries(self):
+        registry = IndexRegistry(self.tmpdir.name, num_hashes=60, num_bands=30, rows_per_band=2)
+        self.assertEqual(registry.health()['status'], 'warming')
+        with self.assertRaises(DatasetNotFound):
+            registry.query('docs.tsv', "the quick brown fox")
+        registry.start().join()
+        self.assertEqual(registry.health(), {'status': 'ok', 'datasets': {'docs.tsv': 'ready'}, 'errors': {}})
+        result = registry.query('docs.tsv', "The quick brown fox jumps over the lazy dog!")
+        self.assertEqual([(match['id'], match['score']) for match in result['matches']], [('1', 1.0)])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, 'docs.lshidx')))
+
+    def test_reuses_saved_index_and_reports_unready_datasets(self):
+        IndexRegistry(self.tmpdir.name, num_hashes=60, num_bands=30, rows_per_band=2).start().join()
+        registry = IndexRegistry(self.tmpdir.name, num_hashes=60, num_bands=30, rows_per_band=2)
+        registry.states = {'docs.tsv': 'building'}
+        with self.assertRaises(IndexNotReady):
+            registry.query('docs.tsv', "the quick brown fox")
+        with self.assertLogs(level='INFO') as logs:
+            registry.start().join()
+        self.assertIn("Loaded LSH index of docs.tsv with 2 documents.", logs.output[-1])
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class TestRedisBulkIO(unittest.TestCase):
+
+    documents = [{'id': str(i), 'text': f"document number {i}"} for i in range(25)]
+
+    def test_pipelined_write_and_batched_read_roundtrip(self):
+        client = fakeredis.FakeRedis(decode_responses=True)
+        client.set("other:1", "not a document")
+        self.assertEqual(write_documents(client, "five.tsv", self.documents, batch_size=7), 25)
+        documents = sorted(read_documents(client, "five.tsv", batch_size=4), key=lambda doc: int(doc['id']))
+        self.assertEqual(documents, self.documents)
+        self.assertTrue(all(len(batch) <= 4 for batch in iter_key_batches(client, "five.tsv:*", 4)))
+
+    def test_read_decodes_byte_responses(self):
+        client = fakeredis.FakeRedis()
+        write_documents(client, "five.tsv", self.documents[:3])
+        self.assertEqual(sorted(doc['id'] for doc in read_documents(client, "five.tsv")), ['0', '1', '2'])
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class TestRedisLSHIndex(unittest.TestCase):
+
+    documents = [
+        {'id': '1', 'text': "the quick brown fox jumps over the lazy dog near the river bank"},
+        {'id': '2', 'text': "cheeseburgers in paradise are served all day long at the beach"},
+        {'id': '3', 'text': "the quick brown fox jumps over the lazy dog near the river"},
+    ]
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+
+    def test_matches_in_memory_index(self):
+        shared = RedisLSHIndex.create(fakeredis.FakeRedis(server=self.server), "lshidx:docs", 100, 50, 2)
+        shared.add_documents(self.documents)
+        local = LSHIndex.from_documents(self.documents, 100, 50, 2)
+        query = "The quick brown fox jumps over the lazy dog near the river bank!"
+        self.assertEqual(len(shared), 3)
+        self.assertEqual(shared.query(query), local.query(query))
+        self.assertEqual(shared.top_k(query, k=5, probes=5), local.top_k(query, k=5, probes=5))
+        self.assertEqual(shared.top_k(doc_id='3'), local.top_k(doc_id='3'))
+        with self.assertRaises(ValueError):
+            shared.row_of('missing')
+
+    def test_workers_share_one_index(self):
+        writer = RedisLSHIndex.create(fakeredis.FakeRedis(server=self.server), "lshidx:docs", 100, 50, 2)
+        reader = RedisLSHIndex.open(fakeredis.FakeRedis(server=self.server), "lshidx:docs")
+        writer.add_documents(self.documents[:2])
+        self.assertEqual(reader.top_k(doc_id='1'), [])
+        writer.add_documents(self.documents[2:])
+        self.assertEqual([doc_id for doc_id, _ in reader.top_k(doc_id='1')], ['3'])
+        with self.assertRaises(ValueError):
+            RedisLSHIndex.create(fakeredis.FakeRedis(server=self.server), "lshidx:docs", 100, 25, 4)
+
+    def test_registry_builds_shared_index_once(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, 'docs.tsv'), 'w') as f:
+                for doc in self.documents:
+                    f.write(f"{doc['id']}\t{doc['text']}\n")
+            IndexRegistry(tmpdir, num_hashes=60, num_bands=30, rows_per_band=2,
+                          client=fakeredis.FakeRedis(server=self.server)).start().join()
+            registry = IndexRegistry(tmpdir, num_hashes=60, num_bands=30, rows_per_band=2,
+                                     client=fakeredis.FakeRedis(server=self.server))
+            with self.assertLogs(level='INFO') as logs:
+                registry.start().join()
+            self.assertIn("Opened Redis LSH index lshidx:docs.tsv with 3 documents.", logs.output[-1])
+            result = registry.query('docs.tsv', "the quick brown fox jumps over the lazy dog near the river bank")
+            self.assertEqual([match['id'] for match in result['matches']], ['1', '3'])
+
+    def test_readded_id_replaces_document(self):
+        shared = RedisLSHIndex.create(fakeredis.FakeRedis(server=self.server), "lshidx:docs", 100, 50, 2)
+        shared.add_documents(self.documents)
+        rows = shared.add_documents([{'id': '1', 'text': self.documents[1]['text']}])
+        self.assertEqual((rows.tolist(), len(shared)), ([0], 3))
+        self.assertEqual(shared.top_k(doc_id='3'), [])
+        self.assertEqual([doc_id for doc_id, _ in shared.top_k(doc_id='1')], ['2'])
+        with self.assertRaises(ValueError):
+            shared.add_documents([self.documents[0], self.documents[0]])
+
+    def test_changed_source_is_rebuilt(self):
+        client = fakeredis.FakeRedis(server=self.server)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'docs.tsv')
+            with open(path, 'w') as f:
+                f.writelines(f"{doc['id']}\t{doc['text']}\n" for doc in self.documents[:2])
+            index = open_or_build(client, "lshidx:docs.tsv", path, 60, 30, 2)
+            self.assertFalse(RedisLSHIndex.open(client, "lshidx:docs.tsv").is_stale())
+            with open(path, 'a') as f:
+                f.write(f"3\t{self.documents[2]['text']}\n")
+            self.assertTrue(index.is_stale())
+            self.assertEqual(len(open_or_build(client, "lshidx:docs.tsv", path, 60, 30, 2)), 3)
+            self.assertIsNone(client.get("lshidx:docs.tsv:build"))
+
+    def test_build_lock_is_extended_and_released_only_by_its_owner(self):
+        client = fakeredis.FakeRedis(server=self.server)
+        lock = _BuildLock(client, "lshidx:docs:build", 0.3)
+        self.assertTrue(lock.acquire())
+        self.assertFalse(_BuildLock(client, "lshidx:docs:build", 0.3).acquire())
+        time.sleep(0.6)
+        self.assertEqual(client.get("lshidx:docs:build"), lock.token.encode())
+        client.set("lshidx:docs:build", "other worker")
+        lock.release()
+        self.assertEqual(client.get("lshidx:docs:build"), b"other worker")
+
 class TestLSHBanding(unittest.TestCase):
     
     def test_lsh_hash_band_consistency(self):
@@ -58,6 +680,41 @@ class TestLSHBanding(unittest.TestCase):
         # Verify that the number of band hashes matches the number of bands
         self.assertEqual(len(band_hashes), bands, "Number of band hashes should match the number of bands.")
 
+    def test_bucket_star_edges_match_candidate_pairs(self):
+        band_hashes = np.random.RandomState(1).randint(0, 8, size=(40, 3)).tolist()
+        from_pairs, from_stars = UnionFind(40), UnionFind(40)
+        from_pairs.union_many(find_candidate_pairs(band_hashes))
+        from_stars.union_many(bucket_star_edges(band_hashes))
+        labels1, labels2 = from_pairs.components(), from_stars.components()
+        self.assertTrue(((labels1[:, None] == labels1[None, :]) == (labels2[:, None] == labels2[None, :])).all())
+
+    def test_bucket_star_edges_linear_in_bucket_size(self):
+        # One bucket of 1000 documents in every band: 999 edges instead of 499500 pairs
+        edges = bucket_star_edges([[0, 0, 0]] * 1000)
+        self.assertEqual(edges.shape, (999, 2))
+
+    def test_verify_edges_drops_dissimilar_links(self):
+        signatures = np.array([[1, 2, 3, 4], [1, 2, 3, 9], [1, 8, 8, 9]], dtype=np.uint64)
+        kept = verify_edges([(0, 1), (0, 2), (1, 2)], signatures, 0.5)
+        self.assertEqual(kept.tolist(), [[0, 1], [1, 2]])
+        self.assertEqual(len(verify_edges([(0, 1), (0, 2)], signatures, 0.0)), 2)
+        with self.assertRaises(ValueError):
+            verify_edges([(0, 1)], signatures, 1.5)
+
+    def test_verified_links_do_not_depend_on_order(self):
+        # 1 and 2 are near duplicates that share a bucket with the unrelated 0, which came first
+        signatures = np.array([[7, 7, 7, 7], [1, 2, 3, 4], [1, 2, 3, 9]], dtype=np.uint64)
+        band_hashes = [[5], [5], [5]]
+        star = verify_edges(bucket_star_edges(band_hashes), signatures, 0.5)
+        self.assertEqual(star.tolist(), [])
+        linked = verify_edges(bucket_star_edges(band_hashes, max_links=MAX_VERIFIED_LINKS), signatures, 0.5)
+        self.assertEqual(linked.tolist(), [[2, 1]])
+
+    def test_verify_edges_accepts_md5_signatures(self):
+        signatures = [minhash_signature(text, 50) for text in ("the cat sat on the mat", "the cat sat on a mat", "")]
+        kept = verify_edges([(0, 1), (0, 2)], signatures, 0.5)
+        self.assertEqual(kept.tolist(), [[0, 1]])
+
 class TestUnionFind(unittest.TestCase):
     
     def test_union_find_single_cluster(self):
@@ -83,5 +740,47 @@ class TestUnionFind(unittest.TestCase):
         self.assertNotEqual(uf.find(0), uf.find(4), "0 and 4 should not be in the same cluster.")
         self.assertNotEqual(uf.find(2), uf.find(4), "2 and 4 should not be in the same cluster.")
 
+    def test_union_find_long_chain(self):
+        # A recursive find would exceed the recursion limit on this chain
+        uf = UnionFind(5000)
+        for i in range(4999):
+            uf.parent[i] = i + 1
+        self.assertEqual(uf.find(0), 4999)
+
+    def test_union_many_matches_union(self):
+        edges = np.random.RandomState(0).randint(0, 300, size=(250, 2))
+        batch = UnionFind(300)
+        batch.union_many(edges)
+        labels = batch.components()
+        single = UnionFind(300)
+        for p, q in edges:
+            single.union(p, q)
+        roots = np.array([single.find(i) for i in range(300)])
+        self.assertTrue(((labels[:, None] == labels[None, :]) == (roots[:, None] == roots[None, :])).all())
+        self.assertEqual(labels.dtype, np.int32)
+
+    def test_union_many_accepts_pair_sets_and_extend(self):
+        uf = UnionFind(3)
+        uf.union_many({(0, 2)})
+        uf.union_many(set())
+        uf.extend(2)
+        uf.union(4, 2)
+        labels = uf.components()
+        self.assertEqual(len(labels), 5)
+        self.assertTrue(labels[0] == labels[2] == labels[4])
+        self.assertEqual(len(set(labels.tolist())), 3)
+
+    def test_union_many_edges_sharing_a_root(self):
+        # Every edge hooks the same (largest) root; all of them merge in a few rounds
+        n = 20001
+        edges = np.stack([np.full(n - 1, n - 1), np.arange(n - 1)], axis=1)
+        uf = UnionFind(n)
+        uf.union_many(edges)
+        self.assertTrue((uf.components() == 0).all())
+        self.assertGreaterEqual(uf.rank[0], 1)
+        uf.extend(1)
+        uf.union(n, 5)
+        self.assertEqual(uf.find(n), 0)
+
 if __name__ == "__main__":
     unittest.main()